@@ -1,23 +1,76 @@
 # -*- coding: utf-8 -*-
+from __future__ import annotations
+
 import re
 import unicodedata
-from collections import Counter, defaultdict
-from itertools import combinations
-from typing import Dict, List, Tuple, Set, Optional
+from collections import Counter, OrderedDict, defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import TYPE_CHECKING, Dict, List, Tuple, Set, Optional
 
-from janome.tokenizer import Tokenizer
+import numpy as np
 import pandas as pd
-import networkx as nx
-import matplotlib.pyplot as plt
-import matplotlib.patches as mpatches
-import matplotlib
 import os
+import sys
+import glob
 import math
+import json
+import time
+import pickle
+import sqlite3
+import hashlib
+import heapq
+import argparse
+import importlib
+import threading
+from contextlib import contextmanager, nullcontext
 from pathlib import Path
 
-# Excel 出力用
-from openpyxl import Workbook
-from openpyxl.styles import PatternFill, Font, Alignment
+try:
+    import resource  # ピーク RSS の取得（Windows には無い）
+except ImportError:
+    resource = None
+
+if TYPE_CHECKING:
+    from janome.tokenizer import Tokenizer
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import PatternFill
+
+# =========================================================
+# 重いライブラリの遅延読み込み
+# =========================================================
+class _LazyModule:
+    """
+    初めて属性を参照したときに import するモジュールの代理。
+    描画（matplotlib）とネットワーク（networkx）は読み込みに時間がかかるので、図を出さない実行では読み込まない。
+    on_import は import 直後に 1 回だけ呼ぶ（フォント設定など）。
+    """
+    def __init__(self, name: str, on_import=None):
+        self._name = name
+        self._on_import = on_import
+        self._module = None
+
+    def _load(self):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+            if self._on_import is not None:
+                self._on_import(self._module)
+        return self._module
+
+    def __getattr__(self, attr: str):
+        return getattr(self._load(), attr)
+
+def _configure_pyplot(pyplot):
+    """pyplot を初めて使うときのバックエンドとフォントの設定。"""
+    if HEADLESS:
+        matplotlib.use("Agg")
+    pyplot.rcParams["font.family"] = FONT_FAMILY
+    pyplot.rcParams["axes.unicode_minus"] = False
+
+matplotlib = _LazyModule("matplotlib")
+plt = _LazyModule("matplotlib.pyplot", on_import=_configure_pyplot)
+mpatches = _LazyModule("matplotlib.patches")
+nx = _LazyModule("networkx")
 
 # =========================================================
 # 設定（必要なら変更してください）
@@ -25,9 +78,14 @@ from openpyxl.styles import PatternFill, Font, Alignment
 DEBUG = False
 COOCCURRENCE_MIN_FREQ = 5
 COOCCURRENCE_WINDOW = 5
+TOKEN_MIN_FREQ = 3             # 期間内の語の出現頻度がこの範囲の語だけ使う
+TOKEN_MAX_FREQ = 500
+PERIOD_MONTHS = 2              # 1 期間の長さ（月）
 DRAW_TOP_EDGES = 40
-MAX_NEIGHBORS_FOR_SET = 20
+MAX_NEIGHBORS_FOR_SET = None    # 問題セットの候補にする語数の上限（None で全語。三角形だけ列挙するので上限なしでも速い）
 TOP_PROBLEM_SET_PER_TEGUCHI = 5
+PROBLEM_SET_SIZE = 2           # 手口と組にする問題語の数（手口 + 2語 = 3共起）
+OTHER_PROBLEM_SET_SIZE = 3     # 'その他' の問題セットの語数
 FONT_FAMILY = "Yu Gothic"
 
 TOP_PAIR_CANDIDATES_PER_PERIOD = 10
@@ -39,6 +97,20 @@ PER_PERIOD_KEEP = 1
 FILL_FROM_OVERALL = 4
 NORMALIZE_TIMESERIES = True
 
+# ペアの並び順に使う関連度: "count"（共起数。従来どおり）/ "pmi" / "npmi" / "dice" / "jaccard" / "llr"
+# 共起表・ネットワーク図に描くエッジ・折れ線の候補の順位に使う
+RANKING_MEASURE = "count"
+ASSOCIATION_MIN_COUNT = 5      # 関連度で並べるとき、共起数がこれ未満のペアは後ろに回す（PMI は低頻度ほど高くなるため）
+NETWORK_MIN_SCORE = None       # ネットワークに残すエッジの関連度の下限（None なら共起数の閾値だけ）
+
+# 手口ラベル → 手口とみなす語
+TEGUCHI_MAP = {
+    "電話": ["電話","携帯"],
+    "訪問": ["訪問"],
+    "ネット": ["ネット", "サイト"],
+    "メール": ["メール"]
+}
+
 TEGUCHI_COLOR = "#d97474"
 PROBLEM_COLOR = "#7297b4"
 
@@ -57,16 +129,134 @@ USE_REL_OR_ABS = True          # True: 両方を満たすものだけ除外, Fal
 # ネットワーク図の保存数
 MAX_NETWORK_PLOTS = 6         # 保存する共起ネットワーク図の最大数
 
+# スライド窓の推移図（None なら作らない）
+SLIDING_TREND_MONTHS = None    # 窓の長さ（月）。例: 3
+SLIDING_TREND_STEP = 1         # 窓をずらす幅（月）
+# True: 月ごとの共起数を 1 回だけ数え、窓はその足し合わせで作る（重なる窓を数え直さないので速い）。
+#   頻度フィルタは語を除いてから数える代わりに、窓の語頻度で範囲外の語を含むペアを後から除く近似になる
+#   （COOCCURRENCE_WINDOW = None なら一致する。窓ありでは、除いた語の分だけ詰めて数えたペアが入らない）。
+# False: 窓ごとに期間と同じ「頻度フィルタ → 共起」で数え直す（正確）。
+SLIDING_TREND_MONTHLY_BASES = False
+
+# トークン化キャッシュ（Janome の結果をディスクに保存して再利用）
+USE_TOKEN_CACHE = True
+CACHE_DIR = OUTPUT_DIR / "cache"
+TOKEN_CACHE_PATH = CACHE_DIR / "tokens.sqlite3"
+TOKEN_CACHE_MAX_ENTRIES = 200000   # 上限を超えたら最終利用が古いものから削除
+
+# トークン化の並列実行（各ワーカーが Tokenizer を 1 回だけ生成）
+TOKENIZE_WORKERS = None            # None: CPU コア数, 1: 逐次実行
+TOKENIZE_CHUNK_SIZE = 64           # ワーカーへ送る 1 回あたりの文書数
+TOKENIZE_PARALLEL_MIN_DOCS = 500   # これ未満の文書数では起動コストの方が大きいので逐次
+
+# CSV 読み込み（チャンク読み + 列指向キャッシュ）
+CSV_SOURCE = "R5 1.csv"            # glob 可（例: "R* *.csv" で年度ごとのファイルをまとめて読む）
+CSV_CHUNK_ROWS = 50000             # 1 回に読む行数（メモリ使用量の上限を決める）
+USE_CSV_CACHE = True               # Feather キャッシュ（pyarrow が無い環境では使わない）
+CSV_CACHE_DIR = CACHE_DIR / "csv"
+CSV_READ_WORKERS = 4               # 複数ファイルを並列に読むスレッド数
+
+# 期間ごとの分析（共起・ネットワーク・問題セット・図の保存）の並列実行
+PERIOD_WORKERS = 1                 # 2 以上でプロセス並列（図は画面表示せず保存のみ）, None: CPU コア数
+
+# 出力する結果（--outputs で上書き）。tables / excel / networks / charts を含めなければ matplotlib・networkx・openpyxl は読み込まない
+#   counts: 期間ごとの行数と上位共起ペア（テキスト）, summaries: 手口別の問題セット, tables: 共起表の画像,
+#   excel: Excel, networks: ネットワーク図, trends: ペアの推移 CSV と急増ペア, charts: スライド窓の推移図,
+#   json: Web アプリ向けの結果 JSON（RESULTS_JSON_PATH）
+OUTPUT_KINDS = ("counts", "summaries", "tables", "excel", "networks", "trends", "charts", "json")
+OUTPUTS = OUTPUT_KINDS
+
+# ヘッドレス一括実行（Agg バックエンド、plt.show() を呼ばない）と図の並列描画
+HEADLESS = False
+RENDER_WORKERS = None              # ヘッドレス時に PNG を描画するプロセス数（None: CPU コア数, 1: メインで描画）
+
+# ペア × 期間の共起数を全件 Excel に出力する（合計が PAIR_MATRIX_MIN_TOTAL 以上のペア）
+EXPORT_PAIR_MATRIX = True
+PAIR_MATRIX_MIN_TOTAL = COOCCURRENCE_MIN_FREQ
+_EXCEL_MAX_ROWS = 1048576
+
+# 変化フィルタを通った全ペアの推移を CSV に出力する（変化幅の降順）
+EXPORT_PAIR_TRENDS = True
+
+# 結果を JSON にまとめる（--outputs の json。期間ごとの上位ペア・問題セット・座標付きのネットワーク・推移）
+RESULTS_JSON_PATH = OUTPUT_DIR / "results.json"
+JSON_TOP_PAIRS = TOP_COOC_PER_PERIOD * 2    # 期間ごとに入れる上位ペア数（共起表の 1-20 位と同じ）
+JSON_TIMESERIES_PAIRS = 50                 # 推移を入れるペア数（折れ線の候補 + 全期間の上位）
+
+# 急増ペアの検出: 直前 BURST_WINDOW 期間の割合（共起数 / 行数）を基準にした z スコアで全ペアを調べる
+BURST_DETECTION = True
+BURST_WINDOW = 3
+BURST_Z_THRESHOLD = 3.0
+BURST_MIN_COUNT = 5            # この期間の共起数がこれ未満のペアは対象外
+BURST_MIN_HISTORY = 1          # 直前 BURST_WINDOW 期間のうち出現した期間がこれ未満のペアは z を出さない
+                               # （一度も出ていなかったペアは基準がないので、新規ペアとして別に出す）
+BURST_TOP_N = 10               # 期間ごとに表示・出力する件数
+
+# 近似集計: 期間の共起数を Count-Min スケッチ + 上位候補だけで数える（メモリを一定に抑える）
+APPROX_PAIR_COUNTS = False
+APPROX_MEMORY_MB = 32          # スケッチのカウンタに使うメモリ
+APPROX_DELTA = 0.01            # 誤差上限を超える確率（スケッチの深さ = ceil(ln(1/δ))）
+APPROX_CANDIDATES = 20000      # 追跡する上位候補ペアの数
+APPROX_BATCH_DOCS = 5000       # スケッチに一度に流し込む文書数
+APPROX_REPORT = False          # 検証用: 正確な集計も作り、上位 20 件の再現率を表示する（メモリは節約できなくなる）
+
+# ネットワーク図のレイアウト（前回描画した期間の座標から開始し、結果はキャッシュする）
+USE_LAYOUT_CACHE = True
+LAYOUT_CACHE_PATH = CACHE_DIR / "layouts.json"
+LAYOUT_CACHE_MAX_ENTRIES = 500
+LAYOUT_ITERATIONS = 50             # 初期座標なし（最初の期間など）の反復回数
+LAYOUT_WARM_ITERATIONS = 20        # 前の期間と共通の語があるときの反復回数
+
+# 実行時間・メモリの計測（ステージごと・期間ごとに測って JSON レポートに保存する。False なら計測しない）
+PROFILE = False
+PROFILE_REPORT_PATH = OUTPUT_DIR / "profile_report.json"
+PROFILE_CAPTURE_STAGE = None       # 詳しく調べるステージ名（例: "tokenize"）。None なら取らない
+PROFILE_CAPTURE_MODE = "cprofile"  # "cprofile"（関数ごとの時間）/ "tracemalloc"（行ごとの確保メモリ）
+PROFILE_CAPTURE_TOP = 30           # 取得結果のテキストに書く上位件数
+
+# 常駐サーバー（--serve）: Next.js の API ルートから期間とパラメータを JSON で POST し、結果を JSON で受け取る
+SERVE_HOST = "127.0.0.1"
+SERVE_PORT = 8765
+SERVE_MAX_CONCURRENT = 2           # 同時に受け付ける分析リクエスト数（分析そのものは 1 件ずつ）
+SERVE_QUEUE_TIMEOUT = 30           # 空きを待つ秒数の上限。超えたら 503 を返す
+SERVE_RESULT_CACHE = 32            # 結果を覚えておく（期間・パラメータ・データ）の組の数
+SERVE_PERIOD_CACHE = 256           # 期間ごとの集計（共起数・問題セット）を覚えておく数
+
+# 入力元: "csv"（CSV_SOURCE）または "sqlite"（Web アプリの cases テーブルを直接読む）
+DATA_SOURCE = "csv"
+CASES_DB_PATH = Path("src/db/db.sqlite")   # Next.js アプリのルートから見たパス（src/db/database.js と同じ）
+CASES_TEXT_COLUMN = "name"         # 分析する列（/api/bunseki が CSV の G 列に出している件名）
+CASES_START_DATE = None            # "YYYY-MM-DD"。指定すると SQL の WHERE で絞り込む
+CASES_END_DATE = None
+CASES_FETCH_BATCH = 5000
+
+# 増分実行（前回の期間ごとの集計・図・表を再利用し、行が変わった期間だけ再計算）
+INCREMENTAL = False
+INCREMENTAL_STATE_PATH = CACHE_DIR / "incremental_state.pkl"
+
+# トークン化ルール（変更するとキャッシュは自動的に無効化されます）
+TOKENIZE_RULES_VERSION = 1
+TOKEN_EXCLUDE_POS = ("名詞,数", "名詞,代名詞")
+TOKEN_NORMALIZE_MAP = {"サイト": "ネット", "携帯": "電話"}
+
 # =========================================================
 # 前処理（サイト -> ネット 統一）
 # =========================================================
 class TextPreprocessor:
     def __init__(self, stopwords_file: str = "stopwords.txt"):
-        self.tokenizer = Tokenizer()
+        self._tokenizer: Optional[Tokenizer] = None
         self.stop_words = set()
         self.stopwords_file = stopwords_file
         self._load_stopwords()
 
+    @property
+    def tokenizer(self) -> Tokenizer:
+        # 辞書の読み込みが重いので、キャッシュで全件ヒットした場合は生成しない（import もここで行う）
+        if self._tokenizer is None:
+            from janome.tokenizer import Tokenizer
+            self._tokenizer = Tokenizer()
+        return self._tokenizer
+
     def _load_stopwords(self):
         if os.path.exists(self.stopwords_file):
             with open(self.stopwords_file, encoding="utf-8") as f:
@@ -74,6 +264,16 @@ class TextPreprocessor:
         else:
             open(self.stopwords_file, "w", encoding="utf-8").close()
 
+    def rules_fingerprint(self) -> str:
+        """ストップワード・品詞条件・表記統一ルールのハッシュ（キャッシュキーに使用）。"""
+        import janome
+        h = hashlib.sha1()
+        h.update(f"v{TOKENIZE_RULES_VERSION}|janome={janome.__version__}".encode("utf-8"))
+        h.update(repr(TOKEN_EXCLUDE_POS).encode("utf-8"))
+        h.update(repr(sorted(TOKEN_NORMALIZE_MAP.items())).encode("utf-8"))
+        h.update("\n".join(sorted(self.stop_words)).encode("utf-8"))
+        return h.hexdigest()
+
     def clean_text(self, text: str) -> str:
         text = re.sub(r'https?://\S+', '', str(text))
         text = re.sub(r'\d{2,4}年\d{1,2}月\d{1,2}日', '', text)
@@ -82,20 +282,85 @@ class TextPreprocessor:
         return text
 
     def tokenize(self, text: str) -> List[str]:
-        text = self.clean_text(text)
+        return self.tokenize_cleaned(self.clean_text(text))
+
+    def tokenize_cleaned(self, text: str) -> List[str]:
         tokens: List[str] = []
         for token in self.tokenizer.tokenize(text):
             pos = token.part_of_speech
             base = token.base_form
-            if pos.startswith("名詞") and not pos.startswith(("名詞,数", "名詞,代名詞")) and len(base) > 1:
+            if pos.startswith("名詞") and not pos.startswith(TOKEN_EXCLUDE_POS) and len(base) > 1:
                 if base not in self.stop_words and not re.match(r'^[0-9０-９]+$', base):
-                    if base == "サイト":
-                        base = "ネット"
-                    if base == "携帯":
-                        base = "電話"
+                    base = TOKEN_NORMALIZE_MAP.get(base, base)
                     tokens.append(base)
         return tokens
 
+# =========================================================
+# トークン化キャッシュ（SQLite / 本文ハッシュ単位）
+# =========================================================
+class TokenCache:
+    """
+    クリーニング後の本文ハッシュ → トークン列 を SQLite に保存する。
+    - キーには TextPreprocessor.rules_fingerprint() を含めるので、ストップワードや
+      品詞・表記統一ルールが変わると古いエントリは参照されない（起動時にまとめて削除）。
+    - 件数が max_entries を超えたら最終利用時刻の古いものから削除する。
+    """
+    _BATCH = 500
+
+    def __init__(self, fingerprint: str, path: Path = TOKEN_CACHE_PATH, max_entries: int = TOKEN_CACHE_MAX_ENTRIES):
+        self.fingerprint = fingerprint
+        self.max_entries = max_entries
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # 常駐サーバーではリクエストのスレッドから使う（呼び出し側のロックで 1 スレッドずつにしている）
+        self.conn = sqlite3.connect(str(path), check_same_thread=False)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS tokens (key TEXT PRIMARY KEY, tokens TEXT NOT NULL, last_used REAL NOT NULL)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_tokens_last_used ON tokens(last_used)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        row = self.conn.execute("SELECT value FROM meta WHERE name = 'fingerprint'").fetchone()
+        if row is None or row[0] != fingerprint:
+            # ルールが変わった: 旧ルールのトークンは二度と使われないので破棄
+            self.conn.execute("DELETE FROM tokens")
+            self.conn.execute("INSERT OR REPLACE INTO meta (name, value) VALUES ('fingerprint', ?)", (fingerprint,))
+        self.conn.commit()
+        self.hits = 0
+        self.misses = 0
+
+    def key_for(self, cleaned_text: str) -> str:
+        return hashlib.sha1((self.fingerprint + "\0" + cleaned_text).encode("utf-8")).hexdigest()
+
+    def get_many(self, keys: List[str]) -> Dict[str, List[str]]:
+        found: Dict[str, List[str]] = {}
+        uniq = list(dict.fromkeys(keys))
+        for i in range(0, len(uniq), self._BATCH):
+            batch = uniq[i:i + self._BATCH]
+            marks = ",".join("?" * len(batch))
+            for key, tokens in self.conn.execute(f"SELECT key, tokens FROM tokens WHERE key IN ({marks})", batch):
+                found[key] = json.loads(tokens)
+        if found:
+            now = time.time()
+            self.conn.executemany("UPDATE tokens SET last_used = ? WHERE key = ?", [(now, k) for k in found])
+            self.conn.commit()
+        return found
+
+    def put_many(self, items: Dict[str, List[str]]):
+        if not items:
+            return
+        now = time.time()
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO tokens (key, tokens, last_used) VALUES (?, ?, ?)",
+            [(k, json.dumps(v, ensure_ascii=False), now) for k, v in items.items()])
+        self._evict()
+        self.conn.commit()
+
+    def _evict(self):
+        (count,) = self.conn.execute("SELECT COUNT(*) FROM tokens").fetchone()
+        excess = count - self.max_entries
+        if excess > 0:
+            self.conn.execute("DELETE FROM tokens WHERE key IN (SELECT key FROM tokens ORDER BY last_used ASC LIMIT ?)", (excess,))
+
+    def close(self):
+        self.conn.close()
+
 # =========================================================
 # ModalityClassifier（TEGUCHI_MAPのみ厳密に使用）
 # =========================================================
@@ -113,69 +378,1108 @@ class ModalityClassifier:
     def get_label(self, word: str) -> Optional[str]:
         return self.word2teguchi.get(word, None)
 
+    def mine_problem_sets(self, G: "CooccurrenceGraph", teguchi_word: str, size: int = PROBLEM_SET_SIZE,
+                          top_k: int = TOP_PROBLEM_SET_PER_TEGUCHI) -> List[Tuple[Tuple[str, ...], float]]:
+        """手口語 teguchi_word + 問題語 size 個のセットをスコア上位 top_k 件だけ返す。"""
+        return mine_problem_sets(G, size, self, teguchi_node=teguchi_word, top_k=top_k)
+
 # =========================================================
 # CSV読み込み / 期間分割 / トークン化 / 共起計算（元ロジック維持）
 # =========================================================
-def load_csv(file_path: str = "R5 1.csv") -> pd.DataFrame:
-    df = pd.read_csv(file_path, usecols=[0,6], skiprows=1, header=None, encoding="cp932")
-    df.columns = ["date","text"]
-    df["date"] = pd.to_datetime(df["date"], format="%Y年%m月%d日", errors="coerce")
-    return df.dropna(subset=["date"]) 
-
-def split_periods(df: pd.DataFrame):
-    start_date = df["date"].min()
-    end_date = df["date"].max()
+# --- チャンク読み + 列指向キャッシュ ---
+def _file_sha1(path: Path) -> str:
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def _read_csv_chunked(path: Path, chunk_rows: int = CSV_CHUNK_ROWS):
+    """1 ファイルをチャンクごとに読み、date / text の 2 列だけを正規化して残す。(DataFrame, 生の行数) を返す。"""
+    parts = []
+    n_raw = 0
+    reader = pd.read_csv(path, usecols=[0, 6], skiprows=1, header=None, encoding="cp932",
+                         dtype=str, chunksize=chunk_rows)
+    for chunk in reader:
+        chunk.columns = ["date", "text"]
+        chunk["date"] = pd.to_datetime(chunk["date"], format="%Y年%m月%d日", errors="coerce")
+        n_raw += len(chunk)
+        parts.append(chunk.dropna(subset=["date"]))
+    if not parts:
+        return pd.DataFrame({"date": pd.Series(dtype="datetime64[ns]"), "text": pd.Series(dtype=object)}), 0
+    return pd.concat(parts), n_raw
+
+def _load_csv_cached(path: Path, chunk_rows: int = CSV_CHUNK_ROWS, use_cache: bool = USE_CSV_CACHE):
+    """
+    Feather キャッシュがあり、元ファイルの mtime・サイズ（変わっていれば内容ハッシュ）が
+    前回と同じならキャッシュを memory-map で読む。そうでなければ CSV を読み直して保存する。
+    """
+    try:
+        import pyarrow.feather as feather
+    except ImportError:
+        use_cache = False
+    if not use_cache:
+        return _read_csv_chunked(path, chunk_rows)
+
+    CSV_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    name = hashlib.sha1(str(path.resolve()).encode("utf-8")).hexdigest()[:16]
+    data_path = CSV_CACHE_DIR / f"{name}.feather"
+    meta_path = CSV_CACHE_DIR / f"{name}.json"
+    st = path.stat()
+    meta = None
+    if data_path.exists() and meta_path.exists():
+        with open(meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+        if (meta.get("mtime_ns"), meta.get("size")) != (st.st_mtime_ns, st.st_size):
+            # mtime だけ変わった（コピー・touch など）なら内容ハッシュで判定
+            if meta.get("size") == st.st_size and meta.get("sha1") == _file_sha1(path):
+                meta.update(mtime_ns=st.st_mtime_ns)
+                with open(meta_path, "w", encoding="utf-8") as f:
+                    json.dump(meta, f)
+            else:
+                meta = None
+    if meta is not None:
+        table = feather.read_table(str(data_path), memory_map=True)
+        df = table.to_pandas().set_index("row")
+        df.index.name = None
+        return df, meta["raw_rows"]
+
+    df, n_raw = _read_csv_chunked(path, chunk_rows)
+    out = df.reset_index(names="row")
+    out["text"] = out["text"].astype(object)
+    feather.write_feather(out, str(data_path))
+    with open(meta_path, "w", encoding="utf-8") as f:
+        json.dump({"source": str(path), "mtime_ns": st.st_mtime_ns, "size": st.st_size,
+                   "sha1": _file_sha1(path), "raw_rows": n_raw}, f)
+    return df, n_raw
+
+def load_csv_streaming(pattern: str = CSV_SOURCE, chunk_rows: int = CSV_CHUNK_ROWS,
+                       use_cache: bool = USE_CSV_CACHE, workers: int = CSV_READ_WORKERS) -> pd.DataFrame:
+    """
+    CSV をチャンクごとに読む。pattern に glob（例: "R5 1.csv", "R6 *.csv"）を指定すると
+    一致したファイルを名前順に並列で読み、1 つの DataFrame にまとめる。
+    行番号（index）はファイルをこの順に連結したときの通し番号（ヘッダ行を除く CSV の行番号）になる。
+    """
+    paths = [Path(pattern)] if Path(pattern).exists() else [Path(p) for p in sorted(glob.glob(pattern))]
+    if not paths:
+        raise FileNotFoundError(f"CSV が見つかりません: {pattern}")
+    if len(paths) == 1:
+        results = [_load_csv_cached(paths[0], chunk_rows, use_cache)]
+    else:
+        with ThreadPoolExecutor(max_workers=max(1, min(workers, len(paths)))) as ex:
+            results = list(ex.map(lambda p: _load_csv_cached(p, chunk_rows, use_cache), paths))
+    parts = []
+    offset = 0
+    for df, n_raw in results:
+        df = df.copy()
+        df.index = df.index + offset
+        parts.append(df)
+        offset += n_raw
+    return pd.concat(parts) if len(parts) > 1 else parts[0]
+
+def load_cases_from_sqlite(db_path: Path = CASES_DB_PATH, start_date: Optional[str] = None, end_date: Optional[str] = None,
+                          text_column: str = CASES_TEXT_COLUMN, batch_size: int = CASES_FETCH_BATCH) -> pd.DataFrame:
+    """
+    Web アプリの SQLite（cases テーブル）から date と本文を直接読む。
+    期間は /api/analyze と同じく date BETWEEN ? AND ? で SQL 側で絞り込み、カーソルから batch_size 行ずつ取得する。
+    index は cases.id（行の追加順で安定）。
+    """
+    if text_column not in ("name", "description", "type"):
+        raise ValueError(f"cases テーブルに無い列です: {text_column}")
+    sql = f"SELECT id, date, {text_column} FROM cases"
+    params: List[str] = []
+    if start_date and end_date:
+        sql += " WHERE date BETWEEN ? AND ?"
+        params = [start_date, end_date]
+    elif start_date:
+        sql += " WHERE date >= ?"
+        params = [start_date]
+    elif end_date:
+        sql += " WHERE date <= ?"
+        params = [end_date]
+    sql += " ORDER BY id"
+
+    ids: List[int] = []
+    dates: List[str] = []
+    texts: List[Optional[str]] = []
+    conn = sqlite3.connect(f"file:{Path(db_path).resolve()}?mode=ro", uri=True)
+    try:
+        cur = conn.execute(sql, params)
+        while True:
+            rows = cur.fetchmany(batch_size)
+            if not rows:
+                break
+            for row_id, date, text in rows:
+                ids.append(row_id)
+                dates.append(date)
+                texts.append(text)
+    finally:
+        conn.close()
+    df = pd.DataFrame({"date": pd.to_datetime(pd.Series(dates, dtype=object), format="%Y-%m-%d", errors="coerce"),
+                       "text": pd.Series(texts, dtype=object)})
+    df.index = pd.Index(ids, dtype=np.int64)
+    bad_dates = df["date"].isna()
+    if bad_dates.any():
+        sample = ", ".join(str(i) for i in df.index[bad_dates][:5])
+        print(f"[warn] 日付を読めない {int(bad_dates.sum())} 行を除外しました（id: {sample}{' ...' if bad_dates.sum() > 5 else ''}）")
+    return df[~bad_dates]
+
+def make_period_specs(start_date, end_date, months: int = PERIOD_MONTHS,
+                      step_months: Optional[int] = None, anchor_month: Optional[int] = None):
+    """
+    (期間開始, 期間終了) のリストを返す。
+    - months: 期間の長さ（月）。step_months を months より小さくするとスライド窓になる。
+    - anchor_month: 最初の期間をこの月に揃える（例: months=12, anchor_month=4 で年度）。
+    """
     if pd.isna(start_date) or pd.isna(end_date):
         return []
+    step = step_months or months
     current = start_date.replace(day=1)
-    periods = []
+    if anchor_month:
+        while current.month != anchor_month:
+            current = current - pd.DateOffset(months=1)
+    specs = []
     while current <= end_date:
-        period_start = current
-        period_end = min(period_start + pd.DateOffset(months=2) - pd.DateOffset(days=1), end_date)
-        chunk = df[(df["date"] >= period_start) & (df["date"] <= period_end)]
-        periods.append((period_start, period_end, chunk))
-        current = (period_start + pd.DateOffset(months=2)).replace(day=1)
+        period_end = min(current + pd.DateOffset(months=months) - pd.DateOffset(days=1), end_date)
+        specs.append((current, period_end))
+        current = (current + pd.DateOffset(months=step)).replace(day=1)
+    return specs
+
+def period_label(start, months: int = PERIOD_MONTHS) -> str:
+    if months <= 1:
+        return start.strftime('%Y-%m')
+    last = start + pd.DateOffset(months=months - 1)
+    return f"{start.strftime('%Y-%m')}~{last.strftime('%m' if months <= 12 else '%Y-%m')}"
+
+def sort_by_date(df: pd.DataFrame) -> pd.DataFrame:
+    """date 昇順に並べる（同日内は元の行順を保つ）。既に昇順ならそのまま返す。"""
+    if df["date"].is_monotonic_increasing:
+        return df
+    return df.sort_values("date", kind="stable")
+
+def split_periods(df: pd.DataFrame, months: int = PERIOD_MONTHS,
+                  step_months: Optional[int] = None, anchor_month: Optional[int] = None):
+    """
+    期間ごとの (開始, 終了, chunk) を返す。df を日付順に 1 回だけ並べ、各期間の境界は
+    二分探索で求めるので chunk はコピーではなく連続した行のスライスになる。
+    chunk 内の行は日付順（元の行順は index に残っており、共起の初出順はそれを使う）。
+    """
+    df = sort_by_date(df)
+    dates = df["date"].to_numpy()
+    periods = []
+    for period_start, period_end in make_period_specs(df["date"].min(), df["date"].max(), months, step_months, anchor_month):
+        lo = dates.searchsorted(pd.Timestamp(period_start).to_datetime64(), side="left")
+        hi = dates.searchsorted(pd.Timestamp(period_end).to_datetime64(), side="right")
+        periods.append((period_start, period_end, df.iloc[lo:hi]))
     return periods
 
-def tokenize_corpus(docs: List[str], preprocessor: TextPreprocessor):
-    processed_docs = [preprocessor.tokenize(d) for d in docs if isinstance(d, str)]
+# --- 並列トークン化（ワーカープロセス側） ---
+_WORKER_PREPROCESSOR: Optional[TextPreprocessor] = None
+
+def _init_tokenize_worker(stopwords_file: str, stop_words: Set[str]):
+    global _WORKER_PREPROCESSOR
+    _WORKER_PREPROCESSOR = TextPreprocessor(stopwords_file)
+    _WORKER_PREPROCESSOR.stop_words = set(stop_words)
+    _WORKER_PREPROCESSOR.tokenizer  # 辞書の読み込みはワーカー起動時に 1 回だけ
+
+def _tokenize_chunk_worker(texts: List[str]) -> List[List[str]]:
+    return [_WORKER_PREPROCESSOR.tokenize(t) for t in texts]
+
+def _resolve_workers(workers: Optional[int]) -> int:
+    if workers is None:
+        return os.cpu_count() or 1
+    return max(1, int(workers))
+
+def _tokenize_texts(texts: List[str], preprocessor: TextPreprocessor, workers: Optional[int] = TOKENIZE_WORKERS,
+                    chunk_size: int = TOKENIZE_CHUNK_SIZE) -> List[List[str]]:
+    """texts を入力順のままトークン化する。並列化できない環境では逐次にフォールバック。"""
+    n_workers = min(_resolve_workers(workers), max(1, math.ceil(len(texts) / max(1, chunk_size))))
+    if n_workers > 1 and len(texts) >= TOKENIZE_PARALLEL_MIN_DOCS:
+        chunks = [texts[i:i + chunk_size] for i in range(0, len(texts), chunk_size)]
+        try:
+            with ProcessPoolExecutor(max_workers=n_workers, initializer=_init_tokenize_worker,
+                                     initargs=(preprocessor.stopwords_file, preprocessor.stop_words)) as ex:
+                # map は投入順に結果を返すので文書順は保たれる
+                return [tokens for chunk in ex.map(_tokenize_chunk_worker, chunks) for tokens in chunk]
+        except Exception as e:
+            if DEBUG:
+                print(f"[warn] 並列トークン化に失敗したため逐次実行します: {e}")
+    return [preprocessor.tokenize(t) for t in texts]
+
+def tokenize_documents(docs: List[str], preprocessor: TextPreprocessor, cache: Optional[TokenCache] = None,
+                       workers: Optional[int] = TOKENIZE_WORKERS) -> List[List[str]]:
+    """各文書をトークン化する。cache があれば未知の本文だけ Janome にかける。"""
+    if cache is None:
+        return _tokenize_texts(docs, preprocessor, workers)
+    keys = [cache.key_for(preprocessor.clean_text(d)) for d in docs]
+    found = cache.get_many(keys)
+    missing: Dict[str, str] = {}
+    for d, k in zip(docs, keys):
+        if k not in found and k not in missing:
+            missing[k] = d
+    new_tokens = dict(zip(missing.keys(), _tokenize_texts(list(missing.values()), preprocessor, workers)))
+    cache.hits += len(keys) - len(missing)
+    cache.misses += len(missing)
+    cache.put_many(new_tokens)
+    found.update(new_tokens)
+    return [list(found[k]) for k in keys]
+
+def filter_tokens_by_freq(processed_docs: List[List[str]]):
+    """期間内の出現頻度で語を絞り込む（期間ごとに適用する部分）。"""
     all_tokens = [t for doc in processed_docs for t in doc]
     freq = Counter(all_tokens)
-    tokenized_docs = [[t for t in doc if 3 <= freq[t] <= 500] for doc in processed_docs]
+    tokenized_docs = [[t for t in doc if TOKEN_MIN_FREQ <= freq[t] <= TOKEN_MAX_FREQ] for doc in processed_docs]
     return tokenized_docs, freq
 
-def build_cooccurrence_counter(tokenized_docs: List[List[str]], window_size=None):
-    cooccurrence = Counter()
-    for tokens in tokenized_docs:
-        if not tokens: continue
-        if window_size:
-            for i in range(len(tokens)):
-                for j in range(i+1, min(i+window_size+1, len(tokens))):
-                    if tokens[i] != tokens[j]:
-                        pair = tuple(sorted((tokens[i], tokens[j])))
-                        cooccurrence[pair] += 1
+def tokenize_corpus(docs: List[str], preprocessor: TextPreprocessor, cache: Optional[TokenCache] = None,
+                    workers: Optional[int] = TOKENIZE_WORKERS):
+    processed_docs = tokenize_documents([d for d in docs if isinstance(d, str)], preprocessor, cache, workers)
+    return filter_tokens_by_freq(processed_docs)
+
+def tokenize_dataframe(df: pd.DataFrame, preprocessor: TextPreprocessor, cache: Optional[TokenCache] = None,
+                       workers: Optional[int] = TOKENIZE_WORKERS) -> pd.DataFrame:
+    """
+    全行を 1 回だけトークン化し、date と並べて tokens 列（頻度フィルタ前）に保持する。
+    text が文字列でない行は None。期間ごとの処理は filter_tokens_by_freq を適用するだけでよい。
+    """
+    texts = df["text"].tolist()
+    rows = [i for i, t in enumerate(texts) if isinstance(t, str)]
+    tokens: List[Optional[List[str]]] = [None] * len(texts)
+    for i, toks in zip(rows, tokenize_documents([texts[i] for i in rows], preprocessor, cache, workers)):
+        tokens[i] = toks
+    out = df.copy()
+    out["tokens"] = pd.Series(tokens, index=df.index, dtype=object)
+    return out
+
+def build_cooccurrence_counter(tokenized_docs: List[List[str]], window_size=None,
+                               vocab: Optional["Vocabulary"] = None, doc_keys=None) -> Counter:
+    """従来どおり Counter を返す（中身は build_pair_counts の結果を Counter に展開したもの）。"""
+    if vocab is None:
+        vocab = Vocabulary()
+    return build_pair_counts(tokenized_docs, vocab, window_size=window_size, doc_keys=doc_keys).as_counter()
+
+# =========================================================
+# 共起計算エンジン（整数語彙 + NumPy 配列）
+# =========================================================
+_PAIR_SHIFT = np.int64(32)
+_PAIR_MASK = np.int64(0xFFFFFFFF)
+
+class Vocabulary:
+    """語 ⇔ 整数 ID の対応表。期間をまたいで共有し、ペアのキーを整数で扱えるようにする。"""
+    def __init__(self):
+        self.token2id: Dict[str, int] = {}
+        self.id2token: List[str] = []
+
+    def __len__(self) -> int:
+        return len(self.id2token)
+
+    def add(self, token: str) -> int:
+        i = self.token2id.get(token)
+        if i is None:
+            i = len(self.id2token)
+            self.token2id[token] = i
+            self.id2token.append(token)
+        return i
+
+    def encode(self, tokens: List[str]) -> List[int]:
+        t2i = self.token2id
+        return [t2i[t] if t in t2i else self.add(t) for t in tokens]
+
+class PairCounts:
+    """
+    共起ペア数を NumPy 配列で保持する。
+    - keys:   ペアコード（語 ID lo < hi を lo << 32 | hi に詰めた int64）の昇順
+    - counts: 各ペアの共起数
+    - first:  各ペアが最初に数えられた位置（文書キー << 32 | 文書内位置）。
+              Counter の挿入順（= most_common の同数時の並び）を再現するために使う。
+    """
+    __slots__ = ("vocab", "keys", "counts", "first")
+
+    def __init__(self, vocab: Vocabulary, keys: np.ndarray, counts: np.ndarray, first: np.ndarray):
+        self.vocab = vocab
+        self.keys = keys
+        self.counts = counts
+        self.first = first
+
+    @classmethod
+    def empty(cls, vocab: Vocabulary) -> "PairCounts":
+        z = np.zeros(0, dtype=np.int64)
+        return cls(vocab, z, z.copy(), z.copy())
+
+    @classmethod
+    def from_raw(cls, vocab: Vocabulary, codes: np.ndarray, firsts: np.ndarray, weights: Optional[np.ndarray] = None) -> "PairCounts":
+        """重複を含むペアコード列を集計する（ソート 1 回 + 区切り位置の reduce）。"""
+        if len(codes) == 0:
+            return cls.empty(vocab)
+        order = np.lexsort((firsts, codes))
+        codes = codes[order]
+        starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+        if weights is None:
+            counts = np.diff(np.r_[starts, len(codes)]).astype(np.int64)
         else:
-            uniq = list(set(tokens))
-            for w1, w2 in combinations(uniq, 2):
-                pair = tuple(sorted((w1, w2)))
-                cooccurrence[pair] += 1
-    return cooccurrence
+            counts = np.add.reduceat(weights[order], starts).astype(np.int64)
+        return cls(vocab, codes[starts], counts, firsts[order][starts])
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    @classmethod
+    def sum(cls, items: List["PairCounts"], vocab: Vocabulary) -> "PairCounts":
+        """複数の PairCounts を 1 回のソートでまとめて足し合わせる。"""
+        items = [p for p in items if len(p)]
+        if not items:
+            return cls.empty(vocab)
+        if len(items) == 1:
+            return items[0]
+        return cls.from_raw(vocab,
+                            np.concatenate([p.keys for p in items]),
+                            np.concatenate([p.first for p in items]),
+                            np.concatenate([p.counts for p in items]))
+
+    def total(self) -> int:
+        return int(self.counts.sum())
+
+    def select(self, mask: np.ndarray) -> "PairCounts":
+        return PairCounts(self.vocab, self.keys[mask], self.counts[mask], self.first[mask])
+
+    def pair_ids(self) -> Tuple[np.ndarray, np.ndarray]:
+        return self.keys >> _PAIR_SHIFT, self.keys & _PAIR_MASK
+
+    def _order(self) -> np.ndarray:
+        """共起数の降順（同数なら初出順）。Counter.most_common と同じ並び。"""
+        return np.lexsort((self.first, -self.counts))
+
+    def _pair_tuple(self, lo: int, hi: int) -> Tuple[str, str]:
+        a, b = self.vocab.id2token[lo], self.vocab.id2token[hi]
+        return (a, b) if a <= b else (b, a)
+
+    def most_common(self, n: Optional[int] = None) -> List[Tuple[Tuple[str, str], int]]:
+        order = self._order()
+        if n is not None:
+            order = order[:n]
+        lo, hi = self.pair_ids()
+        return [(self._pair_tuple(a, b), c)
+                for a, b, c in zip(lo[order].tolist(), hi[order].tolist(), self.counts[order].tolist())]
+
+    def association(self, freq: Counter, measure: str = RANKING_MEASURE, min_count: int = ASSOCIATION_MIN_COUNT) -> np.ndarray:
+        """各ペアの関連度（freq はこの期間の語頻度）。"""
+        return association_scores(self.vocab, self.keys, self.counts, freq, measure, min_count)
+
+    def ranked(self, scores: np.ndarray, n: Optional[int] = None) -> List[Tuple[Tuple[str, str], int, float]]:
+        """関連度の降順（同点は共起数の降順 → 初出順）に ((語1, 語2), 共起数, 関連度)。"""
+        order = np.lexsort((self.first, -self.counts, -scores))
+        if n is not None:
+            order = order[:n]
+        lo, hi = self.pair_ids()
+        return [(self._pair_tuple(a, b), c, sc) for a, b, c, sc in
+                zip(lo[order].tolist(), hi[order].tolist(), self.counts[order].tolist(), scores[order].tolist())]
+
+    def as_counter(self) -> Counter:
+        """従来の Counter（キーは文字列順に並べた 2 語タプル、挿入順は初出順）に展開する。"""
+        order = np.argsort(self.first, kind="stable")
+        lo, hi = self.pair_ids()
+        c = Counter()
+        for a, b, n in zip(lo[order].tolist(), hi[order].tolist(), self.counts[order].tolist()):
+            c[self._pair_tuple(a, b)] = n
+        return c
+
+def build_pair_counts(tokenized_docs: List[List[str]], vocab: Vocabulary, window_size=None, doc_keys=None) -> PairCounts:
+    """
+    build_cooccurrence_counter と同じ数え方を配列演算で行う。
+    window_size 指定時は各文書内で距離 1..window_size の語の組（同一語は除く）、
+    未指定時は文書内のユニーク語の全組み合わせを数える。
+    doc_keys は各文書の並び順キー（DataFrame の行番号など）。期間や月をまたいで
+    足し合わせても初出順が元の行順と一致するように使う。
+    """
+    codes, firsts = _raw_pair_codes(tokenized_docs, vocab, window_size, doc_keys)
+    if len(codes) == 0:
+        return PairCounts.empty(vocab)
+    return PairCounts.from_raw(vocab, codes, firsts)
+
+def _raw_pair_codes(tokenized_docs: List[List[str]], vocab: Vocabulary, window_size=None, doc_keys=None) -> Tuple[np.ndarray, np.ndarray]:
+    """数えた組ごとのペアコードと位置（重複を含む。build_pair_counts の集計前の列）。"""
+    n_docs = len(tokenized_docs)
+    if doc_keys is None:
+        doc_keys = np.arange(n_docs, dtype=np.int64)
+    else:
+        doc_keys = np.asarray(doc_keys, dtype=np.int64)
+    codes: List[np.ndarray] = []
+    firsts: List[np.ndarray] = []
+    if window_size:
+        lens = np.fromiter((len(d) for d in tokenized_docs), dtype=np.int64, count=n_docs)
+        ids = np.fromiter((i for d in tokenized_docs for i in vocab.encode(d)), dtype=np.int64, count=int(lens.sum()))
+        doc_of = np.repeat(np.arange(n_docs, dtype=np.int64), lens)
+        pos = np.arange(len(ids), dtype=np.int64) - np.repeat(np.cumsum(lens) - lens, lens)
+        for d in range(1, window_size + 1):
+            if d >= len(ids):
+                break
+            a, b = ids[:-d], ids[d:]
+            m = (doc_of[:-d] == doc_of[d:]) & (a != b)
+            a, b = a[m], b[m]
+            codes.append((np.minimum(a, b) << _PAIR_SHIFT) | np.maximum(a, b))
+            firsts.append((doc_keys[doc_of[:-d][m]] << _PAIR_SHIFT) | (pos[:-d][m] * window_size + (d - 1)))
+    else:
+        for k, tokens in enumerate(tokenized_docs):
+            uniq = np.array(vocab.encode(list(dict.fromkeys(tokens))), dtype=np.int64)
+            if len(uniq) < 2:
+                continue
+            i, j = np.triu_indices(len(uniq), 1)
+            a, b = uniq[i], uniq[j]
+            codes.append((np.minimum(a, b) << _PAIR_SHIFT) | np.maximum(a, b))
+            firsts.append((doc_keys[k] << _PAIR_SHIFT) | np.arange(len(a), dtype=np.int64))
+    if not codes:
+        z = np.zeros(0, dtype=np.int64)
+        return z, z.copy()
+    return np.concatenate(codes), np.concatenate(firsts)
+
+class CountMinSketch:
+    """
+    ペアコード用の Count-Min スケッチ（depth 行 × width 列のカウンタ）。
+    推定値は真の数以上で、確率 1 - δ（δ = e^-depth）で 真の数 + ε·N（ε = e / width、N = 追加した総数）以下。
+    """
+    __slots__ = ("width", "depth", "table", "mult", "add_", "total")
+
+    def __init__(self, width: int, depth: int, seed: int = 0):
+        rng = np.random.default_rng(seed)
+        self.width = int(width)
+        self.depth = int(depth)
+        self.table = np.zeros((self.depth, self.width), dtype=np.int64)
+        self.mult = rng.integers(1, 2**63 - 1, self.depth, dtype=np.uint64) | np.uint64(1)
+        self.add_ = rng.integers(0, 2**63 - 1, self.depth, dtype=np.uint64)
+        self.total = 0
+
+    @classmethod
+    def from_budget(cls, memory_bytes: int, delta: float = APPROX_DELTA, seed: int = 0) -> "CountMinSketch":
+        depth = max(1, math.ceil(math.log(1.0 / delta)))
+        return cls(max(1, memory_bytes // (8 * depth)), depth, seed)
+
+    @property
+    def epsilon(self) -> float:
+        return math.e / self.width
+
+    def error_bound(self) -> float:
+        """推定値の過大分の上限 ε·N。"""
+        return self.epsilon * self.total
+
+    def _columns(self, codes: np.ndarray) -> np.ndarray:
+        h = codes.astype(np.uint64)[None, :] * self.mult[:, None] + self.add_[:, None]
+        return ((h >> np.uint64(32)) % np.uint64(self.width)).astype(np.int64)
+
+    def add(self, codes: np.ndarray, counts: np.ndarray):
+        cols = self._columns(codes)
+        for r in range(self.depth):
+            np.add.at(self.table[r], cols[r], counts)
+        self.total += int(counts.sum())
+
+    def estimate(self, codes: np.ndarray) -> np.ndarray:
+        cols = self._columns(codes)
+        return self.table[np.arange(self.depth)[:, None], cols].min(axis=0)
+
+def build_pair_counts_approx(tokenized_docs: List[List[str]], vocab: Vocabulary, window_size=None, doc_keys=None,
+                             memory_mb: float = APPROX_MEMORY_MB, delta: float = APPROX_DELTA,
+                             capacity: int = APPROX_CANDIDATES, batch_docs: int = APPROX_BATCH_DOCS) -> Tuple[PairCounts, float]:
+    """
+    build_pair_counts の近似版。文書を batch_docs 件ずつスケッチに流し、推定値の上位 capacity 件の
+    ペアだけを候補として持ち続ける（メモリはスケッチ + 候補 + 1 バッチ分で一定）。
+    (候補ペアの PairCounts（共起数は推定値）, 推定値の誤差上限 ε·N) を返す。
+    """
+    n_docs = len(tokenized_docs)
+    doc_keys = np.arange(n_docs, dtype=np.int64) if doc_keys is None else np.asarray(doc_keys, dtype=np.int64)
+    sketch = CountMinSketch.from_budget(int(memory_mb * (1 << 20)), delta)
+    cand_keys = np.zeros(0, dtype=np.int64)
+    cand_first = np.zeros(0, dtype=np.int64)
+    for start in range(0, n_docs, max(1, batch_docs)):
+        end = min(n_docs, start + batch_docs)
+        codes, firsts = _raw_pair_codes(tokenized_docs[start:end], vocab, window_size, doc_keys[start:end])
+        if len(codes) == 0:
+            continue
+        batch = PairCounts.from_raw(vocab, codes, firsts)
+        sketch.add(batch.keys, batch.counts)
+        # 既存の候補とこのバッチのペアを合わせ、推定値の上位 capacity 件だけ残す
+        keys = np.concatenate([cand_keys, batch.keys])
+        first = np.concatenate([cand_first, batch.first])
+        order = np.lexsort((first, keys))
+        keys, first = keys[order], first[order]
+        uniq = np.r_[True, keys[1:] != keys[:-1]]
+        keys, first = keys[uniq], first[uniq]
+        if len(keys) > capacity:
+            keep = np.argpartition(-sketch.estimate(keys), capacity - 1)[:capacity]
+            keep.sort()
+            keys, first = keys[keep], first[keep]
+        cand_keys, cand_first = keys, first
+    return PairCounts(vocab, cand_keys, sketch.estimate(cand_keys), cand_first), sketch.error_bound()
+
+def top_k_recall(exact: PairCounts, approx: PairCounts, k: int = 20) -> float:
+    """正確な集計の上位 k 件のうち、近似集計の上位 k 件にも入ったペアの割合。"""
+    top_exact = exact.keys[exact._order()[:k]]
+    if len(top_exact) == 0:
+        return 1.0
+    top_approx = approx.keys[approx._order()[:k]]
+    return len(np.intersect1d(top_exact, top_approx)) / len(top_exact)
+
+class CooccurrenceGraph:
+    """
+    分析用の共起グラフ（CSR 形式の隣接配列）。networkx のグラフは描画する上位エッジ分だけ作る。
+    - nodes:   語（共起 Counter の挿入順に networkx のグラフへエッジを追加したときの G.nodes と同じ初出順）
+    - indptr:  ノード i の隣接は indices[indptr[i]:indptr[i+1]]（相手のノード番号の昇順）
+    - weights: 各隣接の共起数
+    - rank:    そのエッジの追加順（隣接語やエッジを networkx と同じ並びで返すのに使う）
+    """
+    __slots__ = ("nodes", "index", "indptr", "indices", "weights", "rank")
+
+    def __init__(self, nodes: List[str], indptr: np.ndarray, indices: np.ndarray, weights: np.ndarray, rank: np.ndarray):
+        self.nodes = nodes
+        self.index = {n: i for i, n in enumerate(nodes)}
+        self.indptr = indptr
+        self.indices = indices
+        self.weights = weights
+        self.rank = rank
+
+    @classmethod
+    def from_pair_counts(cls, pair_counts: PairCounts, min_freq: int = 5) -> "CooccurrenceGraph":
+        """共起数 min_freq 以上のペアから作る（エッジの追加順は Counter の挿入順 = 初出順）。"""
+        pc = pair_counts.select(pair_counts.counts >= min_freq)
+        order = np.argsort(pc.first, kind="stable")
+        lo, hi = pc.pair_ids()
+        lo, hi, w = lo[order], hi[order], pc.counts[order]
+        tokens = pc.vocab.id2token
+        # Counter のキーと同じく文字列順で小さい方を 1 語目にする
+        swap = np.fromiter((tokens[a] > tokens[b] for a, b in zip(lo.tolist(), hi.tolist())), dtype=bool, count=len(lo))
+        u, v = np.where(swap, hi, lo), np.where(swap, lo, hi)
+        seq = np.empty(2 * len(u), dtype=np.int64)
+        seq[0::2], seq[1::2] = u, v
+        ids, first_pos = np.unique(seq, return_index=True)
+        appear = np.argsort(first_pos, kind="stable")
+        node_of = np.empty(len(ids), dtype=np.int64)
+        node_of[appear] = np.arange(len(ids), dtype=np.int64)
+        un, vn = node_of[np.searchsorted(ids, u)], node_of[np.searchsorted(ids, v)]
+        edge_rank = np.arange(len(u), dtype=np.int64)
+        back = un != vn  # 自己ループは片方向だけ
+        src = np.concatenate([un, vn[back]])
+        dst = np.concatenate([vn, un[back]])
+        order = np.lexsort((dst, src))
+        indptr = np.zeros(len(ids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(src, minlength=len(ids)), out=indptr[1:])
+        return cls([tokens[i] for i in ids[appear].tolist()], indptr, dst[order],
+                   np.concatenate([w, w[back]])[order], np.concatenate([edge_rank, edge_rank[back]])[order])
+
+    def __len__(self) -> int:
+        return len(self.nodes)
+
+    def __contains__(self, word: str) -> bool:
+        return word in self.index
+
+    def number_of_edges(self) -> int:
+        return int((self.indices >= np.repeat(np.arange(len(self.nodes)), np.diff(self.indptr))).sum())
+
+    def neighbors(self, word: str) -> List[Tuple[str, int]]:
+        """隣接語と共起数（networkx の G.adj[word] と同じ並び）。"""
+        i = self.index[word]
+        s, e = self.indptr[i], self.indptr[i + 1]
+        o = np.argsort(self.rank[s:e], kind="stable")
+        return [(self.nodes[j], w) for j, w in zip(self.indices[s:e][o].tolist(), self.weights[s:e][o].tolist())]
+
+    def neighbor_arrays(self, word: str) -> Tuple[np.ndarray, np.ndarray]:
+        """隣接ノード番号（昇順）と共起数の配列。"""
+        i = self.index[word]
+        s, e = self.indptr[i], self.indptr[i + 1]
+        return self.indices[s:e], self.weights[s:e]
+
+    def weight(self, a: str, b: str) -> Optional[int]:
+        """a-b の共起数（エッジがなければ None）。"""
+        i, j = self.index.get(a), self.index.get(b)
+        if i is None or j is None:
+            return None
+        s, e = self.indptr[i], self.indptr[i + 1]
+        k = s + np.searchsorted(self.indices[s:e], j)
+        if k < e and self.indices[k] == j:
+            return int(self.weights[k])
+        return None
+
+    def top_edges(self, n: Optional[int] = None) -> List[Tuple[str, str, int]]:
+        """重みの降順のエッジ (w1, w2, weight)。同重みは networkx の G.edges と同じ並び。"""
+        src = np.repeat(np.arange(len(self.nodes), dtype=np.int64), np.diff(self.indptr))
+        keep = np.flatnonzero(self.indices >= src)
+        keep = keep[np.lexsort((self.rank[keep], src[keep]))]
+        keep = keep[np.argsort(-self.weights[keep], kind="stable")]
+        if n is not None:
+            keep = keep[:n]
+        return [(self.nodes[a], self.nodes[b], w)
+                for a, b, w in zip(src[keep].tolist(), self.indices[keep].tolist(), self.weights[keep].tolist())]
+
+class PairPeriodMatrix:
+    """
+    全期間のペア × 期間の共起数（時系列・変化フィルタ・上位選択の基本構造）。
+    - keys:         ペアコードの昇順（行番号 = 整数のペア ID）
+    - counts:       共起数の行列 [ペア, 期間]
+    - first_period: 最初に出現した期間
+    - first:        その期間での初出位置（期間順に Counter を update した合計の挿入順を再現する）
+    """
+    __slots__ = ("vocab", "labels", "keys", "counts", "first_period", "first")
+
+    def __init__(self, vocab: Vocabulary, labels: List[str], keys: np.ndarray, counts: np.ndarray,
+                 first_period: np.ndarray, first: np.ndarray):
+        self.vocab = vocab
+        self.labels = labels
+        self.keys = keys
+        self.counts = counts
+        self.first_period = first_period
+        self.first = first
+
+    @classmethod
+    def from_period_counts(cls, vocab: Vocabulary, labels: List[str], period_pair_counts: List[PairCounts]) -> "PairPeriodMatrix":
+        """期間ごとの PairCounts（同じ語彙を共有）から作る。"""
+        keys = np.unique(np.concatenate([pc.keys for pc in period_pair_counts])) if period_pair_counts else np.zeros(0, dtype=np.int64)
+        counts = np.zeros((len(keys), len(period_pair_counts)), dtype=np.int64)
+        first_period = np.full(len(keys), -1, dtype=np.int64)
+        first = np.zeros(len(keys), dtype=np.int64)
+        for j, pc in enumerate(period_pair_counts):
+            rows = np.searchsorted(keys, pc.keys)
+            counts[rows, j] = pc.counts
+            new = first_period[rows] < 0
+            first_period[rows[new]] = j
+            first[rows[new]] = pc.first[new]
+        return cls(vocab, list(labels), keys, counts, first_period, first)
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def totals(self) -> np.ndarray:
+        return self.counts.sum(axis=1)
+
+    def most_common_order(self) -> np.ndarray:
+        """合計の降順の行番号（同数は初出順。期間ごとの Counter を合計した most_common と同じ並び）。"""
+        return np.lexsort((self.first, self.first_period, -self.totals()))
+
+    def association(self, freq: Counter, measure: str = RANKING_MEASURE, min_count: int = ASSOCIATION_MIN_COUNT) -> np.ndarray:
+        """全期間を合わせた関連度（freq は全期間の語頻度の合計）。"""
+        return association_scores(self.vocab, self.keys, self.totals(), freq, measure, min_count)
+
+    def ranked_order(self, scores: np.ndarray) -> np.ndarray:
+        """関連度の降順の行番号（同点は合計の降順 → 初出順）。"""
+        return np.lexsort((self.first, self.first_period, -self.totals(), -scores))
+
+    def pairs(self, rows: np.ndarray) -> List[Tuple[str, str]]:
+        """行番号 -> 文字列順に並べた 2 語タプル。"""
+        id2token = self.vocab.id2token
+        out = []
+        for code in self.keys[rows].tolist():
+            a, b = id2token[code >> _PAIR_SHIFT], id2token[code & _PAIR_MASK]
+            out.append((a, b) if a <= b else (b, a))
+        return out
+
+    def rows_for(self, pairs: List[Tuple[str, str]]) -> np.ndarray:
+        """2 語タプル -> 行番号（行列にないペアは -1）。"""
+        token2id = self.vocab.token2id
+        codes = []
+        for a, b in pairs:
+            i, j = token2id.get(a), token2id.get(b)
+            codes.append(-1 if i is None or j is None else (min(i, j) << _PAIR_SHIFT) | max(i, j))
+        codes = np.array(codes, dtype=np.int64)
+        if len(self.keys) == 0:
+            return np.full(len(codes), -1, dtype=np.int64)
+        pos = np.minimum(np.searchsorted(self.keys, codes), len(self.keys) - 1)
+        return np.where((codes >= 0) & (self.keys[pos] == codes), pos, -1)
+
+    def values(self, rows: np.ndarray, period_doc_counts: Optional[List[int]] = None, normalize: bool = NORMALIZE_TIMESERIES) -> np.ndarray:
+        """行 rows の時系列 [期間, ペア]。normalize なら期間の行数（なければ共起の合計）で割る。"""
+        vals = self.counts[rows].T
+        if not normalize:
+            return vals
+        if period_doc_counts is not None and len(period_doc_counts) == self.counts.shape[1]:
+            totals = np.asarray(period_doc_counts, dtype=float)
+        else:
+            totals = self.counts.sum(axis=0).astype(float)
+        out = vals.astype(float)
+        ok = totals > 0
+        out[ok] = vals[ok] / totals[ok, None]
+        return out
+
+    def timeseries(self, rows: np.ndarray, period_doc_counts: Optional[List[int]] = None,
+                   normalize: bool = NORMALIZE_TIMESERIES) -> pd.DataFrame:
+        """build_pair_timeseries_with_norm と同じ形の DataFrame（行 = 期間、列 = "語1|語2"）。"""
+        columns = ["|".join(p) for p in self.pairs(rows)]
+        return pd.DataFrame(self.values(rows, period_doc_counts, normalize), index=self.labels, columns=columns)
+
+    def _history_presence(self, window: int = BURST_WINDOW) -> Tuple[np.ndarray, np.ndarray]:
+        """(直前 window 期間のうちペアが出現した期間数 [ペア, 期間], 各期間の直前の期間数 [期間])。"""
+        n_periods = self.counts.shape[1]
+        seen = np.zeros((len(self.keys), n_periods + 1), dtype=np.int64)
+        np.cumsum(self.counts > 0, axis=1, out=seen[:, 1:])
+        t = np.arange(n_periods)
+        lo = np.maximum(t - window, 0)
+        return seen[:, t] - seen[:, lo], t - lo
+
+    def burst_scores(self, period_doc_counts: Optional[List[int]] = None, window: int = BURST_WINDOW,
+                     min_history: int = BURST_MIN_HISTORY) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        各ペア・各期間の急増度。直前 window 期間の割合（共起数 / 期間の行数）の平均・分散を基準に
+        (z スコア, 期待共起数) の行列 [ペア, 期間] を返す（基準となる期間がない最初の期間は nan）。
+        ばらつきの推定が不安定な少数回の出現で z が跳ねないよう、分散にポアソン分（期待値 + 1）を足す。
+        直前 window 期間に出現した期間が min_history 未満のペアは、期待値 0 で z が共起数そのものになり
+        本当の急増より上に来てしまうので z を nan にする（new_pairs で別に出す）。
+        累積和で全ペア・全期間をまとめて計算する。
+        """
+        n_periods = self.counts.shape[1]
+        if period_doc_counts is not None and len(period_doc_counts) == n_periods:
+            docs = np.asarray(period_doc_counts, dtype=float)
+        else:
+            docs = self.counts.sum(axis=0).astype(float)
+        docs = np.where(docs > 0, docs, 1.0)
+        rate = self.counts / docs
+        c1 = np.zeros((len(self.keys), n_periods + 1))
+        c2 = np.zeros((len(self.keys), n_periods + 1))
+        np.cumsum(rate, axis=1, out=c1[:, 1:])
+        np.cumsum(rate * rate, axis=1, out=c2[:, 1:])
+        t = np.arange(n_periods)
+        lo = np.maximum(t - window, 0)
+        h = (t - lo).astype(float)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            mean = (c1[:, t] - c1[:, lo]) / h
+            var = np.maximum((c2[:, t] - c2[:, lo]) / h - mean * mean, 0.0)
+            expected = mean * docs
+            z = (self.counts - expected) / np.sqrt(var * docs * docs + expected + 1.0)
+        seen, _ = self._history_presence(window)
+        z[seen < max(1, min_history)] = np.nan
+        z[:, h == 0] = np.nan
+        expected[:, h == 0] = np.nan
+        return z, expected
+
+    def emerging_pairs(self, period_doc_counts: Optional[List[int]] = None, window: int = BURST_WINDOW,
+                       z_threshold: float = BURST_Z_THRESHOLD, min_count: int = BURST_MIN_COUNT,
+                       top_n: Optional[int] = BURST_TOP_N, min_history: int = BURST_MIN_HISTORY) -> pd.DataFrame:
+        """期間ごとの急増ペア（z スコアの降順、同点は共起数の降順 → 初出順）。"""
+        z, expected = self.burst_scores(period_doc_counts, window, min_history)
+        hit = (z >= z_threshold) & (self.counts >= min_count)
+        frames = []
+        for j, label in enumerate(self.labels):
+            rows = np.flatnonzero(hit[:, j])
+            if len(rows) == 0:
+                continue
+            rows = rows[np.lexsort((self.first[rows], self.first_period[rows], -self.counts[rows, j], -z[rows, j]))]
+            if top_n is not None:
+                rows = rows[:top_n]
+            frames.append(pd.DataFrame({
+                "期間": label,
+                "順位": np.arange(1, len(rows) + 1),
+                "ペア": ["|".join(p) for p in self.pairs(rows)],
+                "共起数": self.counts[rows, j],
+                "期待値": expected[rows, j],
+                "zスコア": z[rows, j],
+            }))
+        if not frames:
+            return pd.DataFrame(columns=["期間", "順位", "ペア", "共起数", "期待値", "zスコア"])
+        return pd.concat(frames, ignore_index=True)
+
+    def new_pairs(self, window: int = BURST_WINDOW, min_count: int = BURST_MIN_COUNT,
+                  top_n: Optional[int] = BURST_TOP_N) -> pd.DataFrame:
+        """
+        期間ごとの新規ペア: 直前 window 期間に一度も出ておらず、この期間に min_count 回以上出たペア
+        （共起数の降順 → 初出順）。初出 は全期間を通して初めて出た期間かどうか（False なら再出現）。
+        """
+        seen, h = self._history_presence(window)
+        hit = (seen == 0) & (self.counts >= min_count)
+        hit[:, h == 0] = False
+        frames = []
+        for j, label in enumerate(self.labels):
+            rows = np.flatnonzero(hit[:, j])
+            if len(rows) == 0:
+                continue
+            rows = rows[np.lexsort((self.first[rows], self.first_period[rows], -self.counts[rows, j]))]
+            if top_n is not None:
+                rows = rows[:top_n]
+            frames.append(pd.DataFrame({
+                "期間": label,
+                "順位": np.arange(1, len(rows) + 1),
+                "ペア": ["|".join(p) for p in self.pairs(rows)],
+                "共起数": self.counts[rows, j],
+                "初出": self.first_period[rows] == j,
+            }))
+        if not frames:
+            return pd.DataFrame(columns=["期間", "順位", "ペア", "共起数", "初出"])
+        return pd.concat(frames, ignore_index=True)
+
+    def trend_table(self, period_doc_counts: Optional[List[int]] = None, normalize: bool = NORMALIZE_TIMESERIES,
+                    top_n: Optional[int] = None, changed_only: bool = True) -> pd.DataFrame:
+        """
+        全ペアを変化幅（max - min）の降順に並べた表。changed_only なら変化フィルタを通ったものだけ。
+        各期間の値・合計・最大・最小・変化幅・相対変化を持つ。
+        """
+        rows = np.arange(len(self.keys))
+        vals = self.values(rows, period_doc_counts, normalize)
+        mx, mn = (vals.max(axis=0), vals.min(axis=0)) if len(self.labels) else (np.zeros(len(rows)), np.zeros(len(rows)))
+        diff = mx - mn
+        rel = np.divide(diff, mx, out=np.zeros(len(rows)), where=mx > 0)
+        keep = _change_mask(vals) if changed_only else np.ones(len(rows), dtype=bool)
+        sel = np.flatnonzero(keep)
+        sel = sel[np.lexsort((self.first[sel], self.first_period[sel], -self.totals()[sel], -diff[sel]))]
+        if top_n is not None:
+            sel = sel[:top_n]
+        df = pd.DataFrame(vals[:, sel].T, index=["|".join(p) for p in self.pairs(sel)], columns=self.labels)
+        df["合計"] = self.totals()[sel]
+        df["最大"], df["最小"], df["変化幅"], df["相対変化"] = mx[sel], mn[sel], diff[sel], rel[sel]
+        df.index.name = "ペア"
+        return df
+
+# =========================================================
+# 関連度（PMI / NPMI / Dice / Jaccard / 対数尤度比）
+# =========================================================
+ASSOCIATION_MEASURES = ("count", "pmi", "npmi", "dice", "jaccard", "llr")
+
+def association_measure(measure: str, n_xy: np.ndarray, f_x: np.ndarray, f_y: np.ndarray, n: float) -> np.ndarray:
+    """
+    ペアの共起数 n_xy・各語の出現数 f_x, f_y・総語数 n から関連度をまとめて計算する。
+    共起数は窓内の組数なので語の出現数を超えることがある。2×2 分割表が成り立つよう
+    n_xy は min(n_xy, f_x, f_y) に切り詰めて使う（Dice・Jaccard・NPMI は 1 以下になる）。
+    """
+    if measure not in ASSOCIATION_MEASURES:
+        raise ValueError(f"未対応の関連度です: {measure}（{', '.join(ASSOCIATION_MEASURES)} のいずれか）")
+    n_xy = np.asarray(n_xy, dtype=float)
+    if measure == "count":
+        return n_xy
+    f_x = np.asarray(f_x, dtype=float)
+    f_y = np.asarray(f_y, dtype=float)
+    o11 = np.minimum(n_xy, np.minimum(f_x, f_y))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        if measure in ("pmi", "npmi"):
+            pmi = np.log2(o11 * n / (f_x * f_y))
+            if measure == "pmi":
+                out = pmi
+            else:
+                denom = -np.log2(o11 / n)
+                out = np.where(denom > 0, pmi / denom, 1.0)
+        elif measure == "dice":
+            out = 2.0 * o11 / (f_x + f_y)
+        elif measure == "jaccard":
+            out = o11 / (f_x + f_y - o11)
+        else:
+            o12 = f_x - o11
+            o21 = f_y - o11
+            o22 = np.maximum(n - o11 - o12 - o21, 0.0)
+            total = o11 + o12 + o21 + o22
+            r1, r2 = o11 + o12, o21 + o22
+            c1, c2 = o11 + o21, o12 + o22
+            out = np.zeros(len(o11))
+            for o, r, c in ((o11, r1, c1), (o12, r1, c2), (o21, r2, c1), (o22, r2, c2)):
+                term = o * np.log(o * total / (r * c))
+                out += np.where(o > 0, term, 0.0)
+            out = 2.0 * out
+    return np.where(np.isfinite(out), out, -np.inf)
+
+def association_scores(vocab: Vocabulary, keys: np.ndarray, counts: np.ndarray, freq: Counter,
+                       measure: str = RANKING_MEASURE, min_count: int = ASSOCIATION_MIN_COUNT) -> np.ndarray:
+    """
+    ペアコード keys・共起数 counts の関連度。語の出現数は freq（頻度フィルタ前の語頻度）、総語数はその合計。
+    measure が "count" 以外なら、共起数 min_count 未満のペアは -inf にして後ろに回す。
+    """
+    if measure == "count":
+        return counts.astype(float)
+    f = np.zeros(len(vocab), dtype=float)
+    token2id = vocab.token2id
+    for t, c in freq.items():
+        i = token2id.get(t)
+        if i is not None:
+            f[i] = c
+    scores = association_measure(measure, counts, f[keys >> _PAIR_SHIFT], f[keys & _PAIR_MASK], float(sum(freq.values())))
+    if min_count:
+        scores[counts < min_count] = -np.inf
+    return scores
+
+# =========================================================
+# 任意の長さ・スライド窓の期間の集計
+# =========================================================
+def count_period_pairs(chunk: pd.DataFrame, vocab: Vocabulary, window_size=COOCCURRENCE_WINDOW) -> Tuple[PairCounts, Counter]:
+    """
+    1 期間の tokens 列に期間内の頻度フィルタを適用してから共起を数える（analyze_period の共起数と同じ）。
+    頻度フィルタは期間全体の語頻度で決まり、窓はフィルタ後の語列で数えるので、月ごとの集計の足し合わせでは作れない。
+    """
+    has_tokens = chunk["tokens"].notna()
+    tokenized_docs, freq = filter_tokens_by_freq(chunk["tokens"][has_tokens].tolist())
+    return build_pair_counts(tokenized_docs, vocab, window_size=window_size, doc_keys=chunk.index[has_tokens].to_numpy()), freq
+
+def build_window_counts(df: pd.DataFrame, vocab: Vocabulary, months: int = PERIOD_MONTHS,
+                        step_months: Optional[int] = None, anchor_month: Optional[int] = None):
+    """make_period_specs の期間（スライド窓・年度も可）ごとに (ラベル, PairCounts, freq, 行数) を返す。"""
+    out = []
+    for period_start, _, chunk in split_periods(df, months, step_months, anchor_month):
+        pair_counts, freq = count_period_pairs(chunk, vocab)
+        out.append((period_label(period_start, months), pair_counts, freq, len(chunk)))
+    return out
+
+# --- 月次ベース集計（SLIDING_TREND_MONTHLY_BASES: 頻度フィルタを後からかける近似） ---
+class MonthlyBase:
+    """1 か月分の頻度フィルタ前の共起数・語頻度・行数。窓はこれを足し合わせて作る。"""
+    __slots__ = ("start", "pair_counts", "freq", "n_rows")
+
+    def __init__(self, start, pair_counts: PairCounts, freq: Counter, n_rows: int):
+        self.start = start
+        self.pair_counts = pair_counts
+        self.freq = freq
+        self.n_rows = n_rows
+
+def build_monthly_bases(df: pd.DataFrame, vocab: Vocabulary, window_size=COOCCURRENCE_WINDOW) -> Dict[pd.Timestamp, MonthlyBase]:
+    """月の初日 -> MonthlyBase。共起は頻度フィルタ前の語列で数え、初出順は行番号で揃える（月をまたいで足せる）。"""
+    bases = {}
+    for month_start, _, chunk in split_periods(df, months=1):
+        has_tokens = chunk["tokens"].notna()
+        docs = chunk["tokens"][has_tokens].tolist()
+        freq = Counter(t for doc in docs for t in doc)
+        pair_counts = build_pair_counts(docs, vocab, window_size=window_size, doc_keys=chunk.index[has_tokens].to_numpy())
+        bases[pd.Timestamp(month_start)] = MonthlyBase(month_start, pair_counts, freq, len(chunk))
+    return bases
+
+def filter_pairs_by_freq(pair_counts: PairCounts, freq: Counter) -> PairCounts:
+    """2 語とも語頻度が TOKEN_MIN_FREQ 以上 TOKEN_MAX_FREQ 以下のペアだけ残す（filter_tokens_by_freq のペア版）。"""
+    f = np.zeros(len(pair_counts.vocab), dtype=np.int64)
+    token2id = pair_counts.vocab.token2id
+    for t, c in freq.items():
+        i = token2id.get(t)
+        if i is not None:
+            f[i] = c
+    ok = (f >= TOKEN_MIN_FREQ) & (f <= TOKEN_MAX_FREQ)
+    lo, hi = pair_counts.pair_ids()
+    return pair_counts.select(ok[lo] & ok[hi])
+
+def compose_window_counts(bases: Dict[pd.Timestamp, MonthlyBase], vocab: Vocabulary, df: pd.DataFrame,
+                          months: int, step_months: Optional[int] = None, anchor_month: Optional[int] = None):
+    """
+    build_window_counts と同じ窓・同じ形の結果を月次ベース集計の足し合わせで作る。
+    freq（頻度フィルタ前の語頻度）と行数は一致し、共起数は窓の語頻度で filter_pairs_by_freq をかけた近似。
+    """
+    out = []
+    for period_start, period_end, _ in split_periods(df, months, step_months, anchor_month):
+        parts = [b for start, b in bases.items() if period_start <= start <= period_end]
+        freq = Counter()
+        for b in parts:
+            freq.update(b.freq)
+        pair_counts = filter_pairs_by_freq(PairCounts.sum([b.pair_counts for b in parts], vocab), freq)
+        out.append((period_label(period_start, months), pair_counts, freq, sum(b.n_rows for b in parts)))
+    return out
 
-def build_cooccurrence_network_from_counter(counter: Counter, min_freq=5):
-    filtered = {pair: c for pair, c in counter.items() if c >= min_freq}
-    G = nx.Graph()
-    for (w1, w2), c in filtered.items():
-        G.add_edge(w1, w2, weight=c)
-    return G
+# =========================================================
+# 増分実行（透かし + 期間ごとの集計結果の保存）
+# =========================================================
+def period_fingerprint(chunk: pd.DataFrame) -> str:
+    """期間に含まれる行（行番号・日付・本文）のハッシュ。行の追加・変更があれば変わる。"""
+    h = hashlib.sha1()
+    h.update(chunk.index.to_numpy().astype(np.int64).tobytes())
+    h.update(chunk["date"].to_numpy().astype("datetime64[ns]").tobytes())
+    for t in chunk["text"].tolist():
+        h.update(str(t).encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+def analysis_settings_fingerprint(preprocessor: TextPreprocessor, teguchi_map: Dict[str, List[str]]) -> str:
+    """集計結果に影響する設定のハッシュ。前回と異なれば増分状態は使わず全件再計算する。"""
+    h = hashlib.sha1(preprocessor.rules_fingerprint().encode("utf-8"))
+    h.update(repr((COOCCURRENCE_WINDOW, COOCCURRENCE_MIN_FREQ, TOKEN_MIN_FREQ, TOKEN_MAX_FREQ, PERIOD_MONTHS,
+                   DRAW_TOP_EDGES, MAX_NEIGHBORS_FOR_SET, TOP_PROBLEM_SET_PER_TEGUCHI,
+                   PROBLEM_SET_SIZE, OTHER_PROBLEM_SET_SIZE, RANKING_MEASURE, ASSOCIATION_MIN_COUNT, NETWORK_MIN_SCORE,
+                   APPROX_PAIR_COUNTS and (APPROX_MEMORY_MB, APPROX_DELTA, APPROX_CANDIDATES, APPROX_BATCH_DOCS),
+                   sorted(teguchi_map.items()))).encode("utf-8"))
+    return h.hexdigest()
+
+class PeriodRecord:
+    """1 期間分の集計結果（summaries は共起ネットワークが空の期間では None）。"""
+    __slots__ = ("label", "fingerprint", "doc_count", "pair_counts", "freq", "summaries")
+
+    def __init__(self, label: str, fingerprint: str, doc_count: int, pair_counts: PairCounts, freq: Counter, summaries=None):
+        self.label = label
+        self.fingerprint = fingerprint
+        self.doc_count = doc_count
+        self.pair_counts = pair_counts
+        self.freq = freq
+        self.summaries = summaries
+
+class IncrementalState:
+    """
+    前回実行の透かし（最終日付・最終行番号・行数）と期間ごとの集計結果。
+    語彙も保存して ID を固定するので、再利用した PairCounts はそのまま今回の語彙で使える。
+    """
+    VERSION = 1
+
+    def __init__(self, settings: str):
+        self.settings = settings
+        self.vocab = Vocabulary()
+        self.periods: Dict[str, PeriodRecord] = {}
+        self.watermark: Optional[Dict[str, object]] = None
+
+    @classmethod
+    def load(cls, path: Path, settings: str) -> "IncrementalState":
+        state = cls(settings)
+        if not path.exists():
+            return state
+        try:
+            with open(path, "rb") as f:
+                data = pickle.load(f)
+        except Exception as e:
+            print(f"[warn] 増分状態を読み込めないため全件再計算します: {e}")
+            return state
+        if data.get("version") != cls.VERSION or data.get("settings") != settings:
+            return state
+        for t in data["vocab"]:
+            state.vocab.add(t)
+        state.watermark = data["watermark"]
+        for rec in data["periods"]:
+            pair_counts = PairCounts(state.vocab, rec["keys"], rec["counts"], rec["first"])
+            state.periods[rec["label"]] = PeriodRecord(rec["label"], rec["fingerprint"], rec["doc_count"],
+                                                       pair_counts, rec["freq"], rec["summaries"])
+        return state
+
+    def lookup(self, label: str, fingerprint: str) -> Optional[PeriodRecord]:
+        rec = self.periods.get(label)
+        if rec is None or rec.fingerprint != fingerprint:
+            return None
+        return rec
+
+    def count_new_rows(self, df: pd.DataFrame) -> int:
+        if not self.watermark:
+            return len(df)
+        return int((df["date"] > pd.Timestamp(self.watermark["date"])).sum())
+
+    def save(self, path: Path, records: List[PeriodRecord], df: pd.DataFrame):
+        self.periods = {r.label: r for r in records}
+        self.watermark = {
+            "date": df["date"].max().isoformat() if len(df) else None,
+            "row": int(df.index.max()) if len(df) else None,
+            "rows": int(len(df)),
+        }
+        data = {
+            "version": self.VERSION,
+            "settings": self.settings,
+            "vocab": self.vocab.id2token,
+            "watermark": self.watermark,
+            "periods": [{"label": r.label, "fingerprint": r.fingerprint, "doc_count": r.doc_count,
+                         "keys": r.pair_counts.keys, "counts": r.pair_counts.counts, "first": r.pair_counts.first,
+                         "freq": r.freq, "summaries": r.summaries} for r in records],
+        }
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp")
+        with open(tmp, "wb") as f:
+            pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
 
 # =========================================================
 # 表作成（改良：表示用とペアキー用の DataFrame を返す）
 # =========================================================
-def build_cooccurrence_top_table(period_labels, period_cooccurrence_counters, top_n=TOP_COOC_PER_PERIOD):
+def build_cooccurrence_top_table(period_labels, period_cooccurrence_counters, top_n=TOP_COOC_PER_PERIOD,
+                                 period_pair_counts: Optional[List[PairCounts]] = None,
+                                 period_token_freqs: Optional[List[Counter]] = None,
+                                 measure: str = RANKING_MEASURE):
+    """
+    期間ごとの上位ペアの表（表示用・キー用）。measure が "count" 以外なら、period_pair_counts と
+    period_token_freqs から求めた関連度の順に並べ、括弧内も関連度にする。
+    """
+    by_measure = measure != "count" and period_pair_counts is not None and period_token_freqs is not None
     period_top_pairs_display = []
     period_top_pairs_key = []
-    for c in period_cooccurrence_counters:
-        top = c.most_common(top_n)
+    for i, c in enumerate(period_cooccurrence_counters):
+        if by_measure:
+            pc = period_pair_counts[i]
+            ranked = pc.ranked(pc.association(period_token_freqs[i], measure), top_n)
+            top = [(pair, round(score, 2)) for pair, _, score in ranked if score > -np.inf]
+        else:
+            top = c.most_common(top_n)
         # 表示・キーは半角 '|' で統一
         formatted = [f"{p[0][0]}|{p[0][1]} ({p[1]})" for p in top]
         keys = [f"{p[0][0]}|{p[0][1]}" for p in top]
@@ -220,53 +1524,133 @@ def _extract_pair_from_display_cell(display_cell: Optional[str]) -> str:
     s = str(display_cell).strip()
     if not s:
         return ""
-    m = re.match(r'^(.*?)\s*\(\s*\d+\s*\)\s*$', s)
+    # 括弧内は共起数か関連度（小数・負数もある）
+    m = re.match(r'^(.*?)\s*\(\s*-?\d+(?:\.\d+)?\s*\)\s*$', s)
     base = m.group(1) if m else s
     base = base.replace("｜", "|")
     return _normalize_key(base)
 
+# =========================================================
+# 図の表示・描画ワーカー（ヘッドレス一括実行用）
+# =========================================================
+def _show_figure():
+    """対話実行時だけ plt.show() する（HEADLESS では何もしない）。"""
+    if not HEADLESS:
+        plt.show()
+
+def _setup_headless_matplotlib():
+    """ワーカープロセス用: Agg バックエンドにする（pyplot は図を描くときに読み込み、フォントもそのとき設定する）。"""
+    import warnings
+    warnings.filterwarnings("ignore")
+    if "matplotlib" in sys.modules:
+        matplotlib.use("Agg")
+    else:
+        os.environ["MPLBACKEND"] = "Agg"
+
+class FigureRenderPool:
+    """
+    図の描画と PNG 保存をワーカープロセスに回す。submit した時点で制御を返すので
+    分析はその間も進む。close() で全ジョブの完了を待ち、描画中の例外もここで送出する。
+    ワーカーが 1 つ以下、またはプロセスを起動できない環境ではその場で描画する。
+    """
+    def __init__(self, workers: Optional[int] = RENDER_WORKERS):
+        self._executor = None
+        self._futures = []
+        if _resolve_workers(workers) > 1:
+            self._executor = ProcessPoolExecutor(max_workers=_resolve_workers(workers), initializer=_setup_headless_matplotlib)
+
+    def submit(self, fn, *args):
+        if self._executor is not None:
+            try:
+                self._futures.append(self._executor.submit(fn, *args))
+                return
+            except Exception as e:
+                if DEBUG:
+                    print(f"[warn] 描画ワーカーを使えないためメインプロセスで描画します: {e}")
+                self._executor = None
+        fn(*args)
+
+    def close(self):
+        try:
+            for f in self._futures:
+                f.result()
+        finally:
+            if self._executor is not None:
+                self._executor.shutdown()
+            self._futures = []
+
 # =========================================================
 # 表表示（ユニークのみハイライト可能にしたバージョン）
 # =========================================================
+def _print_cooccurrence_table(df_cooc_display: pd.DataFrame):
+    print("\n=== 期間ごとの上位共起ペア（順位 1 → {}） ===".format(df_cooc_display.shape[0]))
+    print(df_cooc_display.to_string())
+
 def show_cooccurrence_table(df_cooc_display: pd.DataFrame,
                             df_cooc_keys: pd.DataFrame = None,
                             alpha: float = 0.25,
                             save_path: Optional[Path] = None,
-                            highlight_unique_only: bool = True):
-    print("\n=== 期間ごとの上位共起ペア（順位 1 → {}） ===".format(df_cooc_display.shape[0]))
-    print(df_cooc_display.to_string())
+                            highlight_unique_only: bool = True,
+                            render_pool: Optional[FigureRenderPool] = None):
+    _print_cooccurrence_table(df_cooc_display)
+    if render_pool is not None and save_path is not None:
+        # ヘッドレス: 描画は描画ワーカーに任せる（保存は render_pool.close() までに完了する）
+        render_pool.submit(render_cooccurrence_table, df_cooc_display, df_cooc_keys, alpha, save_path, highlight_unique_only)
+    else:
+        render_cooccurrence_table(df_cooc_display, df_cooc_keys, alpha, save_path, highlight_unique_only, show=True)
+    if save_path is not None:
+        print(f"共起表画像を保存しました: {save_path}")
 
-    # 期間ごとにどのペアが出現しているかを集計（df_cooc_keys を優先して利用）
-    pair_period_counts = {}
-    if df_cooc_keys is not None:
-        cols = df_cooc_keys.columns
-        for col in cols:
-            for raw in df_cooc_keys[col].values:
-                if raw is None:
-                    continue
-                s = str(raw).strip()
-                if not s:
-                    continue
-                nk = _normalize_key(s.replace("｜", "|"))
-                if nk:
-                    pair_period_counts[nk] = pair_period_counts.get(nk, 0) + 1
-    # フォールバック（もし df_cooc_keys が完全でない場合）
-    for raw in df_cooc_display.values.flatten():
-        if raw is None:
-            continue
-        s = str(raw).strip()
-        if not s:
-            continue
-        nk = _extract_pair_from_display_cell(s)
-        if nk and nk not in pair_period_counts:
-            pair_period_counts[nk] = pair_period_counts.get(nk, 0) + 1
+def _table_cell_keys(df_cooc_display: pd.DataFrame, df_cooc_keys: Optional[pd.DataFrame] = None) -> List[List[str]]:
+    """表の各セルのペアキー（df_cooc_keys を優先し、空なら表示文字列 "a|b (値)" から取り出す）。"""
+    keys = []
+    for r in range(df_cooc_display.shape[0]):
+        row = []
+        for c in range(df_cooc_display.shape[1]):
+            key_val = ""
+            if df_cooc_keys is not None:
+                raw_key = df_cooc_keys.iloc[r, c]
+                if raw_key is not None and str(raw_key).strip():
+                    key_val = _normalize_key(str(raw_key))
+            if not key_val:
+                key_val = _extract_pair_from_display_cell(df_cooc_display.iloc[r, c])
+            row.append(key_val)
+        keys.append(row)
+    return keys
+
+def _table_highlights(df_cooc_display: pd.DataFrame, df_cooc_keys: Optional[pd.DataFrame] = None, alpha: float = 0.25,
+                      highlight_unique_only: bool = True) -> Dict[Tuple[int, int], Tuple[float, float, float, float]]:
+    """塗るセル (行, 列) -> 色。1 つの期間にしか出ないペアに期間順（列 → 行の順）で色を割り当てる。"""
+    cell_keys = _table_cell_keys(df_cooc_display, df_cooc_keys)
+    rows, cols = df_cooc_display.shape
+    pair_period_counts: Dict[str, int] = {}
+    for c in range(cols):
+        for r in range(rows):
+            if cell_keys[r][c]:
+                pair_period_counts[cell_keys[r][c]] = pair_period_counts.get(cell_keys[r][c], 0) + 1
 
     unique_pairs = [p for p, cnt in pair_period_counts.items() if cnt == 1]
-
-    n = max(1, len(unique_pairs))
-    palette = _generate_distinct_palette(n, alpha=alpha)
+    palette = _generate_distinct_palette(max(1, len(unique_pairs)), alpha=alpha)
     color_map = {pair: palette[i] for i, pair in enumerate(unique_pairs)}
 
+    highlights = {}
+    for r in range(rows):
+        for c in range(cols):
+            key_val = cell_keys[r][c]
+            if not key_val or (highlight_unique_only and pair_period_counts.get(key_val, 0) != 1):
+                continue
+            if key_val in color_map:
+                highlights[r, c] = color_map[key_val]
+    return highlights
+
+def render_cooccurrence_table(df_cooc_display: pd.DataFrame,
+                              df_cooc_keys: pd.DataFrame = None,
+                              alpha: float = 0.25,
+                              save_path: Optional[Path] = None,
+                              highlight_unique_only: bool = True,
+                              show: bool = False):
+    highlights = _table_highlights(df_cooc_display, df_cooc_keys, alpha, highlight_unique_only)
+
     fig, ax = plt.subplots(figsize=(max(8, df_cooc_display.shape[1]*1.6), 1 + df_cooc_display.shape[0]*0.6))
     ax.axis('off')
     table = ax.table(cellText=df_cooc_display.values,
@@ -277,66 +1661,20 @@ def show_cooccurrence_table(df_cooc_display: pd.DataFrame,
     table.set_fontsize(10)
     table.scale(1, 1.2)
 
-    cell_map = {}
-    for key, cell in table.get_celld().items():
-        txt = cell.get_text().get_text()
-        if not txt:
-            continue
-        base = _extract_pair_from_display_cell(str(txt).strip())
-        if base:
-            cell_map.setdefault(base, []).append(key)
-
-    used_keys = set()
-    rows = df_cooc_display.shape[0]
-    cols = df_cooc_display.shape[1]
-    for r in range(rows):
-        for c in range(cols):
-            try:
-                key_val = ""
-                if df_cooc_keys is not None:
-                    raw_key = df_cooc_keys.iloc[r, c]
-                    if raw_key is not None and str(raw_key).strip():
-                        key_val = _normalize_key(str(raw_key).replace("｜", "|"))
-
-                if not key_val:
-                    raw_display = df_cooc_display.iloc[r, c]
-                    key_val = _extract_pair_from_display_cell(raw_display)
-
-                if not key_val:
-                    continue
-
-                if highlight_unique_only and pair_period_counts.get(key_val, 0) != 1:
-                    continue
-
-                rgba = color_map.get(key_val)
-                if rgba is None:
-                    continue
-
-                candidates = cell_map.get(key_val, [])
-                chosen = None
-                for k in candidates:
-                    if k not in used_keys:
-                        chosen = k
-                        break
-                if chosen is None and candidates:
-                    chosen = candidates[0]
-                if chosen is not None:
-                    used_keys.add(chosen)
-                    cell = table[chosen]
-                    cell.set_facecolor(rgba)
-                    cell.set_edgecolor("black")
-                    cell.get_text().set_color("black")
-            except Exception as e:
-                if DEBUG:
-                    print(f"[error] r={r} c={c} -> {e}")
+    # colLabels があるので本体のセルは 1 行下。セルは位置で塗る（表示が "a|b (9.31)" のような関連度でも同じ）
+    for (r, c), rgba in highlights.items():
+        cell = table[r + 1, c]
+        cell.set_facecolor(rgba)
+        cell.set_edgecolor("black")
+        cell.get_text().set_color("black")
 
     plt.title(f"各期間の上位 {df_cooc_display.shape[0]} 共起ペアランキング（ユニークのみハイライト）")
     plt.tight_layout()
     if save_path is not None:
         save_path.parent.mkdir(parents=True, exist_ok=True)
         fig.savefig(save_path, dpi=200, bbox_inches='tight')
-        print(f"共起表画像を保存しました: {save_path}")
-    plt.show()
+    if show:
+        _show_figure()
     plt.close(fig)
 
 # =========================================================
@@ -358,7 +1696,8 @@ def export_cooccurrence_table_to_excel(df_keys: pd.DataFrame,
                                        filename: str = "cooccurrence_top.xlsx",
                                        alpha: float = 0.25,
                                        size_multiplier: float = 2.0,
-                                       highlight_unique_only: bool = True):
+                                       highlight_unique_only: bool = True,
+                                       output_dir: Optional[Path] = None):
     # 期間ごとにどのペアが出現しているかを集計
     pair_period_counts = {}
     if df_keys is not None:
@@ -387,20 +1726,15 @@ def export_cooccurrence_table_to_excel(df_keys: pd.DataFrame,
 
     blended_map = {pair: ('#' + _blend_hex_with_white(base_color_map[pair], alpha)) for pair in base_color_map}
 
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "共起上位"
+    # 書き込み専用（行を順に書き出すだけ）のブックにして、スタイルは色ごとに 1 つを使い回す
+    from openpyxl import Workbook
+    from openpyxl.utils import get_column_letter
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(title="共起上位")
+    styles = _SharedCellStyles()
 
     cols = list(df_display.columns)
     header = ["順位\\期間"] + cols
-    ws.append(header)
-
-    for row_idx in range(df_display.shape[0]):
-        row = [df_display.index[row_idx]]
-        for col_idx, col in enumerate(cols):
-            display_val = df_display.iloc[row_idx, col_idx]
-            row.append(display_val)
-        ws.append(row)
 
     base_col_width = 20
     base_header_height = 18
@@ -409,153 +1743,214 @@ def export_cooccurrence_table_to_excel(df_keys: pd.DataFrame,
     final_header_height = base_header_height * max(0.5, size_multiplier)
     final_row_height = base_row_height * max(0.5, size_multiplier)
 
+    # 列幅・行の高さは行を書き出す前に決めておく
     for ci in range(1, len(header) + 1):
-        col_letter = ws.cell(row=1, column=ci).column_letter
-        ws.column_dimensions[col_letter].width = final_col_width
-
+        ws.column_dimensions[get_column_letter(ci)].width = final_col_width
     ws.row_dimensions[1].height = final_header_height
     for r in range(2, 2 + df_display.shape[0]):
         ws.row_dimensions[r].height = final_row_height
 
-    rows = df_display.shape[0]
-    cols_count = len(cols)
-    for r in range(rows):
-        for c in range(cols_count):
+    ws.append(header)
+    for r in range(df_display.shape[0]):
+        row = [df_display.index[r]]
+        for c in range(len(cols)):
+            display_val = df_display.iloc[r, c]
             raw_key = df_keys.iloc[r, c]
             key_val = _normalize_key("" if raw_key is None else str(raw_key))
-            if not key_val:
-                continue
-            if highlight_unique_only and pair_period_counts.get(key_val, 0) != 1:
-                continue
-            blended_hex = blended_map.get(key_val, "#FFFFFF")
-            argb = "FF" + blended_hex[1:].upper()
-            fill = PatternFill(start_color=argb, end_color=argb, fill_type="solid")
-            cell = ws.cell(row=2 + r, column=2 + c)
-            cell.fill = fill
-            cell.font = Font(color="FF000000")
-            cell.alignment = Alignment(horizontal="center", vertical="center")
+            if key_val and not (highlight_unique_only and pair_period_counts.get(key_val, 0) != 1):
+                display_val = styles.cell(ws, display_val, blended_map.get(key_val, "#FFFFFF"))
+            row.append(display_val)
+        ws.append(row)
 
     legend_ws = wb.create_sheet(title="凡例")
+    legend_ws.column_dimensions["A"].width = final_col_width
+    legend_ws.column_dimensions["B"].width = final_col_width * 1.5
+    for r in range(2, 2 + len(unique_pairs)):
+        legend_ws.row_dimensions[r].height = final_row_height
     legend_ws.append(["色（合成）", "ペア"])
-    legend_ws.column_dimensions[legend_ws.cell(row=1, column=1).column_letter].width = final_col_width
-    legend_ws.column_dimensions[legend_ws.cell(row=1, column=2).column_letter].width = final_col_width * 1.5
     for pair in unique_pairs:
-        blended_hex = blended_map.get(pair, "#FFFFFF")
-        argb = "FF" + blended_hex[1:].upper()
-        fill = PatternFill(start_color=argb, end_color=argb, fill_type="solid")
-        legend_ws.append([pair, pair])
-        r = legend_ws.max_row
-        legend_ws.cell(row=r, column=1).fill = fill
-        legend_ws.cell(row=r, column=2).value = pair
-        legend_ws.row_dimensions[r].height = final_row_height
+        legend_ws.append([styles.cell(legend_ws, pair, blended_map.get(pair, "#FFFFFF"), font=False, align=False), pair])
 
-    OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
-    path = OUTPUT_DIR / filename
+    output_dir = OUTPUT_DIR if output_dir is None else Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    path = output_dir / filename
     wb.save(path)
     print(f"Excel ファイルを保存しました: {path}  (alpha={alpha}, size_multiplier={size_multiplier})")
     return path
 
-# =========================================================
-# 問題セット抽出（変更点：3共起のみを参照するように変更）
-# =========================================================
-def _score_set(G: nx.Graph, teguchi: Optional[str], problems: Tuple[str, ...]) -> float:
+class _SharedCellStyles:
+    """書き込み専用シート用のセル生成。塗りつぶしは色ごと、文字色と配置は 1 つを共有する。"""
+    def __init__(self):
+        from openpyxl.cell import WriteOnlyCell
+        from openpyxl.styles import Alignment, Font, PatternFill
+        self._cell_cls = WriteOnlyCell
+        self._fill_cls = PatternFill
+        self.fills: Dict[str, PatternFill] = {}
+        self.font = Font(color="FF000000")
+        self.alignment = Alignment(horizontal="center", vertical="center")
+
+    def fill(self, hexcol: str) -> PatternFill:
+        f = self.fills.get(hexcol)
+        if f is None:
+            argb = "FF" + hexcol.lstrip("#").upper()
+            f = self.fills[hexcol] = self._fill_cls(start_color=argb, end_color=argb, fill_type="solid")
+        return f
+
+    def cell(self, ws, value, hexcol: str, font: bool = True, align: bool = True) -> WriteOnlyCell:
+        c = self._cell_cls(ws, value=value)
+        c.fill = self.fill(hexcol)
+        if font:
+            c.font = self.font
+        if align:
+            c.alignment = self.alignment
+        return c
+
+def export_pair_period_matrix_to_excel(pm: PairPeriodMatrix, filename: str = "cooccurrence_matrix.xlsx",
+                                       min_total: int = PAIR_MATRIX_MIN_TOTAL, output_dir: Optional[Path] = None):
     """
-    変更点:
-    - 前と同じ（最小値を返すロジック）。
-    - ただし、呼び出し側を 3 共起用に限定して使います（関数自体は汎用）。
+    ペア × 期間の共起数を全件 Excel に書き出す（合計の降順、書き込み専用モードで行ごとにストリーム出力）。
+    0 件のセルは空欄にする（ほとんどのペアは一部の期間にしか出ないので、書き出すセル数が大きく減る）。
+    合計が min_total 未満のペアは除く。Excel の行数上限を超える分は切り捨てる。
+    output_dir を省略すると OUTPUT_DIR に保存する。
     """
-    weights = []
+    totals = pm.totals()
+    order = pm.most_common_order()
+    rows = order[totals[order] >= min_total]
+    if len(rows) > _EXCEL_MAX_ROWS - 1:
+        print(f"[WARN] ペアが Excel の行数上限を超えるため上位 {_EXCEL_MAX_ROWS - 1} 件だけ出力します（全 {len(rows)} 件）")
+        rows = rows[:_EXCEL_MAX_ROWS - 1]
+
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(title="共起数")
+    ws.column_dimensions["A"].width = 24
+    ws.freeze_panes = "B2"
+    bold = Font(bold=True)
+    header = []
+    for v in ["ペア"] + list(pm.labels) + ["合計"]:
+        cell = WriteOnlyCell(ws, value=v)
+        cell.font = bold
+        header.append(cell)
+    ws.append(header)
+    for (w1, w2), counts, total in zip(pm.pairs(rows), pm.counts[rows].tolist(), totals[rows].tolist()):
+        ws.append([f"{w1}|{w2}"] + [c or None for c in counts] + [total])
 
-    # 手口と各問題間のエッジ（存在しないならセットとして同時出現は成立しない）
-    if teguchi:
-        for p in problems:
-            if G.has_edge(teguchi, p):
-                weights.append(G[teguchi][p]["weight"])
-            else:
-                return 0.0
+    output_dir = OUTPUT_DIR if output_dir is None else Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    path = output_dir / filename
+    wb.save(path)
+    print(f"Excel ファイルを保存しました: {path}  ({len(rows)} ペア × {len(pm.labels)} 期間)")
+    return path
 
-    # 問題間のペアエッジ（全て存在する必要がある）
-    for a, b in combinations(problems, 2):
-        if G.has_edge(a, b):
-            weights.append(G[a][b]["weight"])
-        else:
-            return 0.0
-
-    if not weights:
-        # 必要エッジが全く見つからない場合のフォールバック
-        if teguchi is None and len(problems) == 1:
-            p = problems[0]
-            # フォールバック: その語の最大隣接エッジ重み（最も強い共起）
-            maxw = 0
-            if p in G:
-                for nbr in G.neighbors(p):
-                    w = G[p][nbr]["weight"]
-                    if w > maxw:
-                        maxw = w
-            return float(maxw)
-        return 0.0
-
-    # 保守的下界として最小値を返す
-    return float(min(weights))
-
-def extract_problem_sets_for_teguchi(
-    G: nx.Graph,
-    teguchi_node: str,
+# =========================================================
+# 問題セット抽出（変更点：3共起のみを参照するように変更）
+# =========================================================
+def _ranked_neighbors(G: CooccurrenceGraph, node: str, classifier: ModalityClassifier,
+                      max_neighbors: Optional[int]) -> List[Tuple[str, int]]:
+    """手口ノードの隣接語（手口語以外）をエッジ重みの降順に（同重みは隣接順）。"""
+    ranked = [(n, w) for n, w in G.neighbors(node) if not classifier.is_teguchi(n)]
+    ranked.sort(key=lambda x: x[1], reverse=True)
+    return ranked if max_neighbors is None else ranked[:max_neighbors]
+
+def mine_problem_sets(
+    G: CooccurrenceGraph,
+    size: int,
     classifier: ModalityClassifier,
-    max_neighbors: int = MAX_NEIGHBORS_FOR_SET
-) -> Dict[Tuple[str, ...], float]:
+    teguchi_node: Optional[str] = None,
+    top_k: int = TOP_PROBLEM_SET_PER_TEGUCHI,
+    nodes: Optional[List[str]] = None,
+    max_neighbors: Optional[int] = MAX_NEIGHBORS_FOR_SET
+) -> List[Tuple[Tuple[str, ...], float]]:
     """
-    変更点（重要）:
-    - ここでは「手口ノード + 2つの問題語（= 合計3語での共起）」のみを抽出します。
-      つまり problems 引数には長さ2のタプル (p1, p2) を与え _score_set を呼びます。
-    - 単独語や問題1語のみのセットは作りません（要望どおり3共起のみ参照）。
+    問題語 size 個のセット（全ペアがエッジでつながる = クリーク）を、スコア（最小エッジ重み）上位 top_k 件だけ探す。
+    - teguchi_node を与えると、その手口の隣接語（エッジ重みの降順）から選び、手口とのエッジもスコアに含める。
+    - 与えなければ nodes（省略時は手口語以外の全ノード）から選ぶ。
+    語を増やしてもスコアは下がる一方なので、現在の上位 top_k 件の最低スコア以下になった時点で枝を打ち切る。
+    同点は候補の並び順での組み合わせ順（combinations で試していたときと同じ）。
     """
-    if teguchi_node not in G:
-        return {}
-    neighbors = [n for n in G.neighbors(teguchi_node) if not classifier.is_teguchi(n)]
-    neighbors.sort(key=lambda n: G[teguchi_node][n]["weight"], reverse=True)
-    problems = neighbors[:max_neighbors]
-    scores: Dict[Tuple[str, ...], float] = {}
-
-    # ペア (p1, p2) を作って、teguchi + (p1,p2) の 3 共起のみ評価
-    for p1, p2 in combinations(problems, 2):
-        if classifier.is_teguchi(p1) or classifier.is_teguchi(p2):
-            continue
-        tpl = tuple(sorted((p1, p2)))
-        s = _score_set(G, teguchi_node, tpl)
-        if s > 0:
-            scores[tpl] = s
-    return scores
+    if teguchi_node is not None:
+        if teguchi_node not in G:
+            return []
+        ranked = _ranked_neighbors(G, teguchi_node, classifier, max_neighbors)
+        candidates = [n for n, _ in ranked]
+        base = [w for _, w in ranked]
+    else:
+        candidates = [n for n in (G.nodes if nodes is None else nodes) if not classifier.is_teguchi(n)]
+        if max_neighbors is not None:
+            candidates = candidates[:max_neighbors]
+        base = [math.inf] * len(candidates)
+    if size <= 0 or top_k <= 0 or len(candidates) < size:
+        return []
 
-def summarize_top_problem_sets_with_others(G: nx.Graph, classifier: ModalityClassifier, top_k: int = 5):
+    # ノード番号 -> 候補番号（候補でなければ -1）で隣接配列を候補同士に絞る
+    cand_of_node = np.full(len(G), -1, dtype=np.int64)
+    cand_of_node[[G.index[n] for n in candidates]] = np.arange(len(candidates), dtype=np.int64)
+    adj = []
+    for n in candidates:
+        ids, ws = G.neighbor_arrays(n)
+        c = cand_of_node[ids]
+        m = c >= 0
+        adj.append(dict(zip(c[m].tolist(), ws[m].tolist())))
+    # 最小ヒープ: 先頭が上位 top_k 件の中の最下位（同点なら後から見つかった方）
+    heap: List[Tuple[float, int, Tuple[int, ...]]] = []
+    found = 0
+
+    def threshold() -> float:
+        return heap[0][0] if len(heap) >= top_k else -math.inf
+
+    def extend(members: List[int], cands: List[Tuple[int, float]]):
+        # cands: (候補番号, 既存メンバー（と手口）とのエッジの最小重み)。番号は members の最後より大きいものだけ
+        nonlocal found
+        need = size - len(members)
+        for pos, (v, score) in enumerate(cands):
+            if len(cands) - pos < need:
+                break
+            if score <= threshold():
+                continue
+            if need == 1:
+                found += 1
+                entry = (score, -found, tuple(members + [v]))
+                if len(heap) < top_k:
+                    heapq.heappush(heap, entry)
+                else:
+                    heapq.heapreplace(heap, entry)
+                continue
+            adj_v = adj[v]
+            thr = threshold()
+            nxt = []
+            for c, sc in cands[pos + 1:]:
+                w = adj_v.get(c)
+                if w is not None:
+                    s2 = min(score, sc, w)
+                    if s2 > thr:
+                        nxt.append((c, s2))
+            if len(nxt) >= need - 1:
+                extend(members + [v], nxt)
+
+    extend([], list(zip(range(len(candidates)), base)))
+    ranked = sorted(heap, key=lambda e: (-e[0], -e[1]))
+    return [(tuple(sorted(candidates[i] for i in combo)), float(score)) for score, _, combo in ranked]
+
+def summarize_top_problem_sets_with_others(G: CooccurrenceGraph, classifier: ModalityClassifier, top_k: int = 5):
     """
     変更点（重要）:
-    - 各手口については extract_problem_sets_for_teguchi を用い、手口 + 2語（=3共起）だけを表示。
-    - 'その他' は問題語3つ (triplet) のみを評価して上位を表示する（これも 3 共起に限定）。
+    - 各手口については手口 + PROBLEM_SET_SIZE 語（既定は 2 語 = 3共起）だけを表示。
+    - 'その他' は問題語 OTHER_PROBLEM_SET_SIZE 個（既定は triplet）のみを評価して上位を表示する。
+    - どちらも mine_problem_sets で上位 top_k 件だけを探す。同点の順序は組み合わせを順に試していたときと同じ。
     """
     summaries = {}
     used_nodes: Set[str] = set()
     for node in G.nodes:
         if classifier.is_teguchi(node):
             teguchi_label = classifier.get_label(node) or node
-            scores = extract_problem_sets_for_teguchi(G, node, classifier)
-            top_items = sorted(scores.items(), key=lambda x: x[1], reverse=True)[:top_k]
+            top_items = classifier.mine_problem_sets(G, node, PROBLEM_SET_SIZE, top_k)
             summaries[teguchi_label] = top_items
             for tpl, _ in top_items:
                 used_nodes.update(tpl)
     other_nodes = [n for n in G.nodes if not classifier.is_teguchi(n) and n not in used_nodes]
-    other_scores: Dict[Tuple[str, ...], float] = {}
-    neighbors = other_nodes[:MAX_NEIGHBORS_FOR_SET]
-    # ここで triplet（問題語3つ）の組み合わせのみ評価する
-    for combo in combinations(neighbors, 3):
-        # 排除: 中に手口語が入っていたらスキップ
-        if any(classifier.is_teguchi(x) for x in combo):
-            continue
-        tpl = tuple(sorted(combo))
-        s = _score_set(G, None, tpl)
-        if s > 0:
-            other_scores[tpl] = s
-    top_other_items = sorted(other_scores.items(), key=lambda x: x[1], reverse=True)[:top_k]
+    top_other_items = mine_problem_sets(G, OTHER_PROBLEM_SET_SIZE, classifier, top_k=top_k, nodes=other_nodes)
     if top_other_items:
         summaries["その他"] = top_other_items
     return summaries
@@ -570,6 +1965,7 @@ def select_candidate_pairs_improved(period_cooccurrence_counters: List[Counter],
                                     fill_from_overall: int = FILL_FROM_OVERALL,
                                     exclude_any_teguchi_in_pair: bool = True) -> List[Tuple[str, str]]:
     selected = []
+    selected_set = set()
     for c in period_cooccurrence_counters:
         top = [pair for pair, _ in c.most_common()]
         kept = 0
@@ -577,8 +1973,9 @@ def select_candidate_pairs_improved(period_cooccurrence_counters: List[Counter],
             w1, w2 = pair
             if exclude_any_teguchi_in_pair and (classifier.is_teguchi(w1) or classifier.is_teguchi(w2)):
                 continue
-            if pair not in selected:
+            if pair not in selected_set:
                 selected.append(pair)
+                selected_set.add(pair)
                 kept += 1
             if kept >= per_period_keep:
                 break
@@ -591,15 +1988,11 @@ def select_candidate_pairs_improved(period_cooccurrence_counters: List[Counter],
         w1, w2 = pair
         if exclude_any_teguchi_in_pair and (classifier.is_teguchi(w1) or classifier.is_teguchi(w2)):
             continue
-        if pair in selected:
+        if pair in selected_set:
             continue
         selected.append(pair)
-    uniq = []
-    seen = set()
-    for p in selected:
-        if p not in seen:
-            uniq.append(p)
-            seen.add(p)
+        selected_set.add(pair)
+    uniq = selected
     if DEBUG:
         print("候補ペア（最終）:", uniq[:50])
     return uniq
@@ -613,7 +2006,6 @@ def build_pair_timeseries_with_norm(period_labels: List[str],
                                     candidate_pairs: List[Tuple[str, str]],
                                     period_doc_counts: Optional[List[int]] = None,
                                     normalize: bool = NORMALIZE_TIMESERIES) -> pd.DataFrame:
-    rows = []
     # 変更点: totals を各期間の行数（相談件数）にする
     if period_doc_counts and len(period_doc_counts) == len(period_cooccurrence_counters):
         totals = period_doc_counts
@@ -621,17 +2013,14 @@ def build_pair_timeseries_with_norm(period_labels: List[str],
         # フォールバック: cooccurrence の合計を使う（ただし今回の要望では period_doc_counts を渡してください）
         totals = [sum(c.values()) if c else 0 for c in period_cooccurrence_counters]
 
-    for idx, c in enumerate(period_cooccurrence_counters):
-        row = {}
-        for pair in candidate_pairs:
-            val = c.get(pair, 0)
-            if normalize and totals[idx] > 0:
-                row["|".join(pair)] = val / totals[idx]
-            else:
-                row["|".join(pair)] = val
-        rows.append(row)
-    df = pd.DataFrame(rows, index=period_labels)
-    return df.fillna(0)
+    # 期間 × ペアの行列にしてから期間ごとの分母でまとめて割る
+    pairs = list(dict.fromkeys(candidate_pairs))
+    vals = np.array([[c.get(pair, 0) for pair in pairs] for c in period_cooccurrence_counters],
+                    dtype=np.int64).reshape(len(period_cooccurrence_counters), len(pairs))
+    t = np.asarray(totals, dtype=float)
+    if normalize and (t > 0).any():
+        vals = np.divide(vals, t[:, None], out=vals.astype(float), where=t[:, None] > 0)
+    return pd.DataFrame(vals, index=period_labels, columns=["|".join(pair) for pair in pairs])
 
 # =========================================================
 # 折れ線グラフ（フィルタリング機能と PNG 保存対応）
@@ -642,20 +2031,22 @@ def filter_timeseries_by_change(df_pairs: pd.DataFrame,
                                  use_rel_or_abs: bool = USE_REL_OR_ABS) -> pd.DataFrame:
     if df_pairs.empty:
         return df_pairs
-    keep_cols = []
-    for col in df_pairs.columns:
-        vals = df_pairs[col].values
-        mx = vals.max()
-        mn = vals.min()
-        diff = mx - mn
-        rel = (diff / mx) if mx > 0 else 0.0
-        if use_rel_or_abs:
-            if diff >= min_abs or rel >= min_rel:
-                keep_cols.append(col)
-        else:
-            if diff >= min_abs:
-                keep_cols.append(col)
-    return df_pairs[keep_cols]
+    return df_pairs.loc[:, _change_mask(df_pairs.to_numpy(), min_abs, min_rel, use_rel_or_abs)]
+
+def _change_mask(vals: np.ndarray,
+                 min_abs: float = MIN_ABS_CHANGE,
+                 min_rel: float = MIN_REL_CHANGE,
+                 use_rel_or_abs: bool = USE_REL_OR_ABS) -> np.ndarray:
+    """時系列 [期間, ペア] の各列について max - min（と (max - min) / max）が閾値以上か。"""
+    if vals.shape[0] == 0:
+        return np.zeros(vals.shape[1], dtype=bool)
+    mx = vals.max(axis=0)
+    diff = mx - vals.min(axis=0)
+    keep = diff >= min_abs
+    if use_rel_or_abs:
+        rel = np.divide(diff, mx, out=np.zeros(len(mx)), where=mx > 0)
+        keep |= rel >= min_rel
+    return keep
 
 def plot_pair_timeseries_improved(df_pairs: pd.DataFrame, top_n: Optional[int] = PLOT_TOP_PAIRS, normalize: bool = False, save_path: Optional[Path] = None):
     if df_pairs.empty:
@@ -690,7 +2081,7 @@ def plot_pair_timeseries_improved(df_pairs: pd.DataFrame, top_n: Optional[int] =
         save_path.parent.mkdir(parents=True, exist_ok=True)
         fig.savefig(save_path, dpi=200, bbox_inches='tight')
         print(f"時系列図を保存しました: {save_path}")
-    plt.show()
+    _show_figure()
     plt.close(fig)
 
 # =========================================================
@@ -784,20 +2175,98 @@ def plot_pair_stacked_bars(df_pairs: pd.DataFrame,
         save_path.parent.mkdir(parents=True, exist_ok=True)
         fig.savefig(save_path, dpi=200, bbox_inches='tight')
         print(f"積み上げ棒グラフを保存しました: {save_path}")
-    plt.show()
+    _show_figure()
     plt.close(fig)
 
 # =========================================================
 # 共起ネットワーク図（サブプロット -> PNG 保存対応）
 # =========================================================
-def plot_cooccurrence_network_subplot(ax, G: nx.Graph, period_label: str, freq: Counter, classifier: ModalityClassifier, top_n_edges: int = DRAW_TOP_EDGES):
-    edges_sorted = sorted(G.edges(data=True), key=lambda x: x[2]['weight'], reverse=True)
+def select_edges_for_drawing(G: CooccurrenceGraph, top_n_edges: int = DRAW_TOP_EDGES) -> List[Tuple[str, str, int]]:
+    """描画する上位エッジ (w1, w2, weight) を重みの降順で返す（同重みは G のエッジ順）。"""
+    return G.top_edges(top_n_edges)
+
+def _graph_from_edges(edges: List[Tuple[str, str, int]]) -> nx.Graph:
     G_sub = nx.Graph()
-    for w1, w2, data in edges_sorted[:top_n_edges]:
-        G_sub.add_edge(w1, w2, weight=data['weight'])
+    for w1, w2, w in edges:
+        G_sub.add_edge(w1, w2, weight=w)
+    return G_sub
+
+def shared_initial_positions(edges: List[Tuple[str, str, int]],
+                             init_pos: Optional[Dict[str, Tuple[float, float]]]) -> Dict[str, Tuple[float, float]]:
+    """init_pos のうち edges に出てくる語の座標（レイアウトの初期値として実際に使う部分）。"""
+    if not init_pos:
+        return {}
+    nodes = dict.fromkeys(n for a, b, _ in edges for n in (a, b))
+    return {n: init_pos[n] for n in nodes if n in init_pos}
+
+def compute_network_layout(edges: List[Tuple[str, str, int]], init_pos: Optional[Dict[str, Tuple[float, float]]] = None):
+    """
+    描画用サブグラフのばねレイアウト。init_pos（前の期間の座標）と共通の語はそこから開始し、
+    少ない反復回数で収束させる（共通の語の位置も期間をまたいで安定する）。
+    """
+    G_sub = _graph_from_edges(edges)
+    shared = shared_initial_positions(edges, init_pos)
+    iterations = LAYOUT_WARM_ITERATIONS if shared else LAYOUT_ITERATIONS
+    pos = nx.spring_layout(G_sub, k=0.4, iterations=iterations, weight='None', seed=42, pos=shared or None)
+    return {n: (float(xy[0]), float(xy[1])) for n, xy in pos.items()}
+
+class NetworkLayoutCache:
+    """
+    ネットワーク図の座標キャッシュ（キーは描画するエッジ集合と重み、初期座標）。
+    layout() を期間順に呼ぶと、直前に求めた座標を次の期間の初期座標に使う。
+    初期座標が違えば結果も違うので、共通の語の初期座標もキーに入れる。
+    """
+    def __init__(self, path: Path = LAYOUT_CACHE_PATH, max_entries: int = LAYOUT_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self.entries: Dict[str, Dict[str, List[float]]] = {}
+        self.previous: Optional[Dict[str, Tuple[float, float]]] = None
+        self._dirty = False
+        if path.exists():
+            try:
+                with open(path, encoding="utf-8") as f:
+                    self.entries = json.load(f)
+            except (OSError, ValueError):
+                self.entries = {}
+
+    @staticmethod
+    def key_for(edges: List[Tuple[str, str, int]], init_pos: Optional[Dict[str, Tuple[float, float]]] = None) -> str:
+        canon = sorted((min(a, b), max(a, b), int(w)) for a, b, w in edges)
+        params = (LAYOUT_ITERATIONS, LAYOUT_WARM_ITERATIONS)
+        shared = sorted((n, float(x), float(y)) for n, (x, y) in shared_initial_positions(edges, init_pos).items())
+        return hashlib.sha1(json.dumps([params, canon, shared], ensure_ascii=False).encode("utf-8")).hexdigest()
+
+    def layout(self, edges: List[Tuple[str, str, int]]) -> Dict[str, Tuple[float, float]]:
+        key = self.key_for(edges, self.previous)
+        cached = self.entries.get(key)
+        if cached is not None:
+            pos = {n: (xy[0], xy[1]) for n, xy in cached.items()}
+        else:
+            pos = compute_network_layout(edges, self.previous)
+            self.entries[key] = {n: [x, y] for n, (x, y) in pos.items()}
+            self._dirty = True
+        self.previous = pos
+        return pos
+
+    def save(self):
+        if not self._dirty:
+            return
+        # 古いもの（先に登録したもの）から削除して上限に収める
+        keys = list(self.entries)
+        for k in keys[:max(0, len(keys) - self.max_entries)]:
+            del self.entries[k]
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump(self.entries, f, ensure_ascii=False)
+        self._dirty = False
+
+def draw_network_edges(ax, edges: List[Tuple[str, str, int]], period_label: str, freq, classifier: ModalityClassifier,
+                       pos: Optional[Dict[str, Tuple[float, float]]] = None):
+    G_sub = _graph_from_edges(edges)
     if len(G_sub.nodes()) == 0:
         return
-    pos = nx.spring_layout(G_sub, k=0.4, iterations=50, weight='None', seed=42)
+    if pos is None:
+        pos = nx.spring_layout(G_sub, k=0.4, iterations=50, weight='None', seed=42)
     node_sizes = [max(50, freq.get(node, 1) * 50) for node in G_sub.nodes()]
     node_colors = [TEGUCHI_COLOR if classifier.is_teguchi(node) else PROBLEM_COLOR for node in G_sub.nodes()]
     widths = [max(0.5, d['weight'] * 0.1) for _, _, d in G_sub.edges(data=True)]
@@ -826,94 +2295,648 @@ def select_period_indices_for_saving(n_periods: int, max_plots: int = MAX_NETWOR
     return sorted(uniq[:max_plots])
 
 # =========================================================
-# main（実行部）
+# 実行時間・メモリの計測（PROFILE）
+# =========================================================
+def peak_rss_mb() -> Optional[float]:
+    """このプロセスのこれまでのピーク RSS（MB）。取得できない環境（Windows）では None。"""
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024  # macOS はバイト、Linux は KB
+
+def _round_opt(x: Optional[float], ndigits: int = 4) -> Optional[float]:
+    return None if x is None else round(x, ndigits)
+
+class StepTimer:
+    """
+    1 期間の処理を lap(名前) で区切り、区間ごとの経過時間と CPU 時間を足し合わせる。
+    並列ワーカーで測った分も期間の結果と一緒に返せるよう、持つのは dict と数値だけ。
+    """
+    __slots__ = ("times", "peak_rss_mb", "_wall", "_cpu")
+
+    def __init__(self):
+        self.times: Dict[str, List[float]] = {}
+        self.peak_rss_mb: Optional[float] = None
+        self._wall = time.perf_counter()
+        self._cpu = time.process_time()
+
+    def lap(self, name: str):
+        wall, cpu = time.perf_counter(), time.process_time()
+        acc = self.times.setdefault(name, [0.0, 0.0])
+        acc[0] += wall - self._wall
+        acc[1] += cpu - self._cpu
+        self._wall, self._cpu = wall, cpu
+
+    def finish(self) -> "StepTimer":
+        self.peak_rss_mb = peak_rss_mb()
+        return self
+
+class StageProfiler:
+    """
+    main() のステージ（読み込み・分割・トークン化・期間ごとの分析・表・Excel など）と期間ごとの内訳について、
+    経過時間・CPU 時間・ピーク RSS・文書数/秒・ペア数を記録して JSON に書き出す。
+    enabled=False なら stage() は何もしないコンテキストを返すだけで、add_period なども即座に戻る。
+    capture_stage と同じ名前のステージだけ cProfile / tracemalloc で詳しく取り、OUTPUT_DIR に保存する。
+    CPU 時間とピーク RSS はこのプロセスの分（PERIOD_WORKERS > 1 のワーカーの分は期間ごとの記録に入る）。
+    """
+    def __init__(self, enabled: bool = PROFILE, capture_stage: Optional[str] = PROFILE_CAPTURE_STAGE,
+                 capture_mode: str = PROFILE_CAPTURE_MODE, capture_top: int = PROFILE_CAPTURE_TOP):
+        if capture_mode not in ("cprofile", "tracemalloc"):
+            raise ValueError(f"未対応の取得方法です: {capture_mode}（cprofile, tracemalloc のいずれか）")
+        self.enabled = enabled
+        self.capture_stage = capture_stage if enabled else None
+        self.capture_mode = capture_mode
+        self.capture_top = capture_top
+        self.stages: List[dict] = []
+        self.periods: List[dict] = []
+        self.captures: Dict[str, dict] = {}
+        self._wall = time.perf_counter()
+        self._cpu = time.process_time()
+
+    def stage(self, name: str, docs: Optional[int] = None, **info):
+        """
+        with profiler.stage("tokenize", docs=n) as rec: ... の形で使う。
+        rec は記録用の dict で、処理後に分かる件数（ペア数など）を書き足せる。
+        """
+        if not self.enabled:
+            return nullcontext({})
+        return self._measure(name, docs, info)
+
+    @contextmanager
+    def _measure(self, name: str, docs: Optional[int], info: dict):
+        rec = {"stage": name}
+        if docs is not None:
+            rec["docs"] = docs
+        rec.update(info)
+        capture = self._start_capture() if name == self.capture_stage else None
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield rec
+        finally:
+            rec["wall_s"] = round(time.perf_counter() - wall, 4)
+            rec["cpu_s"] = round(time.process_time() - cpu, 4)
+            if capture is not None:
+                self._finish_capture(name, capture)
+            rec["peak_rss_mb"] = _round_opt(peak_rss_mb(), 1)
+            if rec.get("docs") and rec["wall_s"] > 0:
+                rec["docs_per_s"] = round(rec["docs"] / rec["wall_s"], 1)
+            self.stages.append(rec)
+
+    def _start_capture(self):
+        if self.capture_mode == "tracemalloc":
+            import tracemalloc
+            tracemalloc.start()
+            return tracemalloc
+        import cProfile
+        prof = cProfile.Profile()
+        prof.enable()
+        return prof
+
+    def _finish_capture(self, name: str, capture):
+        OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+        if self.capture_mode == "tracemalloc":
+            snapshot = capture.take_snapshot()
+            _, peak = capture.get_traced_memory()
+            capture.stop()
+            path = OUTPUT_DIR / f"profile_{name}_tracemalloc.txt"
+            lines = [f"# {name}: 確保メモリのピーク {peak / 2**20:.1f} MB（終了時点で残っている確保の上位 {self.capture_top} 行）"]
+            lines += [str(st) for st in snapshot.statistics("lineno")[:self.capture_top]]
+            path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+            self.captures[name] = {"mode": "tracemalloc", "path": str(path), "traced_peak_mb": round(peak / 2**20, 2)}
+        else:
+            import io
+            import pstats
+            capture.disable()
+            prof_path = OUTPUT_DIR / f"profile_{name}.prof"
+            capture.dump_stats(str(prof_path))
+            buf = io.StringIO()
+            pstats.Stats(capture, stream=buf).sort_stats("cumulative").print_stats(self.capture_top)
+            txt_path = OUTPUT_DIR / f"profile_{name}.txt"
+            txt_path.write_text(buf.getvalue(), encoding="utf-8")
+            self.captures[name] = {"mode": "cprofile", "path": str(prof_path), "summary": str(txt_path)}
+
+    def add_period(self, label: str, docs: Optional[int], pairs: Optional[int], timers: List[Optional[StepTimer]], **info):
+        """期間ごとの内訳（ワーカー側とメイン側の StepTimer を合わせたもの）を記録する。"""
+        if not self.enabled:
+            return
+        steps: Dict[str, List[float]] = {}
+        peaks = []
+        for timer in timers:
+            if timer is None:
+                continue
+            for step, (wall, cpu) in timer.times.items():
+                acc = steps.setdefault(step, [0.0, 0.0])
+                acc[0] += wall
+                acc[1] += cpu
+            if timer.peak_rss_mb is not None:
+                peaks.append(timer.peak_rss_mb)
+        wall = sum(w for w, _ in steps.values())
+        rec = {"period": label, "docs": docs, "pairs": pairs}
+        rec.update(info)
+        rec["wall_s"] = round(wall, 4)
+        rec["cpu_s"] = round(sum(c for _, c in steps.values()), 4)
+        rec["peak_rss_mb"] = _round_opt(max(peaks) if peaks else None, 1)
+        if docs and wall > 0:
+            rec["docs_per_s"] = round(docs / wall, 1)
+        rec["steps"] = {step: {"wall_s": round(w, 4), "cpu_s": round(c, 4)} for step, (w, c) in steps.items()}
+        self.periods.append(rec)
+
+    def report(self) -> dict:
+        step_totals: Dict[str, Dict[str, float]] = {}
+        for p in self.periods:
+            for step, v in p["steps"].items():
+                acc = step_totals.setdefault(step, {"wall_s": 0.0, "cpu_s": 0.0})
+                acc["wall_s"] = round(acc["wall_s"] + v["wall_s"], 4)
+                acc["cpu_s"] = round(acc["cpu_s"] + v["cpu_s"], 4)
+        return {
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": sys.version.split()[0],
+            "cpu_count": os.cpu_count(),
+            "settings": {
+                "tokenize_workers": TOKENIZE_WORKERS,
+                "period_workers": PERIOD_WORKERS,
+                "headless": HEADLESS,
+                "render_workers": RENDER_WORKERS,
+                "approx_pair_counts": APPROX_PAIR_COUNTS,
+                "ranking_measure": RANKING_MEASURE,
+                "incremental": INCREMENTAL,
+            },
+            "wall_s": round(time.perf_counter() - self._wall, 4),
+            "cpu_s": round(time.process_time() - self._cpu, 4),
+            "peak_rss_mb": _round_opt(peak_rss_mb(), 1),
+            "stages": self.stages,
+            "period_steps_total": step_totals,
+            "periods": self.periods,
+            "captures": self.captures,
+        }
+
+    def write(self, path: Path = PROFILE_REPORT_PATH) -> Optional[Path]:
+        """レポートを JSON で保存し、ステージごとの時間を表示する（無効なら何もしない）。"""
+        if not self.enabled:
+            return None
+        report = self.report()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n=== 実行時間の内訳（合計 {report['wall_s']:.2f} 秒） ===")
+        for rec in report["stages"]:
+            rate = f"  {rec['docs_per_s']:.0f} 文書/秒" if "docs_per_s" in rec else ""
+            print(f"  {rec['stage']:<14} {rec['wall_s']:8.2f} 秒 (CPU {rec['cpu_s']:.2f} 秒){rate}")
+        if report["period_steps_total"]:
+            steps = ", ".join(f"{k} {v['wall_s']:.2f}" for k, v in report["period_steps_total"].items())
+            print(f"  期間ごとの内訳（全期間の合計, 秒）: {steps}")
+        print(f"計測レポートを保存しました: {path}")
+        return path
+
+# =========================================================
+# 期間ごとの分析（逐次 / プロセス並列で共通の処理）
+# =========================================================
+class PeriodTask:
+    """
+    1 期間分の入力。プロセス間で受け渡すので語列・配列だけを持つ。
+    - token_docs: 頻度フィルタ前の語列（None なら pair_arrays / freq の前回結果を使う）
+    - analyze: 共起ネットワークと問題セットまで求めるか（False なら共起数だけ）
+    - network_path: ネットワーク図の保存先（None なら保存しない）
+    - profile: 処理の内訳の時間を測るか（PeriodResult.timings に入れて返す）
+    - keep_edges: defer_render のとき、図を描かない期間も上位エッジを返すか（結果 JSON 用）
+    """
+    __slots__ = ("label", "token_docs", "doc_keys", "pair_arrays", "freq", "analyze", "network_path", "show", "defer_render",
+                 "profile", "keep_edges")
+
+    def __init__(self, label: str, token_docs=None, doc_keys=None, pair_arrays=None, freq=None,
+                 analyze: bool = True, network_path: Optional[Path] = None, show: bool = False,
+                 defer_render: bool = False, profile: bool = False, keep_edges: bool = False):
+        self.label = label
+        self.token_docs = token_docs
+        self.doc_keys = doc_keys
+        self.pair_arrays = pair_arrays
+        self.freq = freq
+        self.analyze = analyze
+        self.network_path = network_path
+        self.show = show
+        self.defer_render = defer_render
+        self.profile = profile
+        self.keep_edges = keep_edges
+
+class PeriodResult:
+    """
+    analyze_period の結果（summaries は共起ネットワークが空か未分析なら None）。
+    近似集計（APPROX_PAIR_COUNTS）のときは pair_arrays は候補ペアだけで、approx_report に誤差と再現率を持つ。
+    defer_render のときは図を描かず、描画に必要な上位エッジと語頻度を draw_edges / draw_freq で返す。
+    task.profile のときは timings に処理の内訳（StepTimer）を持つ。
+    """
+    __slots__ = ("pair_arrays", "freq", "summaries", "network_saved", "draw_edges", "draw_freq", "approx_report",
+                 "timings")
+
+    def __init__(self, pair_arrays, freq: Counter, summaries=None, network_saved: bool = False,
+                 draw_edges=None, draw_freq=None, approx_report=None, timings: Optional[StepTimer] = None):
+        self.pair_arrays = pair_arrays
+        self.freq = freq
+        self.summaries = summaries
+        self.network_saved = network_saved
+        self.draw_edges = draw_edges
+        self.draw_freq = draw_freq
+        self.approx_report = approx_report  # 近似集計時: (誤差上限 ε·N, 上位 20 件の再現率 or None)
+        self.timings = timings
+
+def render_network_figure(edges: List[Tuple[str, str, int]], label: str, freq, classifier: ModalityClassifier,
+                          save_path: Optional[Path] = None, show: bool = False,
+                          pos: Optional[Dict[str, Tuple[float, float]]] = None):
+    fig, ax = plt.subplots(figsize=(12, 10))
+    draw_network_edges(ax, edges, label, freq, classifier, pos=pos)
+    plt.tight_layout()
+    if show:
+        _show_figure()
+    if save_path is not None:
+        fig.savefig(save_path, dpi=200, bbox_inches='tight')
+    plt.close(fig)
+
+def build_period_network(pair_counts: PairCounts, freq: Counter, measure: str = RANKING_MEASURE,
+                         min_score: Optional[float] = NETWORK_MIN_SCORE):
+    """
+    共起数 COOCCURRENCE_MIN_FREQ 以上（min_score があれば関連度もその値以上）のペアでグラフを作り、
+    描画する上位 DRAW_TOP_EDGES 本のエッジ（measure の順）と一緒に返す。
+    """
+    if measure == "count" and min_score is None:
+        G = CooccurrenceGraph.from_pair_counts(pair_counts, min_freq=COOCCURRENCE_MIN_FREQ)
+        return G, select_edges_for_drawing(G, DRAW_TOP_EDGES)
+    scores = pair_counts.association(freq, measure)
+    keep = pair_counts.counts >= COOCCURRENCE_MIN_FREQ
+    if min_score is not None:
+        keep &= scores >= min_score
+    kept = pair_counts.select(keep)
+    G = CooccurrenceGraph.from_pair_counts(kept, min_freq=COOCCURRENCE_MIN_FREQ)
+    if measure == "count":
+        return G, select_edges_for_drawing(G, DRAW_TOP_EDGES)
+    return G, [(a, b, c) for (a, b), c, _ in kept.ranked(scores[keep], DRAW_TOP_EDGES)]
+
+def analyze_period(task: PeriodTask, vocab: Vocabulary, classifier: ModalityClassifier) -> PeriodResult:
+    """頻度フィルタ → 共起数 → 共起ネットワーク → 図 → 問題セット を 1 期間分まとめて行う。"""
+    timer = StepTimer() if task.profile else None
+    if task.token_docs is not None:
+        tokenized_docs, freq = filter_tokens_by_freq(task.token_docs)
+        if timer is not None:
+            timer.lap("filter")
+        approx_report = None
+        if APPROX_PAIR_COUNTS:
+            pair_counts, error = build_pair_counts_approx(tokenized_docs, vocab, window_size=COOCCURRENCE_WINDOW, doc_keys=task.doc_keys)
+            recall = None
+            if APPROX_REPORT:
+                exact = build_pair_counts(tokenized_docs, vocab, window_size=COOCCURRENCE_WINDOW, doc_keys=task.doc_keys)
+                recall = top_k_recall(exact, pair_counts, 20)
+            approx_report = (error, recall)
+        else:
+            pair_counts = build_pair_counts(tokenized_docs, vocab, window_size=COOCCURRENCE_WINDOW, doc_keys=task.doc_keys)
+    else:
+        pair_counts = PairCounts(vocab, *task.pair_arrays)
+        freq = task.freq
+        approx_report = None
+    if timer is not None:
+        timer.lap("cooccurrence")
+    result = PeriodResult((pair_counts.keys, pair_counts.counts, pair_counts.first), freq, approx_report=approx_report,
+                          timings=timer)
+    if task.analyze:
+        G, edges = build_period_network(pair_counts, freq)
+        if timer is not None:
+            timer.lap("graph")
+        if len(G) > 0:
+            if task.defer_render and (task.network_path is not None or task.show or task.keep_edges):
+                nodes = {n for w1, w2, _ in edges for n in (w1, w2)}
+                result.draw_edges = edges
+                result.draw_freq = {n: freq[n] for n in nodes if n in freq}
+                result.network_saved = task.network_path is not None
+            elif task.show or task.network_path is not None:
+                render_network_figure(edges, task.label, freq, classifier,
+                                      save_path=task.network_path, show=task.show)
+                result.network_saved = task.network_path is not None
+                if timer is not None:
+                    timer.lap("render")
+            result.summaries = summarize_top_problem_sets_with_others(G, classifier, top_k=TOP_PROBLEM_SET_PER_TEGUCHI)
+            if timer is not None:
+                timer.lap("problem_sets")
+    if timer is not None:
+        timer.finish()
+    return result
+
+_PERIOD_WORKER_CONTEXT = None
+
+def _init_period_worker(vocab: Vocabulary, classifier: ModalityClassifier):
+    global _PERIOD_WORKER_CONTEXT
+    _setup_headless_matplotlib()
+    _PERIOD_WORKER_CONTEXT = (vocab, classifier)
+
+def _analyze_period_worker(task: PeriodTask) -> PeriodResult:
+    vocab, classifier = _PERIOD_WORKER_CONTEXT
+    task.show = False
+    return analyze_period(task, vocab, classifier)
+
+def iter_period_results(tasks: List[PeriodTask], vocab: Vocabulary, classifier: ModalityClassifier,
+                        workers: Optional[int] = None):
+    """
+    期間ごとの分析を実行し、期間順に結果を 1 つずつ返す（受け取った側は残りの期間の
+    分析中に描画などを進められる）。workers > 1 ならプロセス並列（図は保存のみで画面表示はしない）。
+    並列化できなければ、まだ結果を返していない期間から逐次にフォールバックする。
+    語彙は呼び出し前に全期間の語を登録済みであること（ワーカー側で ID が増えないように）。
+    """
+    done = 0
+    if min(_resolve_workers(workers), len(tasks)) > 1:
+        try:
+            with ProcessPoolExecutor(max_workers=min(_resolve_workers(workers), len(tasks)),
+                                     initializer=_init_period_worker, initargs=(vocab, classifier)) as ex:
+                for res in ex.map(_analyze_period_worker, tasks):
+                    yield res
+                    done += 1
+        except Exception as e:
+            if DEBUG:
+                print(f"[warn] 期間ごとの並列分析に失敗したため逐次実行します: {e}")
+            for t in tasks:
+                t.show = False
+    for t in tasks[done:]:
+        yield analyze_period(t, vocab, classifier)
+
+def render_network_png(edges: List[Tuple[str, str, int]], label: str, freq, classifier: ModalityClassifier, save_path: Path,
+                       pos: Optional[Dict[str, Tuple[float, float]]] = None):
+    """描画ワーカー用: 上位エッジだけからネットワーク図を描いて保存する。"""
+    render_network_figure(edges, label, freq, classifier, save_path=save_path, pos=pos)
+
+# =========================================================
+# 結果の JSON 出力（Web アプリでブラウザ側に表・折れ線・ネットワーク図を描かせる用）
 # =========================================================
-def main():
-    TEGUCHI_MAP = {
-        "電話": ["電話","携帯"],
-        "訪問": ["訪問"],
-        "ネット": ["ネット", "サイト"],
-        "メール": ["メール"]
+def period_result_payload(label: str, start, end, doc_count: int, pair_counts: PairCounts, freq: Counter,
+                          summaries, top_n: int = TOP_COOC_PER_PERIOD, measure: str = RANKING_MEASURE) -> dict:
+    """1 期間の結果を JSON にできる dict にする（上位ペア・ペア数・手口別の問題セット）。"""
+    if measure == "count":
+        top = [{"pair": list(pair), "count": c} for pair, c in pair_counts.most_common(top_n)]
+    else:
+        ranked = pair_counts.ranked(pair_counts.association(freq, measure), top_n)
+        top = [{"pair": list(pair), "count": c, "score": round(float(score), 4)}
+               for pair, c, score in ranked if score > -np.inf]
+    if summaries is not None:
+        summaries = {t: [{"problems": list(problems), "score": round(float(score), 2)} for problems, score in items]
+                     for t, items in summaries.items()}
+    return {
+        "label": label,
+        "start": start.strftime("%Y-%m-%d"),
+        "end": end.strftime("%Y-%m-%d"),
+        "rows": doc_count,
+        "pairs": len(pair_counts),
+        "top_pairs": top,
+        "problem_sets": summaries,
+    }
+
+def network_payload(edges: List[Tuple[str, str, int]], freq, pos: Dict[str, Tuple[float, float]],
+                    classifier: ModalityClassifier) -> dict:
+    """ネットワーク図に描く上位エッジのサブグラフ（ノードはレイアウト座標・語頻度・手口ラベル付き）。"""
+    nodes = list(dict.fromkeys(n for w1, w2, _ in edges for n in (w1, w2)))
+    return {
+        "nodes": [{"id": n, "freq": int(freq.get(n, 0)), "teguchi": classifier.get_label(n),
+                   "x": round(pos[n][0], 4), "y": round(pos[n][1], 4)} for n in nodes],
+        "edges": [{"source": w1, "target": w2, "weight": int(w)} for w1, w2, w in edges],
+    }
+
+def export_results_json(period_payloads: List[dict], pair_matrix: PairPeriodMatrix, series_rows: np.ndarray,
+                        n_candidates: int, period_doc_counts: List[int], df_burst: Optional[pd.DataFrame] = None,
+                        df_new: Optional[pd.DataFrame] = None, path: Path = RESULTS_JSON_PATH) -> Path:
+    """
+    期間ごとの結果（period_result_payload + network）、ペアの推移、急増ペア・新規ペアを 1 つの JSON にまとめて保存する。
+    推移は共起数のまま入れる（doc_counts で割れば NORMALIZE_TIMESERIES と同じ割合になる）。
+    series_rows の先頭 n_candidates 件が折れ線の候補ペア（candidate: true）。
+    """
+    series = [{"pair": list(pair), "candidate": i < n_candidates, "counts": counts}
+              for i, (pair, counts) in enumerate(zip(pair_matrix.pairs(series_rows),
+                                                     pair_matrix.counts[series_rows].tolist()))]
+    emerging = []
+    if df_burst is not None:
+        emerging = [{"period": r.期間, "rank": int(r.順位), "pair": r.ペア.split("|"), "count": int(r.共起数),
+                     "expected": round(float(r.期待値), 3), "z": round(float(r.zスコア), 3)}
+                    for r in df_burst.itertuples(index=False)]
+    new_pairs = []
+    if df_new is not None:
+        new_pairs = [{"period": r.期間, "rank": int(r.順位), "pair": r.ペア.split("|"), "count": int(r.共起数),
+                      "first_appearance": bool(r.初出)}
+                     for r in df_new.itertuples(index=False)]
+    payload = {
+        "version": 1,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "settings": {
+            "period_months": PERIOD_MONTHS,
+            "ranking_measure": RANKING_MEASURE,
+            "normalize_timeseries": NORMALIZE_TIMESERIES,
+            "cooccurrence_min_freq": COOCCURRENCE_MIN_FREQ,
+            "draw_top_edges": DRAW_TOP_EDGES,
+        },
+        "teguchi": TEGUCHI_MAP,
+        "periods": period_payloads,
+        "timeseries": {"labels": list(pair_matrix.labels), "doc_counts": [int(n) for n in period_doc_counts],
+                       "series": series},
+        "emerging": emerging,
+        "new_pairs": new_pairs,
     }
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(payload, f, ensure_ascii=False, separators=(",", ":"))
+    return path
+
+# =========================================================
+# main（実行部）
+# =========================================================
+def main(outputs: Tuple[str, ...] = OUTPUTS):
+    """outputs に含まれる結果だけを出す（matplotlib のフォントとバックエンドは図を描くときに設定する）。"""
     classifier = ModalityClassifier(TEGUCHI_MAP)
+    # 問題セットもネットワーク図も要らなければ、共起数を数えるところまでで止める
+    analyze_networks = "summaries" in outputs or "networks" in outputs or "json" in outputs
 
     import warnings
     warnings.filterwarnings("ignore")
-    plt.rcParams["font.family"] = FONT_FAMILY
-    plt.rcParams["axes.unicode_minus"] = False
+
+    # ステージごとの時間・メモリの計測（PROFILE = False なら何もしない）
+    profiler = StageProfiler()
 
     preprocessor = TextPreprocessor()
-    df = load_csv()
-    periods = split_periods(df)
+    token_cache = TokenCache(preprocessor.rules_fingerprint()) if USE_TOKEN_CACHE else None
+    with profiler.stage("load") as rec:
+        if DATA_SOURCE == "sqlite":
+            df = load_cases_from_sqlite(start_date=CASES_START_DATE, end_date=CASES_END_DATE)
+        else:
+            df = load_csv_streaming()
+        rec["docs"] = len(df)
+    # 日付順に 1 回だけ並べ替え、以降の期間分割は二分探索によるスライスで行う
+    with profiler.stage("split", docs=len(df)) as rec:
+        df = sort_by_date(df)
+        periods = split_periods(df)
+        rec["periods"] = len(periods)
+
+    # 増分モード: 行集合が前回と同じ期間は前回の集計結果を再利用する
+    with profiler.stage("incremental"):
+        state = IncrementalState.load(INCREMENTAL_STATE_PATH, analysis_settings_fingerprint(preprocessor, TEGUCHI_MAP)) if INCREMENTAL else None
+        period_fps = [period_fingerprint(chunk) for _, _, chunk in periods] if state is not None else [None] * len(periods)
+        reused = [state.lookup(period_label(start), fp) if state is not None else None
+                  for (start, _, _), fp in zip(periods, period_fps)]
+    if state is not None:
+        print(f"増分モード: 新規行 {state.count_new_rows(df)} 行 / 再計算 {sum(r is None for r in reused)} 期間"
+              f" / 再利用 {sum(r is not None for r in reused)} 期間\n")
+
+    # 行単位のトークンは期間に依存しないので、ここで全行を 1 回だけトークン化する
+    # （増分モードでは再計算が必要な期間の行だけ）
+    with profiler.stage("tokenize") as rec:
+        if state is None:
+            rec["docs"] = len(df)
+            df = tokenize_dataframe(df, preprocessor, cache=token_cache)
+        else:
+            stale = [chunk for (_, _, chunk), r in zip(periods, reused) if r is None]
+            stale_df = pd.concat(stale) if stale else df.iloc[:0]
+            rec["docs"] = len(stale_df)
+            df["tokens"] = tokenize_dataframe(stale_df, preprocessor, cache=token_cache)["tokens"].reindex(df.index)
+        if token_cache is not None:
+            rec["cache_hits"], rec["cache_misses"] = token_cache.hits, token_cache.misses
+        periods = split_periods(df)
 
     # 追加表示: 期間ごとのデータ数（行数）をターミナル出力
-    print("=== 期間（2か月毎）ごとのデータ数（行数） ===")
+    if "counts" in outputs:
+        print(f"=== 期間（{PERIOD_MONTHS}か月毎）ごとのデータ数（行数） ===")
     if not periods:
         print("期間が見つかりません（データの日時列が正しくパースできているか確認してください）。")
-    else:
+    elif "counts" in outputs:
         total_rows = 0
         for idx, (start, end, chunk) in enumerate(periods):
             count = len(chunk)
             total_rows += count
-            label = f"{start.strftime('%Y-%m')}~{(start + pd.DateOffset(months=1)).strftime('%m')}"
+            label = period_label(start)
             print(f"[{idx+1:02d}] {label} | {start.date()} 〜 {end.date()} : {count} 行")
         print(f"合計行数（期間内合計）: {total_rows} 行")
         print("========================================\n")
 
+    OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+    for kind, folder in (("networks", NETWORKS_DIR), ("charts", CHARTS_DIR), ("tables", TABLES_DIR)):
+        if kind in outputs:
+            folder.mkdir(parents=True, exist_ok=True)
+
+    n_periods = len(periods)
+    indices_to_save = select_period_indices_for_saving(n_periods, max_plots=MAX_NETWORK_PLOTS) if "networks" in outputs else []
+    vocab = state.vocab if state is not None else Vocabulary()  # 全期間で共有する語彙
+    show_figures = not HEADLESS and _resolve_workers(PERIOD_WORKERS) <= 1 and "networks" in outputs  # 並列実行時は画面表示せず保存のみ
+    # ヘッドレス時は PNG の描画を描画ワーカーに回し、分析と並行して進める
+    render_pool = FigureRenderPool(RENDER_WORKERS) if HEADLESS and ("tables" in outputs or "networks" in outputs) else None
+    # レイアウトは前の期間の座標から始めるので、期間順にメインプロセスで求める
+    layout_cache = NetworkLayoutCache() if USE_LAYOUT_CACHE and ("networks" in outputs or "json" in outputs) else None
+
+    # 期間ごとの入力を用意する（並列実行でも語 ID が一致するよう、語彙はここで先に登録する）
+    tasks = []
+    reuse_outputs = []
+    with profiler.stage("encode") as stage_rec:
+        for i, ((start, end, chunk), rec) in enumerate(zip(periods, reused)):
+            # 期間ラベル（元のまま）
+            label = period_label(start)
+            filename = NETWORKS_DIR / f"network_{i+1}_{label}.png"
+            # 増分モード: 行が変わっていない期間は前回の図と問題セットをそのまま使う
+            reuse = rec is not None and (rec.summaries is None or i not in indices_to_save or filename.exists())
+            if rec is not None:
+                task = PeriodTask(label, None, None, (rec.pair_counts.keys, rec.pair_counts.counts, rec.pair_counts.first), rec.freq)
+            else:
+                # 保存済みのトークンに期間内の頻度フィルタを適用して共起を作る
+                has_tokens = chunk["tokens"].notna()
+                token_docs = chunk["tokens"][has_tokens].tolist()
+                for doc in token_docs:
+                    vocab.encode(doc)
+                task = PeriodTask(label, token_docs, chunk.index[has_tokens].to_numpy())
+            task.analyze = not chunk.empty and not reuse and analyze_networks
+            task.network_path = filename if i in indices_to_save else None
+            task.show = show_figures
+            task.defer_render = render_pool is not None or layout_cache is not None or "json" in outputs
+            task.keep_edges = "json" in outputs
+            task.profile = profiler.enabled
+            tasks.append(task)
+            reuse_outputs.append(reuse)
+        stage_rec["vocab"] = len(vocab)
+
+    results = []
+    period_networks = [None] * len(tasks)  # 結果 JSON 用: (上位エッジ, 語頻度, 座標)
+    with profiler.stage("periods", docs=sum(len(t.token_docs) for t in tasks if t.token_docs is not None)) as stage_rec:
+        for i, (task, res) in enumerate(zip(tasks, iter_period_results(tasks, vocab, classifier, workers=PERIOD_WORKERS))):
+            # 図の描画とレイアウトはメインプロセスで行うので、期間の内訳にはこちらで測った分も足す
+            main_timer = StepTimer() if profiler.enabled else None
+            draw_edges, draw_freq = res.draw_edges, res.draw_freq
+            if reuse_outputs[i] and (task.keep_edges or (layout_cache is not None and task.network_path is not None)):
+                # 増分モードで前回の結果を再利用した期間も、保存済みの共起数からエッジを求めて期間順に座標を求める
+                # （直前の期間の座標から始めるので、飛ばすと以降の期間の座標が全件実行と変わる）
+                G, edges = build_period_network(PairCounts(vocab, *res.pair_arrays), res.freq)
+                if len(G) > 0:
+                    nodes = {n for w1, w2, _ in edges for n in (w1, w2)}
+                    draw_edges, draw_freq = edges, {n: res.freq[n] for n in nodes if n in res.freq}
+            if draw_edges is not None:
+                if layout_cache is not None:
+                    pos = layout_cache.layout(draw_edges)
+                else:
+                    pos = compute_network_layout(draw_edges) if task.keep_edges else None
+                if main_timer is not None:
+                    main_timer.lap("layout")
+                if task.keep_edges:
+                    period_networks[i] = (draw_edges, draw_freq, pos)
+                # 結果 JSON 用にエッジと座標だけ求めた期間（図を保存も表示もしない）と再利用した期間は描かない
+                if (task.network_path is not None or task.show) and not reuse_outputs[i]:
+                    if render_pool is not None:
+                        render_pool.submit(render_network_png, draw_edges, task.label, draw_freq, classifier, task.network_path, pos)
+                    else:
+                        render_network_figure(draw_edges, task.label, draw_freq, classifier,
+                                              save_path=task.network_path, show=task.show, pos=pos)
+                    if main_timer is not None:
+                        main_timer.lap("render")
+            profiler.add_period(task.label, len(task.token_docs) if task.token_docs is not None else None,
+                                len(res.pair_arrays[0]), [res.timings, main_timer], reused=task.token_docs is None)
+            results.append(res)
+        if layout_cache is not None:
+            layout_cache.save()
+        stage_rec["pairs"] = sum(len(res.pair_arrays[0]) for res in results)
+
     period_labels = []
-    period_tokenized_docs = []
     period_token_freqs = []
     period_cooccurrence_counters = []
+    period_pair_counts = []  # 整数語彙ベースの共起数（Counter はこのビュー）
     period_doc_counts = []  # 追加: 期間ごとの行数（相談件数）
-
-    for start, end, chunk in periods:
-        # 期間ラベル（元のまま）
-        next_month = start + pd.DateOffset(months=1)
-        label = f"{start.strftime('%Y-%m')}~{next_month.strftime('%m')}"
-        docs = chunk["text"].dropna().tolist()
-
-        # トークン化して共起を作る
-        tokenized_docs, freq = tokenize_corpus(docs, preprocessor)
-        coocc = build_cooccurrence_counter(tokenized_docs, window_size=COOCCURRENCE_WINDOW)
-        period_labels.append(label)
-        period_tokenized_docs.append(tokenized_docs)
-        period_token_freqs.append(freq)
-        period_cooccurrence_counters.append(coocc)
-        period_doc_counts.append(len(chunk))  # 追加: 期間の行数（相談件数）を保存
-
-        # デバッグ用の追加情報（必要ならコメントアウト外す）
-        if DEBUG:
-            print(f"{label} - raw rows: {len(chunk)}, tokenized docs: {len(tokenized_docs)}, uniq tokens: {len(freq)}")
-
-    NETWORKS_DIR.mkdir(parents=True, exist_ok=True)
-    CHARTS_DIR.mkdir(parents=True, exist_ok=True)
-    TABLES_DIR.mkdir(parents=True, exist_ok=True)
-
-    n_periods = len(periods)
-    indices_to_save = select_period_indices_for_saving(n_periods, max_plots=MAX_NETWORK_PLOTS)
-
+    with profiler.stage("collect"):
+        for (start, end, chunk), task, res in zip(periods, tasks, results):
+            pair_counts = PairCounts(vocab, *res.pair_arrays)
+            # デバッグ用の追加情報（必要ならコメントアウト外す）
+            if DEBUG and task.token_docs is not None:
+                print(f"{task.label} - raw rows: {len(chunk)}, tokenized docs: {len(task.token_docs)}, uniq tokens: {len(res.freq)}")
+            period_labels.append(task.label)
+            period_token_freqs.append(res.freq)
+            period_cooccurrence_counters.append(pair_counts.as_counter())
+            period_pair_counts.append(pair_counts)
+            period_doc_counts.append(len(chunk))  # 追加: 期間の行数（相談件数）を保存
+
+    if APPROX_PAIR_COUNTS:
+        print(f"\n=== 近似集計（Count-Min スケッチ {APPROX_MEMORY_MB}MB・候補 {APPROX_CANDIDATES} ペア） ===")
+        for task, res in zip(tasks, results):
+            if res.approx_report is None:
+                continue
+            error, recall = res.approx_report
+            line = f"{task.label}: 推定値の誤差上限 +{error:.1f}（確率 {1 - APPROX_DELTA:.0%}）"
+            if recall is not None:
+                line += f", 正確な集計に対する上位20件の再現率 {recall:.0%}"
+            print(line)
+
+    # 期間ごとの結果は（並列実行でも）期間順にまとめて表示する
+    period_summaries = [None] * n_periods
     for i, (start, end, chunk) in enumerate(periods):
         if chunk.empty:
             continue
         label = period_labels[i]
-        freq = period_token_freqs[i]
-        G = build_cooccurrence_network_from_counter(period_cooccurrence_counters[i], min_freq=COOCCURRENCE_MIN_FREQ)
-        if len(G.nodes) == 0:
+        if reuse_outputs[i]:
+            summaries = reused[i].summaries
+            if summaries is None:
+                continue
+            if i in indices_to_save:
+                print(f"ネットワーク図（前回の結果を再利用）: {tasks[i].network_path}")
+        else:
+            summaries = results[i].summaries
+            if summaries is None:
+                continue
+            if results[i].network_saved:
+                print(f"ネットワーク図を保存しました: {tasks[i].network_path}")
+        period_summaries[i] = summaries
+        if "summaries" not in outputs:
             continue
-
-        fig, ax = plt.subplots(figsize=(12, 10))
-        plot_cooccurrence_network_subplot(ax, G, label, freq, classifier, top_n_edges=DRAW_TOP_EDGES)
-        plt.tight_layout()
-
-        plt.show()
-
-        if i in indices_to_save:
-            filename = NETWORKS_DIR / f"network_{i+1}_{label}.png"
-            fig.savefig(filename, dpi=200, bbox_inches='tight')
-            print(f"ネットワーク図を保存しました: {filename}")
-        plt.close(fig)
-
-        summaries = summarize_top_problem_sets_with_others(G, classifier, top_k=TOP_PROBLEM_SET_PER_TEGUCHI)
         print(f"\n=== {label} 手口別 上位問題セット（最大{TOP_PROBLEM_SET_PER_TEGUCHI}件） ===")
         if not summaries:
             print("（該当する手口ノードが図に存在しません）")
@@ -924,8 +2947,16 @@ def main():
                 print(f"  問題: {label_name}  (スコア合計: {score:.1f})")
         print("========================================================\n")
 
+    # 全ペア × 全期間の共起数（時系列・候補選出・全件出力はこの行列から作る）
+    with profiler.stage("matrix") as rec:
+        pair_matrix = PairPeriodMatrix.from_period_counts(vocab, period_labels, period_pair_counts)
+        rec["pairs"] = len(pair_matrix)
+
     # ここで上位 1-20 を一括取得して、1-10 と 11-20 を分割して出力する
-    df_cooc_display_all, df_cooc_keys_all = build_cooccurrence_top_table(period_labels, period_cooccurrence_counters, top_n=TOP_COOC_PER_PERIOD*2)
+    with profiler.stage("top_table"):
+        df_cooc_display_all, df_cooc_keys_all = build_cooccurrence_top_table(period_labels, period_cooccurrence_counters, top_n=TOP_COOC_PER_PERIOD*2,
+                                                                             period_pair_counts=period_pair_counts,
+                                                                             period_token_freqs=period_token_freqs)
 
     # 1-10
     df_cooc_display_top = df_cooc_display_all.iloc[:TOP_COOC_PER_PERIOD]
@@ -934,22 +2965,38 @@ def main():
     df_cooc_display_11_20 = df_cooc_display_all.iloc[TOP_COOC_PER_PERIOD:TOP_COOC_PER_PERIOD*2]
     df_cooc_keys_11_20 = df_cooc_keys_all.iloc[TOP_COOC_PER_PERIOD:TOP_COOC_PER_PERIOD*2]
 
-    # 表 (1-10)
     table_png_path = TABLES_DIR / "table_01_10_pairs.png"
-    show_cooccurrence_table(df_cooc_display_top, df_cooc_keys_top, alpha=0.25, save_path=table_png_path)
-    # 表 (11-20)
     table_png_path_11_20 = TABLES_DIR / "table_11_20_pairs.png"
-    show_cooccurrence_table(df_cooc_display_11_20, df_cooc_keys_11_20, alpha=0.25, save_path=table_png_path_11_20)
-
-    # Excel 出力: 1-10 と 11-20 を別ファイルで保存
-    excel_path = export_cooccurrence_table_to_excel(df_cooc_keys_top, df_cooc_display_top, filename="cooccurrence_top_1-10.xlsx", alpha=0.25, size_multiplier=1.0)
-    excel_path2 = export_cooccurrence_table_to_excel(df_cooc_keys_11_20, df_cooc_display_11_20, filename="cooccurrence_11-20.xlsx", alpha=0.25, size_multiplier=1.0)
-
-    total_counter = Counter()
-    for c in period_cooccurrence_counters:
-        total_counter.update(c)
+    table_paths = [table_png_path, table_png_path_11_20] if "tables" in outputs else []
+    excel_paths = []
+    if "excel" in outputs:
+        excel_paths = [OUTPUT_DIR / "cooccurrence_top_1-10.xlsx", OUTPUT_DIR / "cooccurrence_11-20.xlsx"]
+        if EXPORT_PAIR_MATRIX:
+            excel_paths.append(OUTPUT_DIR / "cooccurrence_matrix.xlsx")
+    # 増分モードで全期間が前回と同じなら、表画像と Excel は前回のファイルを使う
+    tables_unchanged = (state is not None and all(r is not None for r in reused)
+                        and set(state.periods) == set(period_labels)
+                        and all(p.exists() for p in table_paths + excel_paths))
+    if tables_unchanged or "tables" not in outputs:
+        if "counts" in outputs or "tables" in outputs:
+            _print_cooccurrence_table(df_cooc_display_top)
+            _print_cooccurrence_table(df_cooc_display_11_20)
+    else:
+        with profiler.stage("tables"):
+            # 表 (1-10)
+            show_cooccurrence_table(df_cooc_display_top, df_cooc_keys_top, alpha=0.25, save_path=table_png_path, render_pool=render_pool)
+            # 表 (11-20)
+            show_cooccurrence_table(df_cooc_display_11_20, df_cooc_keys_11_20, alpha=0.25, save_path=table_png_path_11_20, render_pool=render_pool)
+    if tables_unchanged and (table_paths or excel_paths):
+        print(f"共起表画像・Excel は前回の結果を再利用します: {TABLES_DIR}, {OUTPUT_DIR}")
+    elif excel_paths:
+        # Excel 出力: 1-10 と 11-20 を別ファイルで保存
+        with profiler.stage("excel"):
+            excel_path = export_cooccurrence_table_to_excel(df_cooc_keys_top, df_cooc_display_top, filename="cooccurrence_top_1-10.xlsx", alpha=0.25, size_multiplier=1.0)
+            excel_path2 = export_cooccurrence_table_to_excel(df_cooc_keys_11_20, df_cooc_display_11_20, filename="cooccurrence_11-20.xlsx", alpha=0.25, size_multiplier=1.0)
+            if EXPORT_PAIR_MATRIX:
+                export_pair_period_matrix_to_excel(pair_matrix, filename="cooccurrence_matrix.xlsx")
 
-    candidate_pairs = []
     table_pairs = []
     if df_cooc_keys_top is not None:
         for col in df_cooc_keys_top.columns:
@@ -964,40 +3011,355 @@ def main():
     table_pairs = sorted({p for p in table_pairs if p})
     table_pairs_tuples = [tuple(p.split('|')) for p in table_pairs if '|' in p]
 
-    if table_pairs_tuples:
-        ordered = [p for p, _ in total_counter.most_common() if p in table_pairs_tuples]
-        remaining = [p for p in table_pairs_tuples if p not in ordered]
-        ordered.extend(remaining)
-        for p in ordered:
-            if p not in candidate_pairs:
-                candidate_pairs.append(p)
-            if len(candidate_pairs) >= MAX_TIMESERIES:
-                break
-
+    # 候補: 表に出たペアを全期間の合計順に → 足りなければ合計の上位で埋める（行番号の配列で選ぶ）
+    if RANKING_MEASURE == "count":
+        overall_rows = pair_matrix.most_common_order()
+    else:
+        total_freq = Counter()
+        for f in period_token_freqs:
+            total_freq.update(f)
+        overall_rows = pair_matrix.ranked_order(pair_matrix.association(total_freq, RANKING_MEASURE))
+    table_rows = pair_matrix.rows_for(table_pairs_tuples)
+    in_table = np.zeros(len(pair_matrix), dtype=bool)
+    in_table[table_rows[table_rows >= 0]] = True
+    candidate_pairs = list(dict.fromkeys(
+        pair_matrix.pairs(overall_rows[in_table[overall_rows]])
+        + [p for p, r in zip(table_pairs_tuples, table_rows.tolist()) if r < 0]))[:MAX_TIMESERIES]
     if len(candidate_pairs) < MAX_TIMESERIES:
-        for pair, _ in total_counter.most_common():
-            if pair in candidate_pairs:
-                continue
-            candidate_pairs.append(pair)
-            if len(candidate_pairs) >= MAX_TIMESERIES:
-                break
-
-    if not candidate_pairs:
-        top_overall = []
-        for pair, _ in total_counter.most_common():
-            top_overall.append(pair)
-            if len(top_overall) >= MAX_TIMESERIES:
-                break
-        candidate_pairs = top_overall
+        fill_rows = overall_rows[~in_table[overall_rows]][:MAX_TIMESERIES - len(candidate_pairs)]
+        candidate_pairs.extend(pair_matrix.pairs(fill_rows))
 
     # 変更: period_doc_counts を渡す（各期間の行数を分母にして割合を計算）
-    df_pairs = build_pair_timeseries_with_norm(period_labels, period_cooccurrence_counters, candidate_pairs, period_doc_counts, normalize=NORMALIZE_TIMESERIES)
+    candidate_rows = pair_matrix.rows_for(candidate_pairs)
+    if (candidate_rows >= 0).all():
+        df_pairs = pair_matrix.timeseries(candidate_rows, period_doc_counts, normalize=NORMALIZE_TIMESERIES)
+    else:
+        df_pairs = build_pair_timeseries_with_norm(period_labels, period_cooccurrence_counters, candidate_pairs, period_doc_counts, normalize=NORMALIZE_TIMESERIES)
+
+    # 全ペアを変化幅の順に並べた表（折れ線に載せきれないペアも含めて推移を比べられる）
+    if EXPORT_PAIR_TRENDS and "trends" in outputs:
+        trends_path = OUTPUT_DIR / "pair_trends.csv"
+        with profiler.stage("trends"):
+            pair_matrix.trend_table(period_doc_counts, normalize=NORMALIZE_TIMESERIES).to_csv(trends_path, encoding="utf-8-sig")
+        print(f"ペアの推移一覧を保存しました: {trends_path}")
+
+    # 全ペアから期間ごとの急増ペアを検出する
+    df_burst = df_new = None
+    if BURST_DETECTION and "trends" in outputs:
+        with profiler.stage("burst", pairs=len(pair_matrix)):
+            df_burst = pair_matrix.emerging_pairs(period_doc_counts)
+            df_new = pair_matrix.new_pairs()
+        print(f"\n=== 急増した共起ペア（直前{BURST_WINDOW}期間比 z >= {BURST_Z_THRESHOLD}、最大{BURST_TOP_N}件） ===")
+        if df_burst.empty:
+            print("（該当なし）")
+        for label, group in df_burst.groupby("期間", sort=False):
+            print(f"{label}:")
+            for r in group.itertuples(index=False):
+                print(f"  {r.順位}. {r.ペア}  共起数 {r.共起数}（期待値 {r.期待値:.1f}, z={r.zスコア:.1f}）")
+        burst_path = OUTPUT_DIR / "emerging_pairs.csv"
+        df_burst.to_csv(burst_path, index=False, encoding="utf-8-sig")
+        print(f"急増ペアの一覧を保存しました: {burst_path}")
+        print(f"\n=== 新規の共起ペア（直前{BURST_WINDOW}期間に出現なし、共起数 >= {BURST_MIN_COUNT}、最大{BURST_TOP_N}件） ===")
+        if df_new.empty:
+            print("（該当なし）")
+        for label, group in df_new.groupby("期間", sort=False):
+            print(f"{label}:")
+            for r in group.itertuples(index=False):
+                print(f"  {r.順位}. {r.ペア}  共起数 {r.共起数}{'（初出）' if r.初出 else '（再出現）'}")
+        new_path = OUTPUT_DIR / "new_pairs.csv"
+        df_new.to_csv(new_path, index=False, encoding="utf-8-sig")
+        print(f"新規ペアの一覧を保存しました: {new_path}")
+
+    # スライド窓の推移（窓ごとに期間と同じ頻度フィルタをかけて数える）
+    if SLIDING_TREND_MONTHS and "charts" in outputs:
+        with profiler.stage("sliding", docs=len(df)):
+            if state is not None:
+                # 増分モードでは再利用した期間の行にトークンが無いので補う（トークンキャッシュから読むだけ）
+                df = tokenize_dataframe(df, preprocessor, cache=token_cache)
+            if SLIDING_TREND_MONTHLY_BASES:
+                sliding = compose_window_counts(build_monthly_bases(df, vocab), vocab, df,
+                                                months=SLIDING_TREND_MONTHS, step_months=SLIDING_TREND_STEP)
+            else:
+                sliding = build_window_counts(df, vocab, months=SLIDING_TREND_MONTHS, step_months=SLIDING_TREND_STEP)
+            df_sliding = build_pair_timeseries_with_norm([lab for lab, _, _, _ in sliding],
+                                                         [pc.as_counter() for _, pc, _, _ in sliding],
+                                                         candidate_pairs,
+                                                         [n for _, _, _, n in sliding],
+                                                         normalize=NORMALIZE_TIMESERIES)
+            plot_pair_timeseries_improved(df_sliding, top_n=None, normalize=NORMALIZE_TIMESERIES,
+                                          save_path=CHARTS_DIR / "timeseries_sliding.png")
+
+    # Web アプリ向けの結果 JSON（ブラウザ側で表・折れ線・ネットワーク図を描けるよう、座標まで入れる）
+    if "json" in outputs:
+        with profiler.stage("json"):
+            period_payloads = []
+            for i, (start, end, chunk) in enumerate(periods):
+                freq = period_token_freqs[i]
+                payload = period_result_payload(period_labels[i], start, end, period_doc_counts[i], period_pair_counts[i],
+                                                freq, period_summaries[i], top_n=JSON_TOP_PAIRS)
+                network = period_networks[i]
+                payload["network"] = network_payload(*network, classifier) if network is not None else None
+                period_payloads.append(payload)
+            # 推移: 折れ線の候補ペア → 全期間の上位ペアの順に JSON_TIMESERIES_PAIRS 件
+            series_rows = np.concatenate([candidate_rows[candidate_rows >= 0], overall_rows])
+            _, first_idx = np.unique(series_rows, return_index=True)
+            series_rows = series_rows[np.sort(first_idx)][:JSON_TIMESERIES_PAIRS]
+            json_path = export_results_json(period_payloads, pair_matrix, series_rows, int((candidate_rows >= 0).sum()),
+                                            period_doc_counts, df_burst, df_new)
+        print(f"結果 JSON を保存しました: {json_path}")
 
     # NOTE: 以下の行は "棒グラフ（積み上げ）を一旦出力しない" 要望によりコメントアウトしました。
     # timeseries_png_path = CHARTS_DIR / "timeseries.png"
     # plot_pair_stacked_bars(df_pairs, top_n=None, normalize=NORMALIZE_TIMESERIES, save_path=timeseries_png_path)
 
+    if render_pool is not None:
+        with profiler.stage("render_wait"):
+            render_pool.close()  # 描画ワーカーの PNG 保存がすべて終わるまで待つ
+
+    # 問題セットを求めなかった実行の結果は、次回の再利用に使えないので保存しない
+    if state is not None and analyze_networks:
+        with profiler.stage("save_state"):
+            records = [PeriodRecord(period_labels[i], period_fps[i], period_doc_counts[i], period_pair_counts[i],
+                                    period_token_freqs[i], period_summaries[i]) for i in range(n_periods)]
+            state.save(INCREMENTAL_STATE_PATH, records, df)
+
+    if token_cache is not None:
+        if DEBUG:
+            print(f"トークンキャッシュ: ヒット {token_cache.hits} 件 / 新規 {token_cache.misses} 件")
+        token_cache.close()
+
+    profiler.write()
     print("\n全ファイルはフォルダに保存されました: ", OUTPUT_DIR.resolve())
 
+# =========================================================
+# 常駐サーバー（--serve）
+# =========================================================
+class ServiceBusyError(RuntimeError):
+    """SERVE_QUEUE_TIMEOUT 秒待っても空きが無かった。"""
+
+class AnalysisService:
+    """
+    常駐サーバーの分析本体。起動時に Janome の辞書を 1 回だけ読み込み、TextPreprocessor・トークンキャッシュ・
+    語彙・期間ごとの集計（PeriodRecord、期間の行集合のハッシュ単位）・結果（期間とパラメータ単位）を
+    リクエスト間で使い回す。データは毎回読み直してハッシュを取るので、行が変われば該当期間だけ再計算される。
+    同時に受け付けるリクエストはセマフォで max_concurrent 件までに抑える。ロックは 2 つ:
+    - _cache_lock: 結果の LRU と件数の参照・更新だけを守る短いロック（キャッシュにある結果は計算中でもすぐ返す）
+    - _compute_lock: 計算は 1 件ずつ（single-flight）。Janome・トークンキャッシュ・語彙・期間ごとの集計（_periods）・
+      読み込んだ CSV はこのロックを持つスレッドだけが触る。待っている間に同じ要求が計算されていればその結果を使う。
+    """
+    def __init__(self, teguchi_map: Dict[str, List[str]] = TEGUCHI_MAP, max_concurrent: int = SERVE_MAX_CONCURRENT,
+                 queue_timeout: float = SERVE_QUEUE_TIMEOUT, result_cache: int = SERVE_RESULT_CACHE,
+                 period_cache: int = SERVE_PERIOD_CACHE):
+        self.preprocessor = TextPreprocessor()
+        self.preprocessor.tokenizer  # 辞書の読み込みは起動時に済ませる
+        self.classifier = ModalityClassifier(teguchi_map)
+        self.token_cache = TokenCache(self.preprocessor.rules_fingerprint()) if USE_TOKEN_CACHE else None
+        self.vocab = Vocabulary()
+        self.queue_timeout = queue_timeout
+        self.result_cache = result_cache
+        self.period_cache = period_cache
+        self._slots = threading.BoundedSemaphore(max(1, max_concurrent))
+        self._cache_lock = threading.Lock()
+        self._compute_lock = threading.Lock()
+        self._results: "OrderedDict[tuple, dict]" = OrderedDict()
+        self._periods: "OrderedDict[tuple, PeriodRecord]" = OrderedDict()
+        self._csv = None  # (ファイルと更新時刻, DataFrame)
+        self.requests = 0
+        self.result_hits = 0
+
+    def stats(self) -> dict:
+        with self._cache_lock:
+            return {"requests": self.requests, "result_hits": self.result_hits, "cached_results": len(self._results),
+                    "cached_periods": len(self._periods), "vocab": len(self.vocab)}
+
+    def load(self, start_date: Optional[str], end_date: Optional[str]) -> pd.DataFrame:
+        """期間内の行を読む。CSV はファイルが更新されるまでメモリに置き、日付で絞り込む。"""
+        if DATA_SOURCE == "sqlite":
+            return load_cases_from_sqlite(start_date=start_date, end_date=end_date)
+        paths = [CSV_SOURCE] if Path(CSV_SOURCE).exists() else sorted(glob.glob(CSV_SOURCE))
+        stamp = tuple((p, os.path.getmtime(p)) for p in paths)
+        csv = self._csv
+        if csv is None or csv[0] != stamp:
+            # 読み直し（Feather キャッシュの書き込みもある）は計算と同じく 1 件ずつ
+            with self._compute_lock:
+                if self._csv is None or self._csv[0] != stamp:
+                    self._csv = (stamp, load_csv_streaming())
+                csv = self._csv
+        df = csv[1]
+        if start_date:
+            df = df[df["date"] >= pd.Timestamp(start_date)]
+        if end_date:
+            df = df[df["date"] <= pd.Timestamp(end_date)]
+        return df
+
+    def analyze(self, params: dict) -> dict:
+        """
+        params（Next.js の /api/bunseki と同じキー名）:
+        startDate / endDate（"YYYY-MM-DD"、省略可）, periodMonths, topN, measure
+        """
+        start_date = params.get("startDate") or None
+        end_date = params.get("endDate") or None
+        months = int(params.get("periodMonths", PERIOD_MONTHS))
+        top_n = int(params.get("topN", TOP_COOC_PER_PERIOD))
+        measure = params.get("measure", RANKING_MEASURE)
+        if months < 1 or top_n < 1:
+            raise ValueError("periodMonths と topN は 1 以上にしてください")
+        if measure not in ASSOCIATION_MEASURES:
+            raise ValueError(f"未対応の関連度です: {measure}（{', '.join(ASSOCIATION_MEASURES)} のいずれか）")
+
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            raise ServiceBusyError(f"同時に実行できる分析は {SERVE_MAX_CONCURRENT} 件までです")
+        try:
+            t0 = time.perf_counter()
+            df = sort_by_date(self.load(start_date, end_date))
+            periods = split_periods(df, months=months)
+            fps = [period_fingerprint(chunk) for _, _, chunk in periods]
+            key = (start_date, end_date, months, top_n, measure, tuple(fps))
+            with self._cache_lock:
+                self.requests += 1
+                payload = self._cached_result(key)
+            cached = payload is not None
+            if not cached:
+                with self._compute_lock:
+                    with self._cache_lock:
+                        payload = self._cached_result(key)
+                    cached = payload is not None
+                    if not cached:
+                        payload = {"periods": self._analyze_periods(periods, fps, months, top_n, measure)}
+                        with self._cache_lock:
+                            self._results[key] = payload
+                            while len(self._results) > self.result_cache:
+                                self._results.popitem(last=False)
+            return dict(payload, startDate=start_date, endDate=end_date, periodMonths=months, measure=measure,
+                        rows=len(df), cached=cached, elapsed_s=round(time.perf_counter() - t0, 3))
+        finally:
+            self._slots.release()
+
+    def _cached_result(self, key: tuple) -> Optional[dict]:
+        """覚えている結果（_cache_lock を取った状態で呼ぶこと）。"""
+        payload = self._results.get(key)
+        if payload is not None:
+            self._results.move_to_end(key)
+            self.result_hits += 1
+        return payload
+
+    def _analyze_periods(self, periods, fps: List[str], months: int, top_n: int, measure: str) -> List[dict]:
+        """期間ごとの集計を（覚えていなければ）求めて結果を返す。_compute_lock を取った状態で呼ぶこと。"""
+        keys = [(months, period_label(start, months), fp) for (start, _, _), fp in zip(periods, fps)]
+        stale = [chunk for (_, _, chunk), k in zip(periods, keys) if k not in self._periods]
+        tokens = None
+        if stale:
+            # 再計算する期間の行だけ、まとめて 1 回でトークン化する
+            tokens = tokenize_dataframe(pd.concat(stale), self.preprocessor, cache=self.token_cache)["tokens"]
+        out = []
+        for (start, end, chunk), k in zip(periods, keys):
+            rec = self._periods.get(k)
+            if rec is None:
+                doc_tokens = tokens.loc[chunk.index]
+                has_tokens = doc_tokens.notna().to_numpy()
+                task = PeriodTask(k[1], doc_tokens[has_tokens].tolist(), chunk.index[has_tokens].to_numpy(),
+                                  analyze=not chunk.empty)
+                res = analyze_period(task, self.vocab, self.classifier)
+                rec = PeriodRecord(k[1], k[2], len(chunk), PairCounts(self.vocab, *res.pair_arrays), res.freq, res.summaries)
+                self._periods[k] = rec
+                while len(self._periods) > self.period_cache:
+                    self._periods.popitem(last=False)
+            else:
+                self._periods.move_to_end(k)
+            out.append(period_result_payload(rec.label, start, end, rec.doc_count, rec.pair_counts, rec.freq,
+                                             rec.summaries, top_n=top_n, measure=measure))
+        return out
+
+    def close(self):
+        if self.token_cache is not None:
+            self.token_cache.close()
+
+class AnalysisRequestHandler(BaseHTTPRequestHandler):
+    """
+    GET  /health  → 状態とキャッシュの件数
+    POST /analyze → AnalysisService.analyze の結果（JSON）。入力の誤りは 400、混雑時は 503。
+    """
+    def _send_json(self, status: int, body: dict):
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path.rstrip("/") not in ("", "/health"):
+            self._send_json(404, {"error": f"not found: {self.path}"})
+            return
+        self._send_json(200, dict(status="ok", **self.server.service.stats()))
+
+    def do_POST(self):
+        if self.path.rstrip("/") != "/analyze":
+            self._send_json(404, {"error": f"not found: {self.path}"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+            params = json.loads(self.rfile.read(length) or b"{}")
+            if not isinstance(params, dict):
+                raise ValueError("JSON オブジェクトを送ってください")
+            result = self.server.service.analyze(params)
+        except ServiceBusyError as e:
+            self._send_json(503, {"error": str(e)})
+        except (ValueError, TypeError) as e:
+            self._send_json(400, {"error": str(e)})
+        except Exception as e:
+            if DEBUG:
+                import traceback
+                traceback.print_exc()
+            self._send_json(500, {"error": f"{type(e).__name__}: {e}"})
+        else:
+            self._send_json(200, result)
+
+    def log_message(self, format, *args):
+        if DEBUG:
+            super().log_message(format, *args)
+
+def serve(host: str = SERVE_HOST, port: int = SERVE_PORT):
+    """分析サーバーを起動する（Ctrl+C で終了）。図は描かず、結果は JSON だけで返す。"""
+    import warnings
+    warnings.filterwarnings("ignore")
+    service = AnalysisService()
+    server = ThreadingHTTPServer((host, port), AnalysisRequestHandler)
+    server.daemon_threads = True
+    server.service = service
+    print(f"分析サーバーを起動しました: http://{host}:{port}/analyze（Ctrl+C で終了）")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="相談データの共起分析（引数なしで従来どおり一括実行）")
+    parser.add_argument("--serve", action="store_true", help="常駐サーバーとして起動する（POST /analyze に JSON で期間を送る）")
+    parser.add_argument("--host", default=SERVE_HOST, help=f"--serve の待ち受けアドレス（既定: {SERVE_HOST}）")
+    parser.add_argument("--port", type=int, default=SERVE_PORT, help=f"--serve のポート（既定: {SERVE_PORT}）")
+    parser.add_argument("--outputs", type=_parse_outputs, default=OUTPUTS,
+                        help=f"出力する結果をカンマ区切りで指定する（{', '.join(OUTPUT_KINDS)} / all。既定: すべて）")
+    parser.add_argument("--headless", action="store_true", default=HEADLESS,
+                        help="ヘッドレス一括実行（Agg バックエンドで図を保存のみ、PNG を並列描画。HEADLESS = True と同じ）")
+    return parser.parse_args(argv)
+
+def _parse_outputs(value: str) -> Tuple[str, ...]:
+    outputs = tuple(dict.fromkeys(v.strip().lower() for v in value.split(",") if v.strip()))
+    if outputs == ("all",):
+        return OUTPUT_KINDS
+    unknown = [v for v in outputs if v not in OUTPUT_KINDS]
+    if unknown or not outputs:
+        raise argparse.ArgumentTypeError(f"未対応の出力です: {value}（{', '.join(OUTPUT_KINDS)}, all から選ぶ）")
+    return outputs
+
 if __name__ == "__main__":
-    main()
+    args = parse_args()
+    HEADLESS = args.headless
+    if args.serve:
+        serve(args.host, args.port)
+    else:
+        main(args.outputs)
@@ -0,0 +1,347 @@
+# -*- coding: utf-8 -*-
+"""
+an_tp_test.py の処理段階ごとのベンチマーク。
+
+R5 1.csv と同じ形（cp932・21 列・［受付年月日］と［件名］を使う）の合成相談データを作り、
+読み込み → 期間分割 → トークン化 → 共起集計 → グラフ → 問題セット → ペア×期間行列 → Excel 出力
+の各段階の実行時間（wall / CPU）と tracemalloc のピークメモリを測る。
+結果は JSON に保存し、基準（--save-baseline で保存したもの）と比べて遅くなった段階を表示する。
+基準は計測モードごとに別のファイルに保存する（tracemalloc あり: benchmark_baseline.json、
+--no-memory: benchmark_baseline_no_memory.json）。モードやプロセス数が違う基準とは比べない。
+基準は計測したマシンでしか意味がないのでリポジトリには入れない（.gitignore 済み）。各自の環境で
+最初に --save-baseline で作る。別のマシン（Python・OS・CPU 数が違う）で作った基準との比較は飛ばす。
+ネットワークには一切つながない（Janome の内蔵辞書と乱数だけで動く）。
+
+使い方:
+    python benchmark_pipeline.py                      # 1k / 10k 行で計測し、基準と比較
+    python benchmark_pipeline.py --sizes 1k,10k,100k,1m
+    python benchmark_pipeline.py --save-baseline      # 今回の結果を基準として保存
+トークン化は 1 行あたり数 ms かかるため、1m 行は 1 プロセスで 1 時間程度かかる（--workers で並列化）。
+tracemalloc を有効にすると時間も数倍に伸びる。
+"""
+import os
+os.environ.setdefault("MPLBACKEND", "Agg")
+
+import argparse
+import gc
+import json
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+HERE = Path(__file__).resolve().parent
+sys.path.insert(0, str(HERE))
+
+import an_tp_test as pipeline
+
+# =========================================================
+# 設定
+# =========================================================
+SIZES = {"1k": 1_000, "10k": 10_000, "100k": 100_000, "1m": 1_000_000}
+DEFAULT_SIZES = "1k,10k"
+# an_tp_test.py の相対パス（出力先・キャッシュ・stopwords.txt）は、このファイルの場所を基準にする
+DATA_DIR = HERE / pipeline.CACHE_DIR / "benchmark"    # 生成した合成 CSV の置き場（再利用する）
+STOPWORDS_PATH = HERE / "stopwords.txt"
+BASELINE_PATHS = {True: HERE / "benchmark_baseline.json",             # tracemalloc あり（時間とメモリ）
+                  False: HERE / "benchmark_baseline_no_memory.json"}  # --no-memory（時間だけ）
+RESULT_PATH = HERE / pipeline.OUTPUT_DIR / "benchmark_latest.json"
+REGRESSION_RATIO = 1.20        # 基準よりこの倍率以上遅い（またはメモリが多い）段階を警告する
+DATE_START = "2023-04-01"
+DATE_END = "2025-03-31"
+SEED = 42
+
+# an_tp_test.main と同じ手口の定義
+TEGUCHI_MAP = {
+    "電話": ["電話", "携帯"],
+    "訪問": ["訪問"],
+    "ネット": ["ネット", "サイト"],
+    "メール": ["メール"]
+}
+
+HEADER = ["［受付年月日］", "［契約当事者年齢］", "［契約当事者性別等］", "［契約当事者地域］", "［超大分類］",
+          "［商品・役務名］", "［件名］", "［相談概要］", "［契約・申込の有無］", "［契約購入年月日］",
+          "［販売購入形態］", "［決済・販売方法］", "［信用供与の有無］", "［信用供与の有無詳細］", "［支払手段］",
+          "［契約購入金額］", "［内容別分類］", "［内容等ＫＷ］", "［処理結果概要］", "［救済金額］", "［救済金額の内容］"]
+
+# =========================================================
+# 合成相談データ
+# =========================================================
+_PRODUCTS = ["バイク", "健康食品", "化粧品", "サプリメント", "浄水器", "外壁塗装", "屋根修理", "給湯器", "光回線",
+             "携帯電話", "電力契約", "ガス契約", "アパート", "賃貸住宅", "中古車", "腕時計", "布団", "脱毛エステ",
+             "オンラインゲーム", "動画配信サービス", "通信講座", "副業サイト", "投資商品", "保険", "宅配便", "貴金属"]
+_CHANNELS = ["電話", "携帯", "訪問", "ネット", "サイト", "メール", "チラシ", "SNS", "店舗"]
+_ACTIONS = ["の勧誘があった", "を契約した", "を申し込んだ", "を購入した", "の定期購入になっていた", "の買取を依頼した",
+            "の工事を頼んだ", "に登録した", "の解約を申し出た", "を試しに注文した"]
+_PROBLEMS = ["解約できない", "返金されない", "高額な請求が来た", "説明と違う", "連絡が取れない", "商品が届かない",
+             "違約金を請求された", "不審に思う", "しつこく勧誘される", "クレジットカードを不正に使われた",
+             "未成年の子が課金した", "退去費用が高い", "修理代を請求された", "個人情報が心配だ"]
+_QUESTIONS = ["どうしたらよいか。", "返金してほしい。", "業者の信頼性を確かめたい。", "クーリング・オフできるか。",
+              "解約したい。", "支払わなければならないか。", "今後の対応を知りたい。"]
+_WHEN = ["昨日", "先日", "先週", "今朝", "先月", "数日前", "一昨日"]
+_SUBJECTS = ["自宅に", "母が", "高齢の父が", "息子が", "知人の紹介で", "家族が", ""]
+_REGIONS = ["201.奈良市", "202.大和高田市", "203.大和郡山市", "204.天理市", "205.橿原市", "206.桜井市", "207.五條市",
+            "209.生駒市", "210.香芝市", "211.葛城市"]
+_GENDERS = ["1.男", "2.女", "3.不明"]
+_CATEGORIES = ["1.商品", "2.役務", "3.他"]
+_FORMS = ["1.店舗購入", "2.訪問販売", "3.通信販売", "4.電話勧誘販売", "5.マルチ取引", "6.ネガティブ・オプション"]
+_RESULTS = ["1.助言", "2.他機関紹介", "3.あっせん解決", "4.情報提供"]
+
+def _pick(rng: np.random.Generator, items: List[str], n: int, zipf: float = 1.1) -> np.ndarray:
+    """items から n 個を選ぶ（先頭ほど選ばれやすい偏りをつけ、実データのように頻出語が偏るようにする）。"""
+    w = 1.0 / np.arange(1, len(items) + 1) ** zipf
+    return np.asarray(items, dtype=object)[rng.choice(len(items), size=n, p=w / w.sum())]
+
+def _format_dates(dates: pd.DatetimeIndex) -> List[str]:
+    return [f"{y}年{m}月{d}日" for y, m, d in zip(dates.year, dates.month, dates.day)]
+
+def generate_corpus(n_rows: int, seed: int = SEED) -> pd.DataFrame:
+    """R5 1.csv と同じ 21 列の合成相談データ（件名は定型文の組み合わせ、日付は期間内に一様に分布）。"""
+    rng = np.random.default_rng(seed)
+    start, end = pd.Timestamp(DATE_START), pd.Timestamp(DATE_END)
+    days = rng.integers(0, (end - start).days + 1, n_rows)
+    dates = pd.DatetimeIndex(start + pd.to_timedelta(np.sort(days), unit="D"))
+    when, subj = _pick(rng, _WHEN, n_rows), _pick(rng, _SUBJECTS, n_rows)
+    chan, prod = _pick(rng, _CHANNELS, n_rows), _pick(rng, _PRODUCTS, n_rows)
+    act, prob, ques = _pick(rng, _ACTIONS, n_rows), _pick(rng, _PROBLEMS, n_rows), _pick(rng, _QUESTIONS, n_rows)
+    titles = [f"{w}、{s}{c}で{p}{a}。{pr}。{q}" for w, s, c, p, a, pr, q in zip(when, subj, chan, prod, act, prob, ques)]
+    # 概要は件名に 2 つ目の問題文を足したもの（解析には使わないが列の形を揃える）
+    extra = _pick(rng, _PROBLEMS, n_rows)
+    amounts = rng.integers(1, 500, n_rows) * 1000
+    data = {
+        HEADER[0]: _format_dates(dates),
+        HEADER[1]: [f"{a}歳" for a in rng.integers(15, 90, n_rows)],
+        HEADER[2]: _pick(rng, _GENDERS, n_rows, 0.3),
+        HEADER[3]: _pick(rng, _REGIONS, n_rows, 0.8),
+        HEADER[4]: _pick(rng, _CATEGORIES, n_rows, 0.5),
+        HEADER[5]: prod,
+        HEADER[6]: titles,
+        HEADER[7]: [f"{t}また、{e}。" for t, e in zip(titles, extra)],
+        HEADER[8]: _pick(rng, ["1.契約済", "2.未契約", "3.不明"], n_rows, 0.5),
+        HEADER[9]: _format_dates(dates - pd.to_timedelta(rng.integers(0, 60, n_rows), unit="D")),
+        HEADER[10]: _pick(rng, _FORMS, n_rows, 0.7),
+        HEADER[11]: _pick(rng, ["1.一括払い", "2.分割払い", "3.定期購入", "4.不明"], n_rows, 0.5),
+        HEADER[12]: _pick(rng, ["1.有", "2.無"], n_rows, 0.5),
+        HEADER[13]: _pick(rng, ["", "クレジットカード", "ローン"], n_rows, 0.5),
+        HEADER[14]: _pick(rng, ["現金", "クレジットカード", "コンビニ払い", "振込", "電子マネー"], n_rows, 0.7),
+        HEADER[15]: [f"{a}円" for a in amounts],
+        HEADER[16]: _pick(rng, ["契約・解約", "販売方法", "品質・機能", "価格・料金", "安全・衛生"], n_rows, 0.6),
+        HEADER[17]: _pick(rng, ["解約", "返金", "高価格", "強引", "虚偽説明", "連絡不能"], n_rows, 0.6),
+        HEADER[18]: _pick(rng, _RESULTS, n_rows, 0.8),
+        HEADER[19]: ["" if r > 0.1 else f"{a}円" for r, a in zip(rng.random(n_rows), amounts)],
+        HEADER[20]: _pick(rng, ["", "返金", "解約", "請求取消"], n_rows, 1.5),
+    }
+    return pd.DataFrame(data, columns=HEADER)
+
+def ensure_corpus(n_rows: int, data_dir: Path = DATA_DIR, seed: int = SEED) -> Path:
+    """合成 CSV（cp932）を作る。同じ行数・シードのものがあれば再利用する。"""
+    data_dir.mkdir(parents=True, exist_ok=True)
+    path = data_dir / f"synthetic_{n_rows}_{seed}.csv"
+    if not path.exists():
+        tmp = path.with_suffix(".tmp")
+        generate_corpus(n_rows, seed).to_csv(tmp, index=False, encoding="cp932")
+        tmp.replace(path)
+    return path
+
+# =========================================================
+# 計測
+# =========================================================
+def measure(name: str, fn: Callable, records: Dict[str, dict], memory: bool = True, **extra):
+    """fn() を 1 回実行し、wall / CPU 時間と（memory なら）tracemalloc のピークを records[name] に記録する。"""
+    gc.collect()
+    if memory:
+        tracemalloc.start()
+    w0, c0 = time.perf_counter(), time.process_time()
+    out = fn()
+    wall, cpu = time.perf_counter() - w0, time.process_time() - c0
+    rec = {"wall_s": round(wall, 4), "cpu_s": round(cpu, 4)}
+    if memory:
+        rec["peak_mb"] = round(tracemalloc.get_traced_memory()[1] / (1 << 20), 2)
+        tracemalloc.stop()
+    rec.update(extra)
+    records[name] = rec
+    print(f"  {name:<14} wall {wall:8.2f}s  cpu {cpu:8.2f}s" + (f"  peak {rec['peak_mb']:8.1f}MB" if memory else ""))
+    return out
+
+def run_pipeline(csv_path: Path, workers: Optional[int], memory: bool, work_dir: Path) -> Dict[str, dict]:
+    """an_tp_test.py の main と同じ順に各段階を実行して計測する（図の描画は除く。Excel は work_dir に出力）。"""
+    records: Dict[str, dict] = {}
+    preprocessor = pipeline.TextPreprocessor(str(STOPWORDS_PATH))
+    classifier = pipeline.ModalityClassifier(TEGUCHI_MAP)
+
+    df = measure("load", lambda: pipeline.load_csv_streaming(str(csv_path), use_cache=False, workers=1), records, memory)
+    n_rows = len(df)
+    records["load"]["rows"] = n_rows
+
+    def split():
+        d = pipeline.sort_by_date(df)
+        return d, pipeline.split_periods(d)
+    df, periods = measure("split", split, records, memory)
+    records["split"]["periods"] = len(periods)
+
+    measure("tokenizer_init", lambda: preprocessor.tokenizer, records, memory)  # Janome の辞書読み込み
+    df = measure("tokenize", lambda: pipeline.tokenize_dataframe(df, preprocessor, cache=None, workers=workers), records, memory)
+    records["tokenize"]["docs_per_s"] = round(n_rows / max(records["tokenize"]["wall_s"], 1e-9), 1)
+    periods = pipeline.split_periods(df)
+
+    vocab = pipeline.Vocabulary()
+    def cooccurrence():
+        out = []
+        for start, end, chunk in periods:
+            has_tokens = chunk["tokens"].notna()
+            docs, freq = pipeline.filter_tokens_by_freq(chunk["tokens"][has_tokens].tolist())
+            pc = pipeline.build_pair_counts(docs, vocab, window_size=pipeline.COOCCURRENCE_WINDOW,
+                                            doc_keys=chunk.index[has_tokens].to_numpy())
+            out.append((pipeline.period_label(start), pc, freq, len(chunk)))
+        return out
+    period_counts = measure("cooccurrence", cooccurrence, records, memory)
+    records["cooccurrence"]["pairs"] = int(sum(len(pc.keys) for _, pc, _, _ in period_counts))
+
+    graphs = measure("graph", lambda: [pipeline.build_period_network(pc, freq) for _, pc, freq, _ in period_counts],
+                     records, memory)
+    records["graph"]["edges"] = int(sum(G.number_of_edges() for G, _ in graphs))
+
+    measure("problem_sets", lambda: [pipeline.summarize_top_problem_sets_with_others(
+        G, classifier, top_k=pipeline.TOP_PROBLEM_SET_PER_TEGUCHI) for G, _ in graphs], records, memory)
+
+    labels = [lab for lab, _, _, _ in period_counts]
+    doc_counts = [n for _, _, _, n in period_counts]
+    def matrix():
+        pm = pipeline.PairPeriodMatrix.from_period_counts(vocab, labels, [pc for _, pc, _, _ in period_counts])
+        pm.trend_table(doc_counts)
+        pm.emerging_pairs(doc_counts)
+        pm.new_pairs()
+        return pm
+    pm = measure("matrix", matrix, records, memory)
+
+    def excel():
+        counters = [pc.as_counter() for _, pc, _, _ in period_counts]
+        display, keys = pipeline.build_cooccurrence_top_table(labels, counters, top_n=pipeline.TOP_COOC_PER_PERIOD)
+        pipeline.export_cooccurrence_table_to_excel(keys, display, filename="benchmark_top.xlsx", size_multiplier=1.0,
+                                                    output_dir=work_dir)
+        pipeline.export_pair_period_matrix_to_excel(pm, filename="benchmark_matrix.xlsx", output_dir=work_dir)
+    measure("excel", excel, records, memory)
+    return records
+
+# =========================================================
+# 基準との比較
+# =========================================================
+def incompatible_baseline(result: dict, baseline: dict) -> Optional[str]:
+    """基準と計測条件が違えば理由を返す（tracemalloc は時間を数倍に伸ばし、workers はトークン化の時間を変える）。"""
+    for key, name in (("memory", "tracemalloc の有無"), ("workers", "トークン化のプロセス数")):
+        if baseline.get(key) != result.get(key):
+            return f"{name}が基準と異なります（今回 {result.get(key)} / 基準 {baseline.get(key)}）"
+    return None
+
+def other_host(result: dict, baseline: dict) -> Optional[str]:
+    """基準を別のマシンで測っていれば理由を返す（時間もメモリも環境で変わるので比べても意味がない）。"""
+    for key, name in (("python", "Python"), ("platform", "OS"), ("cpu_count", "CPU 数")):
+        if baseline.get(key) != result.get(key):
+            return f"{name}が基準と異なります（今回 {result.get(key)} / 基準 {baseline.get(key)}）"
+    return None
+
+def compare(result: dict, baseline: dict, ratio: float = REGRESSION_RATIO) -> List[str]:
+    """基準より ratio 倍以上遅い・メモリが多い段階の一覧（表も表示する）。計測条件が同じ基準とだけ比べること。"""
+    regressions = []
+    for size, stages in result["sizes"].items():
+        base_stages = baseline.get("sizes", {}).get(size)
+        if not base_stages:
+            continue
+        print(f"\n--- {size} 行: 基準との比較（今回 / 基準） ---")
+        for stage, rec in stages.items():
+            base = base_stages.get(stage)
+            if not base:
+                continue
+            cells = []
+            for key in ("wall_s", "peak_mb"):
+                if key in rec and key in base and base[key] > 0:
+                    r = rec[key] / base[key]
+                    cells.append(f"{key} {rec[key]:.2f}/{base[key]:.2f} (x{r:.2f})")
+                    # ごく短い段階は誤差が大きいので 50ms / 1MB 以上の差だけを数える
+                    floor = 0.05 if key == "wall_s" else 1.0
+                    if r >= ratio and rec[key] - base[key] >= floor:
+                        regressions.append(f"{size} {stage} {key} x{r:.2f}")
+            print(f"  {stage:<14} " + "  ".join(cells))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="an_tp_test.py の段階別ベンチマーク（合成データ・オフライン）")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help=f"計測する行数（{','.join(SIZES)} から選ぶ。カンマ区切り）")
+    parser.add_argument("--workers", type=int, default=1, help="トークン化のプロセス数（既定 1 = 逐次）")
+    parser.add_argument("--no-memory", action="store_true", help="tracemalloc を使わない（時間だけを測る）")
+    parser.add_argument("--baseline", type=Path, default=None,
+                        help="比較する基準の JSON（既定: 計測モードごとの benchmark_baseline*.json）")
+    parser.add_argument("--save-baseline", action="store_true", help="今回の結果を基準として保存する")
+    parser.add_argument("--output", type=Path, default=RESULT_PATH, help="今回の結果の保存先")
+    parser.add_argument("--data-dir", type=Path, default=DATA_DIR, help="合成 CSV の置き場")
+    parser.add_argument("--seed", type=int, default=SEED)
+    args = parser.parse_args()
+
+    if args.baseline is None:
+        args.baseline = BASELINE_PATHS[not args.no_memory]
+    sizes = [s.strip().lower() for s in args.sizes.split(",") if s.strip()]
+    unknown = [s for s in sizes if s not in SIZES]
+    if unknown:
+        parser.error(f"未対応の行数です: {', '.join(unknown)}（{', '.join(SIZES)} のいずれか）")
+
+    result = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "workers": args.workers,
+        "memory": not args.no_memory,
+        "seed": args.seed,
+        "sizes": {},
+    }
+    work_dir = Path(tempfile.mkdtemp(prefix="benchmark_"))
+    try:
+        for size in sizes:
+            n = SIZES[size]
+            print(f"\n=== {size}（{n} 行） ===")
+            t0 = time.perf_counter()
+            csv_path = ensure_corpus(n, args.data_dir, args.seed)
+            print(f"  合成データ: {csv_path}（{time.perf_counter() - t0:.1f}s）")
+            result["sizes"][size] = run_pipeline(csv_path, args.workers, not args.no_memory, work_dir)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+    print(f"\n結果を保存しました: {args.output}")
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"基準を保存しました: {args.baseline}")
+    elif args.baseline.exists():
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        reason = incompatible_baseline(result, baseline)
+        if reason:
+            print(f"[ERROR] {reason}。同じ条件で測るか、--save-baseline で基準を作り直してください: {args.baseline}")
+            sys.exit(2)
+        reason = other_host(result, baseline)
+        if reason:
+            print(f"{reason}。別の環境の基準なので比較を飛ばします（--save-baseline でこの環境の基準を作れます）: {args.baseline}")
+            return
+        regressions = compare(result, baseline)
+        if regressions:
+            print(f"\n[WARN] 基準より {REGRESSION_RATIO:.2f} 倍以上悪化した段階があります:")
+            for r in regressions:
+                print("  ", r)
+            sys.exit(1)
+        print("\n基準からの悪化はありません。")
+    else:
+        print(f"基準がありません（この環境で --save-baseline を付けて実行すると {args.baseline} に保存します）")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,14 @@
+# -*- coding: utf-8 -*-
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+
+@pytest.fixture(autouse=True)
+def _workdir(tmp_path, monkeypatch):
+    """出力先・キャッシュ・stopwords.txt は相対パスなので、テストごとに一時フォルダで実行する。"""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+import random
+
+import an_tp_test as m
+
+
+def make_task(seed=0, n_docs=300, vocab_size=40):
+    rng = random.Random(seed)
+    words = [f"語{i}" for i in range(vocab_size)]
+    docs = [[rng.choice(words[:rng.choice([5, vocab_size])]) for _ in range(rng.randint(0, 10))] for _ in range(n_docs)]
+    return m.PeriodTask("P1", docs, list(range(n_docs)), analyze=False)
+
+
+def test_approx_mode_does_not_build_exact_counts_by_default(monkeypatch):
+    monkeypatch.setattr(m, "APPROX_PAIR_COUNTS", True)
+
+    def fail(*args, **kwargs):
+        raise AssertionError("近似集計で正確な集計を作った")
+
+    monkeypatch.setattr(m, "build_pair_counts", fail)
+    res = m.analyze_period(make_task(), m.Vocabulary(), m.ModalityClassifier(m.TEGUCHI_MAP))
+    error, recall = res.approx_report
+    assert error >= 0 and recall is None
+
+
+def test_approx_report_is_opt_in(monkeypatch):
+    monkeypatch.setattr(m, "APPROX_PAIR_COUNTS", True)
+    monkeypatch.setattr(m, "APPROX_REPORT", True)
+    res = m.analyze_period(make_task(), m.Vocabulary(), m.ModalityClassifier(m.TEGUCHI_MAP))
+    _, recall = res.approx_report
+    assert recall == 1.0  # 小さなコーパスではスケッチの誤差で上位が入れ替わらない
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+import math
+from collections import Counter
+
+import numpy as np
+import pytest
+
+import an_tp_test as m
+
+# 分割表 o11=10, o12=10, o21=30, o22=950（f_x=20, f_y=40, n=1000）
+TABLE = dict(n_xy=[10], f_x=[20], f_y=[40], n=1000.0)
+
+
+@pytest.mark.parametrize("measure,expected", [
+    ("count", 10.0),
+    ("pmi", math.log2(12.5)),
+    ("npmi", math.log2(12.5) / math.log2(100)),
+    ("dice", 20 / 60),
+    ("jaccard", 10 / 50),
+    ("llr", 39.9089814127413),
+])
+def test_measures_on_known_table(measure, expected):
+    got = m.association_measure(measure, **TABLE)
+    assert got == pytest.approx([expected])
+
+
+def test_perfect_and_independent_association():
+    # 2 語が常に一緒に出る: o11 = f_x = f_y
+    perfect = dict(n_xy=[5], f_x=[5], f_y=[5], n=100.0)
+    assert m.association_measure("npmi", **perfect) == pytest.approx([1.0])
+    assert m.association_measure("dice", **perfect) == pytest.approx([1.0])
+    assert m.association_measure("jaccard", **perfect) == pytest.approx([1.0])
+    assert m.association_measure("pmi", **perfect) == pytest.approx([math.log2(20)])
+    assert m.association_measure("llr", **perfect) == pytest.approx([39.7030486691745])
+    # 独立: o11 = f_x * f_y / n
+    independent = dict(n_xy=[4], f_x=[20], f_y=[20], n=100.0)
+    for measure in ("pmi", "npmi", "llr"):
+        assert m.association_measure(measure, **independent) == pytest.approx([0.0], abs=1e-12)
+
+
+def test_counts_are_clipped_and_undefined_scores_go_last():
+    clipped = m.association_measure("dice", n_xy=[30, 20], f_x=[20, 20], f_y=[40, 40], n=1000.0)
+    assert clipped[0] == clipped[1]
+    zero = m.association_measure("pmi", n_xy=[0], f_x=[20], f_y=[40], n=1000.0)
+    assert zero[0] == -np.inf
+    with pytest.raises(ValueError):
+        m.association_measure("chi2", **TABLE)
+
+
+def test_association_scores_use_word_frequencies_and_min_count():
+    vocab = m.Vocabulary()
+    docs = [["a", "b"]] * 6 + [["a", "c"]] * 2 + [["c", "d"]] * 6
+    pc = m.build_pair_counts(docs, vocab)
+    freq = Counter(t for d in docs for t in d)
+    n = float(sum(freq.values()))
+    scores = {pair: sc for pair, _, sc in pc.ranked(pc.association(freq, "pmi", min_count=5))}
+    assert scores[("a", "b")] == pytest.approx(math.log2(6 * n / (freq["a"] * freq["b"])))
+    assert scores[("a", "c")] == -np.inf  # 共起数 min_count 未満は後ろへ
+    assert pc.association(freq, "count").tolist() == pc.counts.astype(float).tolist()
+
+
+@pytest.mark.parametrize("cell,expected", [
+    ("電話|勧誘 (12)", "電話|勧誘"),
+    ("電話|勧誘 (9.31)", "電話|勧誘"),
+    ("電話｜勧誘 (-0.25)", "電話|勧誘"),
+    ("電話|勧誘", "電話|勧誘"),
+    ("", ""),
+])
+def test_extract_pair_from_display_cell(cell, expected):
+    assert m._extract_pair_from_display_cell(cell) == expected
+
+
+def test_table_highlights_with_association_measure():
+    pytest.importorskip("matplotlib")
+    vocab = m.Vocabulary()
+    docs = [
+        [["電話", "勧誘"]] * 6 + [["解約", "返金"]] * 5 + [["契約", "書面"]] * 5,
+        [["電話", "勧誘"]] * 5 + [["ネット", "注文"]] * 7 + [["定期", "購入"]] * 5,
+    ]
+    pcs = [m.build_pair_counts(d, vocab) for d in docs]
+    freqs = [Counter(t for doc in d for t in doc) for d in docs]
+    df_display, df_keys = m.build_cooccurrence_top_table(["P1", "P2"], [pc.as_counter() for pc in pcs], top_n=3,
+                                                         period_pair_counts=pcs, period_token_freqs=freqs, measure="pmi")
+    assert all("." in v for v in df_display.to_numpy().ravel())  # 括弧内は小数の関連度
+
+    highlights = m._table_highlights(df_display, df_keys)
+    unique_cells = {(r, c) for r in range(3) for c in range(2) if df_keys.iloc[r, c] != "勧誘|電話"}
+    assert set(highlights) == unique_cells and len(unique_cells) == 4
+    # 表示文字列しか無くても同じセルを塗る
+    assert m._table_highlights(df_display, None) == highlights
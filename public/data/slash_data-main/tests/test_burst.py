@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+import math
+
+import numpy as np
+import pytest
+
+import an_tp_test as m
+
+LABELS = [f"P{j}" for j in range(6)]
+DOCS = [100] * 6
+
+
+def make_matrix(series):
+    """series: {ペア: 期間ごとの共起数} から行列を作る（1 文書 = そのペア 1 回）。"""
+    vocab = m.Vocabulary()
+    pcs = []
+    for j in range(len(LABELS)):
+        docs = [list(pair) for pair, counts in series.items() for _ in range(counts[j])]
+        pcs.append(m.build_pair_counts(docs, vocab))
+    return m.PairPeriodMatrix.from_period_counts(vocab, LABELS, pcs)
+
+
+def test_synthetic_spike_is_the_only_emerging_pair():
+    pm = make_matrix({
+        ("a", "b"): [3, 3, 3, 3, 3, 3],
+        ("c", "d"): [1, 1, 1, 1, 20, 1],
+        ("e", "f"): [10, 12, 8, 10, 11, 9],
+    })
+    z, expected = pm.burst_scores(DOCS, window=3)
+    row = pm.rows_for([("c", "d")])[0]
+    # 直前 3 期間の割合は 0.01 で一定 → 期待値 1、分散 0 なので z = (20 - 1) / sqrt(1 + 1)
+    assert expected[row, 4] == pytest.approx(1.0)
+    assert z[row, 4] == pytest.approx(19 / math.sqrt(2))
+    assert np.isnan(z[:, 0]).all() and np.isnan(expected[:, 0]).all()
+    steady = pm.rows_for([("a", "b")])[0]
+    assert z[steady, 1:] == pytest.approx(np.zeros(5))
+
+    df = pm.emerging_pairs(DOCS, window=3, z_threshold=3.0, min_count=5)
+    assert list(df["期間"]) == ["P4"]
+    assert list(df["ペア"]) == ["c|d"]
+    assert df["共起数"].tolist() == [20]
+    assert df["zスコア"].iloc[0] == pytest.approx(19 / math.sqrt(2))
+
+
+def test_short_history_and_min_count():
+    pm = make_matrix({
+        ("a", "b"): [2, 2, 12, 2, 2, 2],   # 2 期間分の履歴で急増
+        ("c", "d"): [0, 0, 0, 4, 0, 0],    # 直前に出現がない（急増ではなく新規ペア）
+    })
+    z, expected = pm.burst_scores(DOCS, window=3)
+    row = pm.rows_for([("a", "b")])[0]
+    assert expected[row, 2] == pytest.approx(2.0)
+    assert z[row, 2] == pytest.approx(10 / math.sqrt(3))
+
+    df = pm.emerging_pairs(DOCS, window=3, z_threshold=3.0, min_count=5)
+    assert list(zip(df["期間"], df["ペア"])) == [("P2", "a|b")]
+    assert pm.emerging_pairs(DOCS, window=3, z_threshold=3.0, min_count=1)["ペア"].tolist() == ["a|b"]
+    assert pm.emerging_pairs(DOCS, window=3, z_threshold=100.0).empty
+    assert pm.new_pairs(window=3, min_count=5).empty
+    new = pm.new_pairs(window=3, min_count=1)
+    assert list(zip(new["期間"], new["ペア"], new["初出"])) == [("P3", "c|d", True)]
+
+
+def test_new_pair_does_not_outrank_real_spike():
+    pm = make_matrix({
+        ("a", "b"): [2, 2, 2, 2, 15, 2],    # 安定した基準からの急増
+        ("c", "d"): [0, 0, 0, 0, 30, 0],    # 初めて出たペア（共起数は a|b より多い）
+        ("e", "f"): [3, 0, 0, 0, 8, 0],     # 直前 3 期間に出ていない再出現
+        ("g", "h"): [0, 0, 0, 1, 30, 0],    # 1 期間だけ履歴がある
+    })
+    z, _ = pm.burst_scores(DOCS, window=3)
+    assert np.isnan(z[pm.rows_for([("c", "d"), ("e", "f")]), 4]).all()
+
+    df = pm.emerging_pairs(DOCS, window=3, z_threshold=3.0, min_count=5)
+    assert list(zip(df["期間"], df["ペア"])) == [("P4", "g|h"), ("P4", "a|b")]
+    # 履歴が 1 期間しかない（基準が弱い）ペアは min_history を上げると除ける
+    df = pm.emerging_pairs(DOCS, window=3, z_threshold=3.0, min_count=5, min_history=2)
+    assert df["ペア"].tolist() == ["a|b"]
+
+    new = pm.new_pairs(window=3, min_count=5)
+    assert list(zip(new["期間"], new["順位"], new["ペア"], new["共起数"], new["初出"])) == [
+        ("P4", 1, "c|d", 30, True),
+        ("P4", 2, "e|f", 8, False),
+    ]
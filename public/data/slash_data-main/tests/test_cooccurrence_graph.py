@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+import random
+
+import pytest
+
+import an_tp_test as m
+
+nx = pytest.importorskip("networkx")
+
+
+def make_pair_counts(seed, window_size, n_docs=200, vocab_size=30):
+    rng = random.Random(seed)
+    words = [f"語{i}" for i in range(vocab_size)]
+    docs = [[rng.choice(words) for _ in range(rng.randint(0, 10))] for _ in range(n_docs)]
+    return m.build_pair_counts(docs, m.Vocabulary(), window_size=window_size)
+
+
+def reference_graph(counter, min_freq):
+    """CSR 版の導入前に分析で使っていた networkx のグラフ（Counter の挿入順にエッジを追加）。"""
+    G = nx.Graph()
+    for (w1, w2), c in counter.items():
+        if c >= min_freq:
+            G.add_edge(w1, w2, weight=c)
+    return G
+
+
+@pytest.mark.parametrize("window_size", [5, None])
+@pytest.mark.parametrize("seed", [0, 1])
+@pytest.mark.parametrize("min_freq", [1, 5])
+def test_graph_matches_networkx(seed, window_size, min_freq):
+    pc = make_pair_counts(seed, window_size)
+    G = m.CooccurrenceGraph.from_pair_counts(pc, min_freq=min_freq)
+    ref = reference_graph(pc.as_counter(), min_freq)
+
+    assert G.nodes == list(ref.nodes)
+    assert len(G) == ref.number_of_nodes()
+    assert G.number_of_edges() == ref.number_of_edges()
+    for n in ref.nodes:
+        expected = [(b, d["weight"]) for b, d in ref.adj[n].items()]
+        assert G.neighbors(n) == expected
+        assert len(G.neighbor_arrays(n)[0]) == ref.degree(n)
+    for a in ref.nodes:
+        for b in ref.nodes:
+            expected = ref.edges[a, b]["weight"] if ref.has_edge(a, b) else None
+            assert G.weight(a, b) == expected
+    assert G.weight("語0", "無い語") is None
+
+    ranked = sorted(ref.edges(data=True), key=lambda x: x[2]["weight"], reverse=True)
+    assert G.top_edges() == [(a, b, d["weight"]) for a, b, d in ranked]
+    assert m.select_edges_for_drawing(G, 10) == [(a, b, d["weight"]) for a, b, d in ranked[:10]]
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+import os
+
+import pytest
+
+import an_tp_test as m
+
+pytest.importorskip("pyarrow")
+
+
+def write_csv(path, rows):
+    """相談データの CSV と同じ形（1 行目は見出し、日付は 1 列目、本文は 7 列目、cp932）で書く。"""
+    lines = ["受付日,a,b,c,d,e,相談概要"]
+    lines += [f"{date},,,,,,{text}" for date, text in rows]
+    path.write_bytes(("\n".join(lines) + "\n").encode("cp932"))
+
+
+ROWS = [("2023年4月1日", "電話で勧誘された"), ("不明", "日付なし"), ("2023年4月3日", "ネットで注文した")]
+
+
+@pytest.fixture
+def count_reads(monkeypatch):
+    calls = []
+    read = m._read_csv_chunked
+
+    def wrapped(*args, **kwargs):
+        calls.append(args[0])
+        return read(*args, **kwargs)
+
+    monkeypatch.setattr(m, "_read_csv_chunked", wrapped)
+    return calls
+
+
+def test_feather_cache_round_trip(tmp_path, count_reads):
+    path = tmp_path / "R5 1.csv"
+    write_csv(path, ROWS)
+    first = m.load_csv_streaming(str(path), chunk_rows=2, use_cache=True)
+    second = m.load_csv_streaming(str(path), chunk_rows=2, use_cache=True)
+    assert len(count_reads) == 1
+    # 日付を読めない行は落とし、index は CSV の行番号のまま
+    assert list(first.index) == [0, 2]
+    assert list(first["text"]) == ["電話で勧誘された", "ネットで注文した"]
+    assert list(second.index) == list(first.index)
+    assert list(second["text"]) == list(first["text"])
+    assert list(second["date"]) == list(first["date"])
+
+
+def test_feather_cache_survives_touch_and_invalidates_on_change(tmp_path, count_reads):
+    path = tmp_path / "R5 1.csv"
+    write_csv(path, ROWS)
+    m.load_csv_streaming(str(path), use_cache=True)
+    st = path.stat()
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    m.load_csv_streaming(str(path), use_cache=True)
+    assert len(count_reads) == 1  # 内容が同じなら mtime が変わってもキャッシュを使う
+
+    write_csv(path, ROWS + [("2023年5月1日", "追加の相談")])
+    df = m.load_csv_streaming(str(path), use_cache=True)
+    assert len(count_reads) == 2
+    assert list(df["text"])[-1] == "追加の相談"
+
+
+def test_multi_file_glob_offsets_rows(tmp_path):
+    write_csv(tmp_path / "R6 1.csv", ROWS)
+    write_csv(tmp_path / "R6 2.csv", [("2023年6月1日", "二つ目のファイル")])
+    df = m.load_csv_streaming(str(tmp_path / "R6 *.csv"), use_cache=True)
+    assert list(df.index) == [0, 2, 3]
+    assert list(df["text"])[-1] == "二つ目のファイル"
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+from collections import Counter
+
+import pytest
+
+import an_tp_test as m
+
+openpyxl = pytest.importorskip("openpyxl")
+pytest.importorskip("matplotlib")
+
+
+def period_counts():
+    vocab = m.Vocabulary()
+    docs = [
+        [["電話", "勧誘", "契約"], ["電話", "勧誘"], ["解約", "返金"]],
+        [["ネット", "注文", "返金"], ["ネット", "注文"], ["電話", "勧誘"]],
+    ]
+    return vocab, [m.build_pair_counts(d, vocab, window_size=None) for d in docs]
+
+
+def test_cooccurrence_table_highlights_only_unique_pairs():
+    _, pcs = period_counts()
+    counters = [pc.as_counter() for pc in pcs]
+    df_display, df_keys = m.build_cooccurrence_top_table(["P1", "P2"], counters, top_n=4, measure="count")
+    path = m.export_cooccurrence_table_to_excel(df_keys, df_display, filename="top.xlsx")
+
+    wb = openpyxl.load_workbook(path)
+    ws = wb["共起上位"]
+    rows = list(ws.iter_rows(values_only=True))
+    assert rows[0] == ("順位\\期間", "P1", "P2")
+    assert [r[1:] for r in rows[1:]] == [tuple(df_display.iloc[i]) for i in range(4)]
+
+    shared = m._normalize_key("勧誘|電話")  # 両方の期間に出るペアは塗らない
+    for r in range(4):
+        for c in range(2):
+            cell = ws.cell(row=r + 2, column=c + 2)
+            key = m._normalize_key(df_keys.iloc[r, c])
+            filled = cell.fill.fill_type == "solid"
+            assert filled == (bool(key) and key != shared)
+    assert shared in set(df_keys["P1"]) & set(df_keys["P2"])
+    assert ws.column_dimensions["B"].width == 40
+    legend = [r[1] for r in wb["凡例"].iter_rows(min_row=2, values_only=True)]
+    assert shared not in legend and len(legend) == len(set(legend)) > 0
+
+
+def test_pair_period_matrix_export_streams_all_pairs():
+    vocab, pcs = period_counts()
+    pm = m.PairPeriodMatrix.from_period_counts(vocab, ["P1", "P2"], pcs)
+    path = m.export_pair_period_matrix_to_excel(pm, filename="matrix.xlsx", min_total=1)
+
+    rows = list(openpyxl.load_workbook(path)["共起数"].iter_rows(values_only=True))
+    assert rows[0] == ("ペア", "P1", "P2", "合計")
+    expected = sum((pc.as_counter() for pc in pcs), Counter()).most_common()
+    assert [(r[0], r[3]) for r in rows[1:]] == [("|".join(p), c) for p, c in expected]
+    by_pair = {r[0]: r[1:3] for r in rows[1:]}
+    assert by_pair["勧誘|電話"] == (2, 1)
+    assert by_pair["ネット|注文"] == (None, 2)  # 0 件は空欄
+
+    path = m.export_pair_period_matrix_to_excel(pm, filename="matrix2.xlsx", min_total=2)
+    rows = list(openpyxl.load_workbook(path)["共起数"].iter_rows(values_only=True))
+    assert all(r[3] >= 2 for r in rows[1:]) and len(rows) > 1
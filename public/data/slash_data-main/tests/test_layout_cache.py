@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+from pathlib import Path
+
+import an_tp_test as m
+
+EDGES_A = [("電話", "勧誘", 5), ("勧誘", "解約", 3), ("電話", "高額", 2)]
+EDGES_B = [("電話", "勧誘", 4), ("勧誘", "返金", 2), ("ネット", "返金", 2)]
+
+
+def run_periods(path, periods):
+    cache = m.NetworkLayoutCache(path=path)
+    out = [cache.layout(edges) for edges in periods]
+    cache.save()
+    return out
+
+
+def test_key_depends_on_shared_initial_positions():
+    cold = m.NetworkLayoutCache.key_for(EDGES_B)
+    warm = m.NetworkLayoutCache.key_for(EDGES_B, {"電話": (0.1, 0.2), "無関係": (0.5, 0.5)})
+    other = m.NetworkLayoutCache.key_for(EDGES_B, {"電話": (0.3, 0.2)})
+    assert len({cold, warm, other}) == 3
+    # edges に出てこない語の座標はレイアウトに効かないのでキーも変えない
+    assert m.NetworkLayoutCache.key_for(EDGES_B, {"無関係": (0.5, 0.5)}) == cold
+
+
+def test_cached_warm_start_matches_fresh_layout():
+    path = Path("layouts.json")
+    # 1 回目は EDGES_A の後に EDGES_B（A の座標から開始）、2 回目は EDGES_B だけ（初期座標なし）
+    _, warm_b = run_periods(path, [EDGES_A, EDGES_B])
+    (cold_b,) = run_periods(path, [EDGES_B])
+    assert cold_b == m.compute_network_layout(EDGES_B)
+    assert cold_b != warm_b
+    # 同じ順で描けばキャッシュから同じ座標が返る
+    assert run_periods(path, [EDGES_A, EDGES_B])[1] == warm_b
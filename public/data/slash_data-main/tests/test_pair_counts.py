@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+import random
+from collections import Counter
+from itertools import combinations
+
+import pytest
+
+import an_tp_test as m
+
+
+def reference_counter(tokenized_docs, window_size=None):
+    """整数語彙エンジン導入前の build_cooccurrence_counter（基準の実装）。"""
+    cooccurrence = Counter()
+    for tokens in tokenized_docs:
+        if not tokens:
+            continue
+        if window_size:
+            for i in range(len(tokens)):
+                for j in range(i + 1, min(i + window_size + 1, len(tokens))):
+                    if tokens[i] != tokens[j]:
+                        cooccurrence[tuple(sorted((tokens[i], tokens[j])))] += 1
+        else:
+            for w1, w2 in combinations(list(dict.fromkeys(tokens)), 2):
+                cooccurrence[tuple(sorted((w1, w2)))] += 1
+    return cooccurrence
+
+
+def make_docs(seed, n_docs=200, vocab_size=30):
+    rng = random.Random(seed)
+    words = [f"語{i}" for i in range(vocab_size)]
+    return [[rng.choice(words) for _ in range(rng.randint(0, 12))] for _ in range(n_docs)]
+
+
+@pytest.mark.parametrize("window_size", [5, 2, None])
+@pytest.mark.parametrize("seed", [0, 1])
+def test_pair_counts_match_reference_counter(seed, window_size):
+    docs = make_docs(seed)
+    expected = reference_counter(docs, window_size)
+    pc = m.build_pair_counts(docs, m.Vocabulary(), window_size=window_size)
+    got = pc.as_counter()
+    assert got == expected
+    assert list(got) == list(expected)  # 初出順（Counter の挿入順）も同じ
+    assert pc.most_common(15) == expected.most_common(15)
+    assert pc.total() == sum(expected.values())
+
+
+def test_sum_of_pair_counts_matches_counter_sum():
+    vocab = m.Vocabulary()
+    parts = [make_docs(s, n_docs=50) for s in (3, 4, 5)]
+    total = m.PairCounts.sum([m.build_pair_counts(p, vocab, window_size=5) for p in parts], vocab)
+    expected = Counter()
+    for p in parts:
+        expected.update(reference_counter(p, 5))
+    assert total.as_counter() == expected
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+import random
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import an_tp_test as m
+
+
+def make_periods(seed, n_periods=5, vocab_size=20):
+    rng = random.Random(seed)
+    words = [f"語{i}" for i in range(vocab_size)]
+    vocab = m.Vocabulary()
+    pcs = []
+    for _ in range(n_periods):
+        docs = [[rng.choice(words) for _ in range(rng.randint(0, 8))] for _ in range(rng.randint(0, 60))]
+        pcs.append(m.build_pair_counts(docs, vocab, window_size=5))
+    labels = [f"P{j}" for j in range(n_periods)]
+    return vocab, labels, pcs
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_matrix_matches_summed_counters(seed):
+    vocab, labels, pcs = make_periods(seed)
+    counters = [pc.as_counter() for pc in pcs]
+    pm = m.PairPeriodMatrix.from_period_counts(vocab, labels, pcs)
+
+    total = Counter()
+    for c in counters:
+        total.update(c)
+    assert len(pm) == len(total)
+    order = pm.most_common_order()
+    assert list(zip(pm.pairs(order), pm.totals()[order].tolist())) == total.most_common()
+
+    rows = pm.rows_for(list(total))
+    for (pair, _), row in zip(total.items(), rows):
+        assert pm.counts[row].tolist() == [c.get(pair, 0) for c in counters]
+
+
+@pytest.mark.parametrize("normalize", [False, True])
+def test_timeseries_matches_counter_baseline(normalize):
+    vocab, labels, pcs = make_periods(3)
+    counters = [pc.as_counter() for pc in pcs]
+    pm = m.PairPeriodMatrix.from_period_counts(vocab, labels, pcs)
+    candidates = [p for p, _ in sum(counters, Counter()).most_common(8)] + [("語0", "無い語")]
+    doc_counts = [40, 0, 25, 60, 10]
+
+    rows = pm.rows_for(candidates)
+    assert rows[-1] == -1
+    got = pm.timeseries(rows[:-1], doc_counts, normalize=normalize)
+    expected = m.build_pair_timeseries_with_norm(labels, counters, candidates[:-1], doc_counts, normalize=normalize)
+    pd.testing.assert_frame_equal(got, expected, check_dtype=False)
+
+
+def test_trend_table_orders_by_change():
+    vocab = m.Vocabulary()
+    docs = [[["a", "b"]] * 2, [["a", "b"]] * 9 + [["c", "d"]] * 3, [["c", "d"]] * 4]
+    pcs = [m.build_pair_counts(d, vocab) for d in docs]
+    pm = m.PairPeriodMatrix.from_period_counts(vocab, ["P1", "P2", "P3"], pcs)
+    table = pm.trend_table(normalize=False, changed_only=False)
+    assert list(table.index) == ["a|b", "c|d"]
+    assert table.loc["a|b", "変化幅"] == 9 and table.loc["c|d", "変化幅"] == 4
+    assert table.loc["a|b", "合計"] == 11
+    assert np.isclose(table.loc["c|d", "相対変化"], 1.0)
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+import random
+from collections import Counter
+
+import pandas as pd
+import pytest
+
+import an_tp_test as m
+
+
+def make_df(seed=0, n_rows=240, vocab_size=25):
+    rng = random.Random(seed)
+    words = [f"語{i}" for i in range(vocab_size)]
+    dates = pd.to_datetime("2023-01-01") + pd.to_timedelta([rng.randint(0, 364) for _ in range(n_rows)], unit="D")
+    tokens = [[rng.choice(words) for _ in range(rng.randint(0, 10))] for _ in range(n_rows)]
+    # トークン化できなかった行（tokens が NA）も混ぜる
+    for i in rng.sample(range(n_rows), 10):
+        tokens[i] = None
+    return pd.DataFrame({"date": dates, "text": ["x"] * n_rows, "tokens": pd.Series(tokens, dtype=object)})
+
+
+@pytest.mark.parametrize("months,step_months", [(m.PERIOD_MONTHS, None), (3, 1)])
+def test_window_counts_match_analyze_period(monkeypatch, months, step_months):
+    # 頻度フィルタが効くように上限を下げる（窓ごとに残る語が変わる）
+    monkeypatch.setattr(m, "TOKEN_MAX_FREQ", 40)
+    df = make_df()
+    vocab = m.Vocabulary()
+    classifier = m.ModalityClassifier(m.TEGUCHI_MAP)
+    windows = m.build_window_counts(df, vocab, months=months, step_months=step_months)
+    periods = m.split_periods(df, months, step_months)
+    assert len(windows) == len(periods)
+    for (label, pc, freq, n_rows), (start, _, chunk) in zip(windows, periods):
+        has_tokens = chunk["tokens"].notna()
+        task = m.PeriodTask(label, chunk["tokens"][has_tokens].tolist(), chunk.index[has_tokens].to_numpy(), analyze=False)
+        res = m.analyze_period(task, vocab, classifier)
+        expected = m.PairCounts(vocab, *res.pair_arrays)
+        assert label == m.period_label(start, months)
+        assert n_rows == len(chunk)
+        assert freq == res.freq
+        assert list(pc.as_counter().items()) == list(expected.as_counter().items())
+
+
+def direct_filtered_counts(chunk, vocab, window_size):
+    """窓の頻度フィルタ前の語列をそのまま数え、窓の語頻度でペアを絞る（月次ベースの近似が目指す値）。"""
+    has_tokens = chunk["tokens"].notna()
+    docs = chunk["tokens"][has_tokens].tolist()
+    freq = Counter(t for doc in docs for t in doc)
+    pc = m.build_pair_counts(docs, vocab, window_size=window_size, doc_keys=chunk.index[has_tokens].to_numpy())
+    return m.filter_pairs_by_freq(pc, freq), freq
+
+
+@pytest.mark.parametrize("window_size", [None, 3])
+def test_monthly_bases_compose_to_direct_window_counts(monkeypatch, window_size):
+    monkeypatch.setattr(m, "TOKEN_MAX_FREQ", 40)
+    df = make_df(seed=1)
+    vocab = m.Vocabulary()
+    bases = m.build_monthly_bases(df, vocab, window_size=window_size)
+    composed = m.compose_window_counts(bases, vocab, df, months=3, step_months=1)
+    periods = m.split_periods(df, 3, 1)
+    assert len(composed) == len(periods)
+    for (label, pc, freq, n_rows), (start, _, chunk) in zip(composed, periods):
+        expected, expected_freq = direct_filtered_counts(chunk, vocab, window_size)
+        assert label == m.period_label(start, 3)
+        assert n_rows == len(chunk)
+        assert freq == expected_freq
+        assert list(pc.as_counter().items()) == list(expected.as_counter().items())
+
+
+@pytest.mark.parametrize("window_size,min_freq,max_freq", [(None, 3, 40), (3, 1, 10 ** 9)])
+def test_monthly_bases_match_exact_windows_when_filter_commutes(monkeypatch, window_size, min_freq, max_freq):
+    # 窓なし、または頻度フィルタで語が落ちないときは、後からペアを絞っても正確な数え直しと一致する
+    monkeypatch.setattr(m, "TOKEN_MIN_FREQ", min_freq)
+    monkeypatch.setattr(m, "TOKEN_MAX_FREQ", max_freq)
+    monkeypatch.setattr(m.count_period_pairs, "__defaults__", (window_size,))
+    df = make_df(seed=2)
+    vocab = m.Vocabulary()
+    composed = m.compose_window_counts(m.build_monthly_bases(df, vocab, window_size=window_size), vocab, df,
+                                       months=3, step_months=1)
+    exact = m.build_window_counts(df, vocab, months=3, step_months=1)
+    assert [(lab, dict(f), n) for lab, _, f, n in composed] == [(lab, dict(f), n) for lab, _, f, n in exact]
+    for (_, pc, _, _), (_, expected, _, _) in zip(composed, exact):
+        assert pc.as_counter() == expected.as_counter()
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+import math
+import random
+from itertools import combinations
+
+import pytest
+
+import an_tp_test as m
+
+CLASSIFIER = m.ModalityClassifier(m.TEGUCHI_MAP)
+
+
+def make_graph(seed, n_docs=150, vocab_size=14, min_freq=4):
+    rng = random.Random(seed)
+    words = ["電話", "ネット"] + [f"語{i}" for i in range(vocab_size)]
+    docs = [[rng.choice(words) for _ in range(rng.randint(0, 8))] for _ in range(n_docs)]
+    pc = m.build_pair_counts(docs, m.Vocabulary(), window_size=None)
+    return m.CooccurrenceGraph.from_pair_counts(pc, min_freq=min_freq)
+
+
+def exhaustive(G, size, teguchi_node=None, top_k=5, nodes=None):
+    """全組み合わせを試す基準の実装（候補の並びは mine_problem_sets と同じ）。"""
+    weight = {}
+    for a in G.nodes:
+        for b, w in G.neighbors(a):
+            weight[a, b] = w
+    if teguchi_node is not None:
+        ranked = sorted(((n, w) for n, w in G.neighbors(teguchi_node) if not CLASSIFIER.is_teguchi(n)),
+                        key=lambda x: x[1], reverse=True)
+        candidates = [n for n, _ in ranked]
+        base = dict(ranked)
+    else:
+        candidates = [n for n in (G.nodes if nodes is None else nodes) if not CLASSIFIER.is_teguchi(n)]
+        base = {n: math.inf for n in candidates}
+    found = []
+    for combo in combinations(candidates, size):
+        ws = [base[n] for n in combo] + [weight.get(pair) for pair in combinations(combo, 2)]
+        if None in ws:
+            continue
+        found.append((tuple(sorted(combo)), float(min(ws))))
+    found.sort(key=lambda x: -x[1])
+    return found[:top_k]
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+@pytest.mark.parametrize("size", [2, 3, 4, 5])
+@pytest.mark.parametrize("top_k", [1, 5, 50])
+def test_mine_problem_sets_matches_exhaustive_search(seed, size, top_k):
+    G = make_graph(seed)
+    for teguchi in ("電話", "ネット"):
+        assert teguchi in G
+        got = m.mine_problem_sets(G, size, CLASSIFIER, teguchi_node=teguchi, top_k=top_k, max_neighbors=None)
+        assert got == exhaustive(G, size, teguchi, top_k)
+    got = m.mine_problem_sets(G, size, CLASSIFIER, top_k=top_k, max_neighbors=None)
+    assert got == exhaustive(G, size, top_k=top_k)
+
+
+def test_mine_problem_sets_restricts_to_given_nodes():
+    G = make_graph(3)
+    nodes = [n for n in G.nodes if not CLASSIFIER.is_teguchi(n)][::2]
+    got = m.mine_problem_sets(G, 3, CLASSIFIER, top_k=10, nodes=nodes, max_neighbors=None)
+    assert got == exhaustive(G, 3, top_k=10, nodes=nodes)
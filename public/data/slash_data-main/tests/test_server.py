@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+import json
+import threading
+import urllib.error
+import urllib.request
+from pathlib import Path
+
+import pytest
+
+import an_tp_test as m
+
+pytest.importorskip("janome")
+
+TEXTS = ["電話で健康食品の勧誘があった。解約できない。", "ネットで化粧品を注文した。返金されない。",
+         "訪問販売で浄水器を契約した。解約したい。", "メールで副業サイトに登録した。高額な請求が来た。"]
+
+
+def write_csv(path: Path, months=("4", "5", "6", "7"), per_month=12):
+    """R5 1.csv と同じ形（見出し 1 行、日付は 1 列目、本文は 7 列目、cp932）。"""
+    lines = ["受付日,a,b,c,d,e,件名"]
+    for mo in months:
+        for i in range(per_month):
+            lines.append(f"2023年{mo}月{i + 1}日,,,,,,{TEXTS[i % len(TEXTS)]}")
+    path.write_bytes(("\n".join(lines) + "\n").encode("cp932"))
+
+
+@pytest.fixture
+def server():
+    write_csv(Path(m.CSV_SOURCE))
+    service = m.AnalysisService()
+    httpd = m.ThreadingHTTPServer(("127.0.0.1", 0), m.AnalysisRequestHandler)
+    httpd.daemon_threads = True
+    httpd.service = service
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{httpd.server_address[1]}", service
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+        service.close()
+
+
+def request(url, body=None, timeout=30):
+    data = None if body is None else (body if isinstance(body, bytes) else json.dumps(body).encode("utf-8"))
+    req = urllib.request.Request(url, data=data, headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as res:
+            return res.status, json.loads(res.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+
+def test_health_and_analyze_round_trip(server):
+    base, _ = server
+    status, body = request(base + "/health")
+    assert status == 200 and body["status"] == "ok" and body["requests"] == 0
+
+    params = {"startDate": "2023-04-01", "endDate": "2023-07-31", "periodMonths": 2, "topN": 3}
+    status, first = request(base + "/analyze", params)
+    assert status == 200 and first["cached"] is False
+    assert [p["label"] for p in first["periods"]] == ["2023-04~05", "2023-06~07"]
+    assert [p["rows"] for p in first["periods"]] == [24, 24]
+    assert all(len(p["top_pairs"]) == 3 for p in first["periods"])
+
+    status, second = request(base + "/analyze", params)
+    assert status == 200 and second["cached"] is True
+    assert second["periods"] == first["periods"]
+    _, health = request(base + "/health")
+    assert (health["requests"], health["result_hits"], health["cached_results"]) == (2, 1, 1)
+
+    # 期間の区切りが同じなら、集計済みの期間は関連度を変えても再計算しない
+    status, pmi = request(base + "/analyze", dict(params, measure="pmi"))
+    assert status == 200 and pmi["cached"] is False
+    assert request(base + "/health")[1]["cached_periods"] == 2
+
+
+@pytest.mark.parametrize("path,body,expected", [
+    ("/analyze", {"measure": "chi2"}, 400),
+    ("/analyze", {"periodMonths": 0}, 400),
+    ("/analyze", {"topN": "many"}, 400),
+    ("/analyze", [1, 2], 400),
+    ("/analyze", b"{not json", 400),
+    ("/unknown", {}, 404),
+])
+def test_bad_requests(server, path, body, expected):
+    base, _ = server
+    status, res = request(base + path, body)
+    assert status == expected and "error" in res
+
+
+def test_cached_results_do_not_wait_for_a_running_analysis(server):
+    base, service = server
+    params = {"periodMonths": 2}
+    assert request(base + "/analyze", params)[0] == 200
+    # 別の分析が計算中（_compute_lock を持っている）でも、覚えている結果はすぐ返る
+    with service._compute_lock:
+        status, res = request(base + "/analyze", params, timeout=5)
+    assert status == 200 and res["cached"] is True
+
+
+def test_changed_rows_recompute_only_their_period(server):
+    base, _ = server
+    params = {"periodMonths": 2}
+    _, before = request(base + "/analyze", params)
+    write_csv(Path(m.CSV_SOURCE), months=("4", "5", "6", "7", "7"))
+    _, after = request(base + "/analyze", params)
+    assert after["cached"] is False
+    assert after["periods"][0] == before["periods"][0]
+    assert after["periods"][1]["rows"] == before["periods"][1]["rows"] + 12
+    assert request(base + "/health")[1]["cached_periods"] == 3
@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+import sqlite3
+
+import an_tp_test as m
+
+
+def make_db(path):
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE cases (id INTEGER PRIMARY KEY, date TEXT, name TEXT, description TEXT, type TEXT)")
+    conn.executemany("INSERT INTO cases (id, date, name, description, type) VALUES (?, ?, ?, ?, ?)", [
+        (1, "2023-04-01", "a", "電話で勧誘された", "t"),
+        (2, "2023/04/02", "b", "日付の形式が違う", "t"),
+        (3, "2023-05-10", "c", "ネットで注文した", "t"),
+        (4, "2023-06-20", "d", "返金されない", "t"),
+    ])
+    conn.commit()
+    conn.close()
+
+
+def test_load_cases_filters_by_date_range(tmp_path):
+    db = tmp_path / "cases.db"
+    make_db(db)
+    df = m.load_cases_from_sqlite(db, start_date="2023-05-01", end_date="2023-06-30",
+                                  text_column="description", batch_size=1)
+    assert list(df.index) == [3, 4]
+    assert list(df["text"]) == ["ネットで注文した", "返金されない"]
+
+
+def test_load_cases_warns_about_unparseable_dates(tmp_path, capsys):
+    db = tmp_path / "cases.db"
+    make_db(db)
+    df = m.load_cases_from_sqlite(db, text_column="name")
+    assert list(df.index) == [1, 3, 4]
+    out = capsys.readouterr().out
+    assert "[warn]" in out and "1 行" in out and "id: 2" in out
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+from pathlib import Path
+
+import an_tp_test as m
+
+DOCS = ["電話で健康食品の勧誘があった。", "ネット通販で解約できない。", "電話で健康食品の勧誘があった。"]
+
+
+def test_cache_round_trip_hits_on_second_run():
+    pre = m.TextPreprocessor()
+    path = Path("cache/tokens.sqlite3")
+    cache = m.TokenCache(pre.rules_fingerprint(), path=path)
+    first = m.tokenize_documents(DOCS, pre, cache, workers=1)
+    assert (cache.hits, cache.misses) == (1, 2)  # 同じ本文は 1 回だけ Janome にかける
+    cache.close()
+
+    cache = m.TokenCache(pre.rules_fingerprint(), path=path)
+    second = m.tokenize_documents(DOCS, pre, cache, workers=1)
+    assert (cache.hits, cache.misses) == (3, 0)
+    assert second == first == [pre.tokenize(d) for d in DOCS]
+    cache.close()
+
+
+def test_cache_is_invalidated_when_rules_change():
+    path = Path("cache/tokens.sqlite3")
+    cache = m.TokenCache("rules-v1", path=path)
+    cache.put_many({cache.key_for("本文"): ["本文"]})
+    assert cache.get_many([cache.key_for("本文")])
+    cache.close()
+
+    cache = m.TokenCache("rules-v2", path=path)
+    assert cache.conn.execute("SELECT COUNT(*) FROM tokens").fetchone() == (0,)
+    cache.close()
+
+
+def test_cache_evicts_least_recently_used():
+    cache = m.TokenCache("rules", path=Path("cache/tokens.sqlite3"), max_entries=2)
+    cache.put_many({"a": ["a"]})
+    cache.put_many({"b": ["b"]})
+    cache.conn.execute("UPDATE tokens SET last_used = 0 WHERE key = 'a'")
+    cache.put_many({"c": ["c"]})
+    assert set(cache.get_many(["a", "b", "c"])) == {"b", "c"}
+    cache.close()